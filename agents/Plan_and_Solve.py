@@ -1,15 +1,18 @@
 import os 
-import ast
+from pydantic import BaseModel
 from core.llm import HelloAgentsLLM
-from dotenv import load_dotenv
-from typing import List, Dict
-
-try:
-    load_dotenv()
-except FileNotFoundError:
-    print("警告：未找到.env文件，将使用系统环境变量")
-except Exception as e:
-    print(f"警告：加载.env文件时出错：{e}")
+from core.checkpoint import CheckpointStore
+from core.plan_cache import PlanCache
+from core.profiling import profiled_run
+from core.runtime import init
+from core.streaming import RunCancelled
+from core.plan_parser import StreamingPlanParser, parse_plan_text
+from core.step_memory import StepResultStore
+from core.tokens import estimate_tokens
+from log import get_logger
+from typing import List, Dict, Optional, Callable, Iterable, Iterator
+
+logger = get_logger("plan_and_solve")
 
 """
       ——————  Part 1 : 规划器 (Planner) 生成清晰的行动蓝图，以列表形式 ———————
@@ -27,36 +30,85 @@ PLANNER_PROMPT_TEMPLATE = """
 ```
 """
 
+PLAN_REPAIR_PROMPT_TEMPLATE = """
+下面是一段行动计划，但它的格式不符合要求。请不要修改计划内容，只把其中的步骤整理成 JSON。
+
+原始计划：
+{response}
+
+请严格按照以下 JSON 格式输出，不要输出任何其他内容:
+{{"steps": ["步骤1", "步骤2", "步骤3", ...]}}
+"""
+
+class PlanSteps(BaseModel):
+    """格式修复时要求模型输出的结构"""
+    steps: List[str]
+
+class PlanStreamError(RuntimeError):
+    """流式规划在中途失败：已经产出的步骤只是计划的一部分，不能当作完整计划执行"""
+
+
 class Planner:
     def __init__(self, llm_client: HelloAgentsLLM):
         self.llm_client = llm_client
 
     def plan(self, question: str) -> list[str]:
+        """
+        非流式生成计划：拿到完整响应后再解析，作为流式规划中途失败时的兜底。
+        调用失败时返回空列表。
+        """
+        messages = [{"role": "user", "content": PLANNER_PROMPT_TEMPLATE.format(question=question)}]
+        logger.info("正在生成计划(非流式)")
+        text = self.llm_client.think(messages=messages) or ""
+        plan = parse_plan_text(text)
+        for i, step in enumerate(plan, 1):
+            logger.info("计划步骤 %d: %s", i, step)
+        if plan or not text.strip():
+            return plan
+        return self._repair(text)
+
+    def plan_stream(self, question: str) -> Iterator[str]:
+        """
+        流式生成计划：每解析出一个完整步骤就立即产出，执行器可以在计划生成完之前开始执行第 1 步。
+        流式解析失败时依次兜底 python列表 / JSON / 编号列表 格式，仍然失败则进行一次格式修复的重新提问。
+        流在中途出错时抛出 PlanStreamError，由调用方决定重新规划还是终止。
+        """
         prompt = PLANNER_PROMPT_TEMPLATE.format(question=question)
         
         # 为了生成计划，构建一个简单的消息列表
         messages = [{"role": "user", "content": prompt}]
 
-        print(" --- 正在生成计划 --- ")
-        # 使用流式输出来获取完整计划 
-        response_text = self.llm_client.think(messages=messages)
-
-        print(f"计划已经生成：\n {response_text}")
-
-        # 解析LLM输出的列表字符串
+        logger.info("正在生成计划")
+        parser = StreamingPlanParser()
         try:
-            # 找到```python和```之间的内容
-            plan_str = response_text.split("```python")[1].split("```")[0].strip()
-            # 使用ast.literal_eval来安全的执行字符串，将其转换为python列表
-            plan = ast.literal_eval(plan_str)
-            return plan if isinstance(plan, list) else []   
-        except (ValueError, SyntaxError, IndexError) as e:
-            print(f"解析计划时出错：{e}")
-            print(f"原始响应：{response_text}")
-            return []
+            for chunk in self.llm_client.stream_think(messages=messages, role="planner"):
+                for step in parser.feed(chunk):
+                    logger.info("计划步骤 %d: %s", len(parser.steps), step)
+                    yield step
+        except RunCancelled:
+            raise
         except Exception as e:
-            print(f"未知错误：{e}")
-            return []
+            logger.error("生成计划时发生错误：%s", e, extra={"steps": len(parser.steps)})
+            raise PlanStreamError(f"流式规划在第 {len(parser.steps)} 个步骤之后中断：{e}") from e
+        for step in parser.finish():
+            logger.info("计划步骤 %d: %s", len(parser.steps), step)
+            yield step
+
+        logger.debug("计划已经生成", extra={"content": parser.text, "steps": len(parser.steps)})
+        if parser.steps or not parser.text.strip():
+            return
+        yield from self._repair(parser.text)
+
+    def _repair(self, text: str) -> list[str]:
+        logger.warning("解析计划失败，尝试让模型修复格式")
+        repair_prompt = PLAN_REPAIR_PROMPT_TEMPLATE.format(response=text)
+        repaired = self.llm_client.think_structured(
+            messages=[{"role": "user", "content": repair_prompt}], schema=PlanSteps, role="planner"
+        )
+        plan = [step.strip() for step in repaired.steps if step.strip()] if repaired else []
+        if not plan:
+            logger.error("修复计划格式失败", extra={"content": text})
+        return plan
 
 
 """
@@ -84,56 +136,264 @@ EXECUTOR_PROMPT_TEMPLATE = """
 请仅输出针对“当前步骤”的回答:
 """
 
+# 长计划模式：静态部分(问题 + 编号计划)作为 system 消息，每一步都相同，可命中服务端的前缀缓存；
+# 每一步变化的只有预算内的相关历史和当前步骤
+EXECUTOR_PREFIX_TEMPLATE = """
+你是一位顶级的AI执行专家。你的任务是严格按照给定的计划，一步步地解决问题。
+你将收到原始问题、完整的计划，以及与当前步骤相关的已完成步骤和结果(关联较弱的步骤会被摘要或省略)。
+请你专注于解决“当前步骤”，并仅输出该步骤的最终答案，不要输出任何额外的解释或对话。
+
+# 原始问题:
+{question}
+
+# 完整计划:
+{plan}
+"""
+
+EXECUTOR_STEP_TEMPLATE = """
+# 相关的历史步骤与结果:
+{history}
+
+# 当前步骤(步骤 {index}):
+{current_step}
+
+请仅输出针对“当前步骤”的回答:
+"""
+
 class Executor:
-    def __init__(self, llm_client: HelloAgentsLLM):
+    """
+    计划步骤数达到 long_plan_steps 后切换到长计划模式，每一步的提示词长度不再随步骤数增长：
+    - history_tokens: 长计划模式下历史步骤与结果的 token 预算
+    - summary_tokens: 放不下完整结果时，每一步摘要的 token 上限
+    参数为 None 时读取 EXECUTOR_LONG_PLAN_STEPS / EXECUTOR_HISTORY_TOKENS / EXECUTOR_SUMMARY_TOKENS。
+    长计划模式的前缀需要完整计划才能在各步骤间保持不变：流式规划进入长计划模式时，先读完剩余的计划再执行当前步骤
+    (此前的步骤在执行期间，计划通常已经生成了大半)。
+    """
+    def __init__(
+            self,
+            llm_client: HelloAgentsLLM,
+            long_plan_steps: Optional[int] = None,
+            history_tokens: Optional[int] = None,
+            summary_tokens: Optional[int] = None
+    ):
         self.llm_client = llm_client
-
-    def execute(self, question: str, plan: list[str]) -> str:
-        history = ""
-        final_answer = ""
+        self.long_plan_steps = int(os.getenv("EXECUTOR_LONG_PLAN_STEPS", 8)) if long_plan_steps is None else long_plan_steps
+        self.history_tokens = int(os.getenv("EXECUTOR_HISTORY_TOKENS", 800)) if history_tokens is None else history_tokens
+        self.summary_tokens = int(os.getenv("EXECUTOR_SUMMARY_TOKENS", 80)) if summary_tokens is None else summary_tokens
+
+    def execute(
+            self,
+            question: str,
+            plan: Iterable[str],
+            completed: Optional[list[str]] = None,
+            on_step: Optional[Callable[[int, str, str], None]] = None
+    ) -> str:
+        """
+        逐步执行计划。
+        - plan:      计划列表，或 Planner.plan_stream() 返回的迭代器(边生成边执行)
+        - completed: 已完成步骤的结果(来自检查点)，这些步骤会被直接跳过，不再调用LLM。
+                     流式规划时调用方可以在产出步骤前截断该列表，使与新计划不一致的旧结果失效
+        - on_step:   每完成一步后的回调 (步骤序号, 步骤, 结果)，用于保存检查点
+        """
+        step_results = completed if completed is not None else []
+        # 流式规划时 known_plan 随着计划的生成增长，pending 为尚未读取的部分
+        known_plan: list[str] = list(plan) if isinstance(plan, list) else []
+        pending: Optional[Iterator[str]] = None if isinstance(plan, list) else iter(plan)
+        store = StepResultStore(self.history_tokens, self.summary_tokens)
+        final_answer = step_results[-1] if step_results else ""
+        # 长计划模式下的静态前缀，计划完整后只渲染一次
+        prefix = ""
         
-        print("\n--- 正在执行计划 ---")
-        for i, step in enumerate(plan, 1):
-            print(f"\n-> 正在执行步骤 {i}/{len(plan)}: {step}")
-            prompt = EXECUTOR_PROMPT_TEMPLATE.format(
-                question=question, plan=plan, history=history if history else "无", current_step=step
-            )
-            messages = [{"role": "user", "content": prompt}]
+        logger.info("正在执行计划")
+        if step_results:
+            logger.info("从检查点恢复，跳过已完成的 %d 个步骤", len(step_results))
+        i = 0
+        while True:
+            if i == len(known_plan):
+                step = next(pending, None) if pending is not None else None
+                if step is None:
+                    break
+                known_plan.append(step)
+            step = known_plan[i]
+            i += 1
+            if i <= len(step_results):
+                store.add(i, step, step_results[i - 1])
+                continue
+            if pending is not None and len(known_plan) >= self.long_plan_steps:
+                # 进入长计划模式：读完剩余的计划，前缀在之后的每一步都保持不变
+                known_plan.extend(pending)
+                pending = None
+            total = "?" if pending is not None else len(known_plan)
+            logger.info("正在执行步骤 %s/%s: %s", i, total, step, extra={"step": i})
+            if len(known_plan) >= self.long_plan_steps:
+                if not prefix:
+                    prefix = EXECUTOR_PREFIX_TEMPLATE.format(
+                        question=question,
+                        plan="\n".join(f"{n}. {s}" for n, s in enumerate(known_plan, 1))
+                    )
+                messages = [
+                    {"role": "system", "content": prefix},
+                    {"role": "user", "content": EXECUTOR_STEP_TEMPLATE.format(
+                        history=store.render(step), index=i, current_step=step
+                    )},
+                ]
+            else:
+                # 流式规划时计划尚未生成完，只能提供目前已知的部分
+                messages = [{"role": "user", "content": EXECUTOR_PROMPT_TEMPLATE.format(
+                    question=question,
+                    plan=known_plan,
+                    history=store.render_all() or "无",
+                    current_step=step
+                )}]
+            logger.debug("执行器提示词", extra={
+                "step": i, "prompt_tokens": sum(estimate_tokens(m["content"]) for m in messages)
+            })
             
-            response_text = self.llm_client.think(messages=messages) or ""
+            response_text = self.llm_client.think(messages=messages, role="executor_step") or ""
             
-            history += f"步骤 {i}: {step}\n结果: {response_text}\n\n"
+            store.add(i, step, response_text)
             final_answer = response_text
-            print(f"✅ 步骤 {i} 已完成，结果: {final_answer}")
+            logger.info("步骤 %d 已完成", i, extra={"step": i, "chars": len(final_answer)})
+            logger.debug("步骤结果", extra={"sample": "executor.result", "step": i, "content": final_answer})
+            if on_step:
+                on_step(i, step, response_text)
             
         return final_answer
 
 # --- 4. 智能体 (Agent) 整合 ---
 class PlanAndSolveAgent:
-    def __init__(self, llm_client: HelloAgentsLLM):
+    def __init__(
+            self,
+            llm_client: HelloAgentsLLM,
+            checkpoint_store: Optional[CheckpointStore] = None,
+            plan_cache: Optional[PlanCache] = None
+    ):
         self.llm_client = llm_client
         self.planner = Planner(self.llm_client)
         self.executor = Executor(self.llm_client)
+        # 为 None 时不保存检查点
+        self.checkpoint_store = checkpoint_store
+        # 为 None 时不使用计划缓存；命中时直接使用缓存的计划，不调用 Planner
+        self.plan_cache = plan_cache
+        self.last_run_id: Optional[str] = None
+
+    @profiled_run
+    def run(self, question: str, run_id: Optional[str] = None):
+        logger.info("开始处理问题: %s", question)
+        if self.checkpoint_store:
+            run_id = run_id or self.checkpoint_store.new_run_id()
+            logger.info("检查点 run_id: %s", run_id, extra={"run_id": run_id})
+        self.last_run_id = run_id
+        return self._run_from_state(run_id, {"question": question, "plan": None, "step_results": []})
+
+    @profiled_run
+    def resume(self, run_id: str):
+        """从检查点恢复一次中断的运行，已完成的规划和步骤不会重新计算"""
+        if not self.checkpoint_store:
+            raise ValueError("未配置 checkpoint_store，无法恢复运行。")
+        state = self.checkpoint_store.load(run_id)
+        if state is None:
+            raise ValueError(f"未找到 run_id 为 '{run_id}' 的检查点。")
+        self.last_run_id = run_id
+        if state.get("status") == "finished":
+            logger.info("任务已完成(来自检查点)，最终答案: %s", state.get("final_answer"), extra={"run_id": run_id})
+            return state.get("final_answer")
+        logger.info("从检查点恢复，问题: %s", state["question"], extra={"run_id": run_id})
+        return self._run_from_state(run_id, state)
+
+    def _checkpoint(self, run_id: Optional[str], state: dict) -> None:
+        if self.checkpoint_store and run_id:
+            self.checkpoint_store.save(run_id, dict(state, agent="plan_and_solve"))
+
+    def _run_from_state(self, run_id: Optional[str], state: dict):
+        question = state["question"]
+        plan: Optional[list[str]] = None
+        step_results: list[str] = list(state.get("step_results") or [])
+        if state.get("plan") and state.get("plan_complete", True):
+            plan = state["plan"]
+        elif self.plan_cache is not None and not step_results:
+            plan = self.plan_cache.lookup(question)
+            if plan is not None:
+                logger.info("命中计划缓存，跳过规划", extra={"run_id": run_id, "steps": len(plan)})
+        # 计划中断在生成途中时无法续写，只能重新规划；新计划中与旧计划一致的前缀步骤结果继续复用
+        previous_plan: list[str] = state.get("plan") or []
+        plan_so_far: list[str] = []
+
+        def reuse_prefix(new_plan: list[str], old_plan: list[str]) -> None:
+            """旧结果只在对应步骤与新计划一致时继续有效"""
+            for i in range(len(step_results)):
+                if i >= len(new_plan) or i >= len(old_plan) or old_plan[i] != new_plan[i]:
+                    del step_results[i:]
+                    return
+
+        def streamed_plan() -> Iterator[str]:
+            """边生成计划边执行：每解析出一个步骤就先保存检查点(plan_complete=False)，再交给执行器"""
+            for step in self.planner.plan_stream(question):
+                i = len(plan_so_far)
+                if i < len(step_results) and (i >= len(previous_plan) or previous_plan[i] != step):
+                    del step_results[i:]
+                plan_so_far.append(step)
+                self._checkpoint(run_id, dict(
+                    state, plan=plan_so_far, plan_complete=False,
+                    step_results=step_results, current_step=len(step_results), status="running"
+                ))
+                yield step
+
+        def on_step(i: int, step: str, result: str) -> None:
+            step_results.append(result)
+            self._checkpoint(run_id, dict(
+                state, plan=plan or plan_so_far, plan_complete=plan is not None,
+                step_results=step_results, current_step=i, status="running"
+            ))
 
-    def run(self, question: str):
-        print(f"\n--- 开始处理问题 ---\n问题: {question}")
-        plan = self.planner.plan(question)
+        try:
+            final_answer = self.executor.execute(
+                question, plan if plan is not None else streamed_plan(),
+                completed=step_results, on_step=on_step
+            )
+        except PlanStreamError as e:
+            # 不能把中断的半截计划当作完整计划执行：改为非流式重新规划，与新计划一致的已完成步骤继续复用
+            logger.warning("流式规划中断，改为非流式重新规划：%s", e, extra={"run_id": run_id})
+            plan = self.planner.plan(question)
+            if not plan:
+                logger.error("任务终止：重新规划失败", extra={"run_id": run_id})
+                self._checkpoint(run_id, dict(
+                    state, plan=plan_so_far, plan_complete=False, step_results=step_results,
+                    current_step=len(step_results), status="failed", error=str(e)
+                ))
+                return
+            reuse_prefix(plan, plan_so_far + previous_plan[len(plan_so_far):])
+            plan_so_far[:] = plan
+            self._checkpoint(run_id, dict(
+                state, plan=plan, plan_complete=True, step_results=step_results,
+                current_step=len(step_results), status="running"
+            ))
+            final_answer = self.executor.execute(question, plan, completed=step_results, on_step=on_step)
+        plan = plan or plan_so_far
         if not plan:
-            print("\n--- 任务终止 --- \n无法生成有效的行动计划。")
+            logger.warning("任务终止：无法生成有效的行动计划", extra={"run_id": run_id})
             return
-        final_answer = self.executor.execute(question, plan)
-        print(f"\n--- 任务完成 ---\n最终答案: {final_answer}")
+        # 只缓存本次由 Planner 生成、并且执行得到了答案的计划
+        if self.plan_cache is not None and plan_so_far and final_answer:
+            self.plan_cache.store(question, plan)
+        self._checkpoint(run_id, dict(
+            state, plan=plan, plan_complete=True, step_results=step_results,
+            current_step=len(plan), status="finished", final_answer=final_answer
+        ))
+        logger.info("任务完成，最终答案: %s", final_answer, extra={"run_id": run_id})
+        return final_answer
 
 """
       ——————  Part 3 : main() ———————
 
 """
 if __name__ == '__main__':
+    init()
     try:
         llm_client = HelloAgentsLLM()
-        agent = PlanAndSolveAgent(llm_client)
+        agent = PlanAndSolveAgent(llm_client, checkpoint_store=CheckpointStore(), plan_cache=PlanCache.for_path())
         question = "一个水果店周一卖出了15个苹果。周二卖出的苹果数量是周一的两倍。周三卖出的数量比周二少了5个。请问这三天总共卖出了多少个苹果？"
-        agent.run(question)
+        print(f"最终答案: {agent.run(question)}")
     except ValueError as e:
         print(e)
 
@@ -1,6 +1,16 @@
 import re
+from typing import Optional, TYPE_CHECKING
 from core.llm import HelloAgentsLLM
-from search_tool import ToolExecutor, search
+from core.checkpoint import CheckpointStore
+from core.runtime import init
+from core.profiling import profiled_run, profile_step
+from log import get_logger
+
+if TYPE_CHECKING:
+    # 只用于类型标注；search_tool 在运行时由调用方导入，import 本模块时不加载
+    from search_tool import ToolExecutor
+
+logger = get_logger("react")
 
 # (此处省略 REACT_PROMPT_TEMPLATE 的定义)
 REACT_PROMPT_TEMPLATE = """
@@ -25,52 +35,115 @@ History: {history}
 """
 
 class ReActAgent:
-    def __init__(self, llm_client: HelloAgentsLLM, tool_executor: ToolExecutor, max_steps: int = 5):
+    def __init__(
+            self,
+            llm_client: HelloAgentsLLM,
+            tool_executor: "ToolExecutor",
+            max_steps: int = 5,
+            checkpoint_store: Optional[CheckpointStore] = None
+    ):
         self.llm_client = llm_client
         self.tool_executor = tool_executor
         self.max_steps = max_steps
         self.history = []
+        # 为 None 时不保存检查点
+        self.checkpoint_store = checkpoint_store
+        self.last_run_id: Optional[str] = None
 
-    def run(self, question: str):
+    @profiled_run
+    def run(self, question: str, run_id: Optional[str] = None):
         self.history = []
-        current_step = 0
-
+        if self.checkpoint_store:
+            run_id = run_id or self.checkpoint_store.new_run_id()
+            logger.info("检查点 run_id: %s", run_id, extra={"run_id": run_id})
+        self.last_run_id = run_id
+        return self._loop(question, run_id, current_step=0)
+
+    @profiled_run
+    def resume(self, run_id: str):
+        """从检查点恢复一次中断的运行，已经完成的思考和工具调用(Observation)不会重新执行"""
+        if not self.checkpoint_store:
+            raise ValueError("未配置 checkpoint_store，无法恢复运行。")
+        state = self.checkpoint_store.load(run_id)
+        if state is None:
+            raise ValueError(f"未找到 run_id 为 '{run_id}' 的检查点。")
+        self.last_run_id = run_id
+        self.history = list(state.get("history") or [])
+        if state.get("status") == "finished":
+            logger.info("最终答案(来自检查点): %s", state.get("final_answer"), extra={"run_id": run_id})
+            return state.get("final_answer")
+        logger.info("从检查点恢复，已完成 %d 步", state["current_step"], extra={"run_id": run_id})
+        return self._loop(
+            state["question"], run_id, current_step=state["current_step"],
+            pending_response=state.get("pending_response")
+        )
+
+    def _checkpoint(self, run_id: Optional[str], question: str, current_step: int,
+                    status: str = "running", final_answer: Optional[str] = None,
+                    pending_response: Optional[str] = None) -> None:
+        if not (self.checkpoint_store and run_id):
+            return
+        self.checkpoint_store.save(run_id, {
+            "agent": "react",
+            "question": question,
+            "history": self.history,
+            "current_step": current_step,
+            "status": status,
+            "final_answer": final_answer,
+            # 已经拿到但还没执行完工具调用的 LLM 响应，恢复时直接复用，不再重新调用 LLM
+            "pending_response": pending_response,
+        })
+
+    def _loop(self, question: str, run_id: Optional[str], current_step: int, pending_response: Optional[str] = None):
         while current_step < self.max_steps:
             current_step += 1
-            print(f"\n--- 第 {current_step} 步 ---")
-
-            tools_desc = self.tool_executor.getAvailableTools()
-            history_str = "\n".join(self.history)
-            prompt = REACT_PROMPT_TEMPLATE.format(tools=tools_desc, question=question, history=history_str)
-
-            messages = [{"role": "user", "content": prompt}]
-            response_text = self.llm_client.think(messages=messages)
-            if not response_text:
-                print("错误：LLM未能返回有效响应。"); break
+            logger.info("第 %d 步", current_step, extra={"run_id": run_id, "step": current_step})
+
+            if pending_response:
+                response_text, pending_response = pending_response, None
+                logger.info("复用检查点中的 LLM 响应", extra={"run_id": run_id, "step": current_step})
+            else:
+                tools_desc = self.tool_executor.getAvailableTools()
+                history_str = "\n".join(self.history)
+                prompt = REACT_PROMPT_TEMPLATE.format(tools=tools_desc, question=question, history=history_str)
+
+                messages = [{"role": "user", "content": prompt}]
+                response_text = self.llm_client.think(messages=messages, role="react_step")
+                if not response_text:
+                    logger.error("LLM未能返回有效响应", extra={"run_id": run_id, "step": current_step}); break
+                # 工具调用之前先保存响应：在 LLM 返回和工具调用结束之间崩溃时，恢复后不会重复计费这次 LLM 调用
+                self._checkpoint(run_id, question, current_step - 1, pending_response=response_text)
 
             thought, action = self._parse_output(response_text)
-            if thought: print(f"🤔 思考: {thought}")
-            if not action: print("警告：未能解析出有效的Action，流程终止。"); break
+            if thought: logger.info("思考: %s", thought, extra={"step": current_step})
+            if not action: logger.warning("未能解析出有效的Action，流程终止", extra={"step": current_step}); break
             
             if action.startswith("Finish"):
                 # 如果是Finish指令，提取最终答案并结束
                 final_answer = self._parse_action_input(action)
-                print(f"🎉 最终答案: {final_answer}")
+                logger.info("最终答案: %s", final_answer, extra={"run_id": run_id, "step": current_step})
+                self._checkpoint(run_id, question, current_step, status="finished", final_answer=final_answer)
                 return final_answer
             
             tool_name, tool_input = self._parse_action(action)
             if not tool_name or not tool_input:
-                self.history.append("Observation: 无效的Action格式，请检查。"); continue
+                self.history.append("Observation: 无效的Action格式，请检查。")
+                self._checkpoint(run_id, question, current_step)
+                continue
 
-            print(f"🎬 行动: {tool_name}[{tool_input}]")
+            logger.info("行动: %s[%s]", tool_name, tool_input, extra={"step": current_step, "tool": tool_name})
             tool_function = self.tool_executor.getTool(tool_name)
-            observation = tool_function(tool_input) if tool_function else f"错误：未找到名为 '{tool_name}' 的工具。"
+            with profile_step(f"tool:{tool_name}"):
+                observation = tool_function(tool_input) if tool_function else f"错误：未找到名为 '{tool_name}' 的工具。"
             
-            print(f"👀 观察: {observation}")
+            # 观察结果可能很长：INFO 只记录长度，完整内容按采样记录在 DEBUG
+            logger.info("观察结果", extra={"step": current_step, "tool": tool_name, "chars": len(str(observation))})
+            logger.debug("观察内容", extra={"sample": "react.observation", "step": current_step, "content": observation})
             self.history.append(f"Action: {action}")
             self.history.append(f"Observation: {observation}")
+            self._checkpoint(run_id, question, current_step)
 
-        print("已达到最大步数，流程终止。")
+        logger.warning("已达到最大步数，流程终止", extra={"run_id": run_id, "max_steps": self.max_steps})
         return None
 
     def _parse_output(self, text: str):
@@ -89,10 +162,12 @@ class ReActAgent:
         return match.group(1) if match else ""
 
 if __name__ == '__main__':
+    from search_tool import ToolExecutor, search
+    init()
     llm = HelloAgentsLLM()
     tool_executor = ToolExecutor()
     search_desc = "一个网页搜索引擎。当你需要回答关于时事、事实以及在你的知识库中找不到的信息时，应使用此工具。"
     tool_executor.registerTool("Search", search_desc, search)
-    agent = ReActAgent(llm_client=llm, tool_executor=tool_executor)
+    agent = ReActAgent(llm_client=llm, tool_executor=tool_executor, checkpoint_store=CheckpointStore())
     question = "NBA的快船队现在的战绩如何，为什么最近一个多月的时间内可以实现大幅度的战绩回暖？"
-    agent.run(question)
\ No newline at end of file
+    print(f"🎉 最终答案: {agent.run(question)}")
\ No newline at end of file
@@ -1,7 +1,11 @@
 from typing import List, Dict, Any, Optional,Literal,TypedDict
+from pydantic import BaseModel, Field, model_validator
 from core.llm import HelloAgentsLLM
-from log import logger
-import json
+from core.runtime import init
+from core.profiling import profiled_run
+from log import get_logger
+logger = get_logger("reflection")
+
 """
       ——————  Part 1 : Memory模块 ———————
             1. Reflection 的核心在于迭代，而迭代的前提是能够记住之前的尝试和获得的反馈。
@@ -109,6 +113,21 @@ REFINE_PROMPT_TEMPLATE = """
 请直接输出优化后的代码，不要包含任何额外的解释。
 """
 
+class ReflectionVerdict(BaseModel):
+    """
+    反思阶段的结构化结论，对应 REFLECT_PROMPT_TEMPLATE 中要求的 JSON。
+    字段都是必填的：缺字段或空分析会触发 think_structured 的修复调用，而不是被默认值悄悄放过。
+    """
+    needs_improvement: bool
+    analysis: str = Field(min_length=1)
+    suggestion: str
+
+    @model_validator(mode="after")
+    def _suggestion_required(self) -> "ReflectionVerdict":
+        if self.needs_improvement and not self.suggestion.strip():
+            raise ValueError("needs_improvement 为 true 时 suggestion 不能为空")
+        return self
+
 class ReflectionAgent:
     def __init__(self, llm_client, max_iterations=3, default_temperature=0.2):
         self.llm_client = llm_client
@@ -116,22 +135,20 @@ class ReflectionAgent:
         self.max_iterations = max_iterations
         self.default_temperature = default_temperature
     
-    def _get_llm_response(self, prompt: str, temperature: float = None) -> str:
-        if temperature is None:
+    def _get_llm_response(self, prompt: str, temperature: float = None, role: str = None) -> str:
+        # 指定 role 时由该角色的生成参数(core.generation)决定 temperature 和 max_tokens
+        if temperature is None and role is None:
             temperature = self.default_temperature
         messages = [{"role": "user", "content": prompt}]
-        response_text = self.llm_client.think(messages=messages, temperature=temperature) or ""
+        response_text = self.llm_client.think(messages=messages, temperature=temperature, role=role) or ""
         return response_text
-    # JSON容错清洗
-    def _extract_json(self, text: str) -> str:
-        text = text.strip()
-        if text.startswith("```"):
-            parts = text.split("```")
-            if len(parts) >= 2:
-                text = parts[1]
-        text = text.replace("json","", 1).strip()
-        return text
+
+    def _get_verdict(self, prompt: str) -> Optional[ReflectionVerdict]:
+        # JSON 模式 + 容错解析 + 一次修复调用(见 HelloAgentsLLM.think_structured)
+        messages = [{"role": "user", "content": prompt}]
+        return self.llm_client.think_structured(messages=messages, schema=ReflectionVerdict, role="reflect")
     
+    @profiled_run
     def run(self, task: str):
         # print(f"\n --- 开始处理任务 ---\n任务：{task}")
         logger.info("开始处理任务:%s", task)
@@ -139,7 +156,7 @@ class ReflectionAgent:
         # ---1. 初始执行 ---
         logger.info("正在进行初始尝试")
         initial_prompt = INITIAL_PROMPT_TEMPLATE.format(task=task)
-        initial_code = self._get_llm_response(initial_prompt, temperature=0.3)
+        initial_code = self._get_llm_response(initial_prompt, role="initial")
         self.memory.add_record("execution", initial_code)
 
         # ---2. 迭代循环：反思与优化 ---
@@ -153,20 +170,16 @@ class ReflectionAgent:
                 logger.error("没有找到上一次的执行记录")
                 break
             reflect_prompt = REFLECT_PROMPT_TEMPLATE.format(task=task, code=last_code)
-            feedback = self._extract_json(self._get_llm_response(reflect_prompt, temperature=0.1))
+            verdict = self._get_verdict(reflect_prompt)
             # b. 检查是否需要停止
-            try:
-                data = json.loads(feedback)   # json.loads 输入JSON格式，返回python的格式类型，这里是字典
-            except json.JSONDecodeError:
-                logger.error("反思阶段JSON解析失败（第 %d 轮），内容为：%s", i+1, feedback[:200])
-                break           
+            if verdict is None:
+                logger.error("反思阶段未能得到合法的结论（第 %d 轮），保留当前代码", i+1)
+                break
             #   b.1 提取反馈内容
-            analysis = data["analysis"]
-            suggestion = data["suggestion"]
-            feedback_text = f"{analysis}\n{suggestion}".strip()
+            feedback_text = f"{verdict.analysis}\n{verdict.suggestion}".strip()
             self.memory.add_record("reflection", feedback_text)
             #   b.2 判断是否停止
-            if not data.get("needs_improvement",True):        # 即使字段缺失，也不会崩
+            if not verdict.needs_improvement:
                 logger.warning("反思认为代码已无需改进，任务提前结束")
                 break
 
@@ -175,9 +188,9 @@ class ReflectionAgent:
             refine_prompt = REFINE_PROMPT_TEMPLATE.format(
                 task=task,
                 last_code_attempt=last_code,
-                feedback=feedback
+                feedback=feedback_text
             )
-            refined_code = self._get_llm_response(refine_prompt, temperature=0.2)
+            refined_code = self._get_llm_response(refine_prompt, role="refine")
             self.memory.add_record("execution", refined_code)
         
         final_code = self.memory.get_last_execution()
@@ -186,6 +199,7 @@ class ReflectionAgent:
         return final_code
 
 if __name__ == '__main__':
+    init()
     try:
         llm_client  = HelloAgentsLLM()
     except Exception as e:
@@ -1,10 +1,20 @@
-from typing import Optional, Iterator, TYPE_CHECKING, List, Dict, Any, AsyncGenerator
+from typing import Optional, Iterator, TYPE_CHECKING, List, Dict, Any
 import json
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 
 from core.llm import HelloAgentsLLM
 from core.agent import Agent
 from core.config import Config
 from core.message import Message
+from core.runtime import init
+from core.profiling import profiled_run
+from log import get_logger
+
+if TYPE_CHECKING:
+    from search_tool import ToolExecutor
+
+logger = get_logger("simple_agent")
 
 class SimpleAgent(Agent):
     """
@@ -15,4 +25,110 @@ class SimpleAgent(Agent):
     - function calling 工具调用 （可选）
     - 自动多轮工具调用
     """
+    def __init__(
+            self,
+            name: str,
+            llm: HelloAgentsLLM,
+            system_prompt: Optional[str] = None,
+            config: Optional[Config] = None,
+            tool_executor: Optional["ToolExecutor"] = None,
+            max_tool_rounds: int = 5,
+            max_parallel_tools: int = 8
+    ):
+        super().__init__(name, llm, system_prompt, config)
+        self.tool_executor = tool_executor
+        self.max_tool_rounds = max_tool_rounds
+        self.max_parallel_tools = max_parallel_tools
+
+    @profiled_run
+    def run(self, input_text: str, **kwargs) -> str:
+        """运行agent，返回完整的最终回答；需要逐块输出时使用 stream_run()"""
+        return "".join(self.stream_run(input_text, **kwargs))
+
+    def stream_run(self, input_text: str, **kwargs) -> Iterator[str]:
+        """
+        流式运行agent，逐块产出最终回答。
+        模型返回 tool_calls 时并发执行本轮的全部工具，把结果作为 tool 消息追加后进入下一轮，
+        直到模型给出不含工具调用的回答，或达到 max_tool_rounds。
+
+        提供了工具的轮次里，模型可能先输出一段内容再调用工具，这段内容不是最终回答；
+        因此这些轮次的内容先缓存，确认本轮没有工具调用后再产出。不提供工具的轮次直接边生成边产出。
+        """
+        temperature = kwargs.get("temperature", self.config.temperature)
+        messages = self._build_messages(input_text)
+        tools = self.tool_executor.getToolSchemas() if self.tool_executor and self.tool_executor.tools else None
+
+        for round_index in range(self.max_tool_rounds + 1):
+            # 最后一轮不再提供工具，强制模型给出回答
+            round_tools = tools if round_index < self.max_tool_rounds else None
+            content_parts: List[str] = []
+            tool_calls: List[Dict[str, str]] = []
+            for event in self.llm.stream_with_tools(
+                    messages, tools=round_tools, temperature=temperature, max_tokens=self.config.max_tokens
+            ):
+                if event["type"] == "content":
+                    content_parts.append(event["content"])
+                    if not round_tools:
+                        yield event["content"]
+                else:
+                    tool_calls = event["tool_calls"]
+
+            if not tool_calls:
+                if round_tools:
+                    yield from content_parts
+                answer = "".join(content_parts)
+                self.add_message(Message(input_text, "user"))
+                self.add_message(Message(answer, "assistant"))
+                return
+
+            messages.append({
+                "role": "assistant",
+                "content": "".join(content_parts) or None,
+                "tool_calls": [
+                    {"id": call["id"], "type": "function", "function": {"name": call["name"], "arguments": call["arguments"]}}
+                    for call in tool_calls
+                ],
+            })
+            for call, result in zip(tool_calls, self._execute_tool_calls(tool_calls)):
+                messages.append({"role": "tool", "tool_call_id": call["id"], "content": result})
+
+    def _build_messages(self, input_text: str) -> List[Dict[str, Any]]:
+        messages: List[Dict[str, Any]] = []
+        if self.system_prompt:
+            messages.append({"role": "system", "content": self.system_prompt})
+        history = self._history[-self.config.max_history_length:] if self.config.max_history_length else []
+        messages.extend(message.to_dict() for message in history)
+        messages.append({"role": "user", "content": input_text})
+        return messages
+
+    def _execute_tool_calls(self, tool_calls: List[Dict[str, str]]) -> List[str]:
+        """并发执行同一轮返回的多个工具调用，结果顺序与调用顺序一致"""
+        def execute(call: Dict[str, str]) -> str:
+            try:
+                arguments = json.loads(call["arguments"] or "{}")
+            except json.JSONDecodeError as e:
+                return f"错误：工具参数不是合法的JSON：{e}"
+            if not isinstance(arguments, dict):
+                return "错误：工具参数必须是JSON对象"
+            logger.info("调用工具: %s(%s)", call["name"], call["arguments"], extra={"tool": call["name"]})
+            return self.tool_executor.executeTool(call["name"], arguments)
+
+        if len(tool_calls) == 1:
+            return [execute(tool_calls[0])]
+        # 线程池的线程不继承 contextvars：每个调用在当前上下文的副本中运行，
+        # 工具调用才能记入当前运行的性能剖析(core.profiling)并使用会话的 token 回调
+        with ThreadPoolExecutor(max_workers=min(len(tool_calls), self.max_parallel_tools)) as pool:
+            futures = [pool.submit(contextvars.copy_context().run, execute, call) for call in tool_calls]
+            return [future.result() for future in futures]
+
 
+if __name__ == '__main__':
+    from search_tool import ToolExecutor, search
+    init()
+    tool_executor = ToolExecutor()
+    search_desc = "一个网页搜索引擎。当你需要回答关于时事、事实以及在你的知识库中找不到的信息时，应使用此工具。"
+    tool_executor.registerTool("Search", search_desc, search)
+    agent = SimpleAgent("assistant", HelloAgentsLLM(), system_prompt="你是一个乐于助人的助手。", tool_executor=tool_executor)
+    for chunk in agent.stream_run("分别搜索一下NBA快船队和湖人队现在的战绩，并做个对比。"):
+        print(chunk, end="", flush=True)
+    print()
@@ -0,0 +1,65 @@
+"""
+智能体注册表：server.py、jobs/ 的 worker 和回放基准测试共用。
+
+build_runtime() 创建所有会话共享的 LLM 客户端和 ToolExecutor；
+设置了 LLM_SMALL_MODEL_ID 时 LLM 客户端为小模型 / 大模型级联(见 core.cascade)；
+设置了 CASSETTE_MODE 时改为录制 / 回放客户端(见 core.cassette)。
+"""
+
+import os
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from core.llm import HelloAgentsLLM
+from core.cascade import CascadeLLM, CascadeStats
+from core.cassette import Cassette, CassetteLLM
+from core.plan_cache import PlanCache
+from search_tool import ToolExecutor
+from search_backends import create_search_tool
+from agents.ReAct import ReActAgent
+from agents.Plan_and_Solve import PlanAndSolveAgent
+from agents.Reflection import ReflectionAgent
+
+SEARCH_DESCRIPTION = "一个网页搜索引擎。当你需要回答关于时事、事实以及在你的知识库中找不到的信息时，应使用此工具。"
+
+
+def shared_plan_cache() -> Optional[PlanCache]:
+    """进程内共享的计划缓存(每个缓存文件一个实例)，PLAN_CACHE=false 时关闭"""
+    if os.getenv("PLAN_CACHE", "true").lower() != "true":
+        return None
+    return PlanCache.for_path()
+
+
+# 智能体名 -> 工厂函数 (共享的 LLM, 共享的 ToolExecutor) -> 智能体
+# 智能体对象保存单次运行的状态，因此每次运行新建一个；真正昂贵的 LLM 客户端和工具在运行之间共享
+AGENT_FACTORIES: Dict[str, Callable[[HelloAgentsLLM, ToolExecutor], Any]] = {
+    "react": lambda llm, tools: ReActAgent(llm_client=llm, tool_executor=tools),
+    "plan_and_solve": lambda llm, tools: PlanAndSolveAgent(llm, plan_cache=shared_plan_cache()),
+    "reflection": lambda llm, tools: ReflectionAgent(llm),
+}
+
+
+def create_llm() -> HelloAgentsLLM:
+    """配置了 LLM_SMALL_MODEL_ID 时返回级联客户端，否则返回普通客户端"""
+    if os.getenv("LLM_SMALL_MODEL_ID"):
+        return CascadeLLM.from_env()
+    return HelloAgentsLLM()
+
+
+def cascade_stats(llm: HelloAgentsLLM) -> Optional[CascadeStats]:
+    """取出 build_runtime() 返回的客户端中的级联统计；未启用级联时返回 None"""
+    if isinstance(llm, CassetteLLM):
+        llm = llm.llm
+    return llm.stats if isinstance(llm, CascadeLLM) else None
+
+
+def build_runtime(cassette: Optional[Cassette] = None) -> Tuple[HelloAgentsLLM, ToolExecutor]:
+    """返回共享的 (LLM 客户端, ToolExecutor)"""
+    if cassette and cassette.mode == "replay":
+        return CassetteLLM(cassette), cassette.tool_executor()
+    llm = create_llm()
+    tools = ToolExecutor()
+    tools.registerTool("Search", SEARCH_DESCRIPTION, create_search_tool())
+    if cassette:
+        llm = CassetteLLM(cassette, llm)
+        cassette.wrap_tools(tools)
+    return llm, tools
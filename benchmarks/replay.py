@@ -0,0 +1,74 @@
+"""
+回放基准测试：把录制文件(core.cassette)中的全部会话重新跑一遍，LLM 和工具都由录制内容提供，不需要网络和 API Key。
+
+- --speed 0    不等待，测量智能体循环本身的开销(解析、提示词构建、检查点等)
+- --speed 1    按原始节奏回放，复现线上的慢会话
+- --speed 1000 以 1000 倍速回放
+- --concurrency N  同时回放 N 个会话，观察并发下的表现
+
+录制：CASSETTE_MODE=record CASSETTE_PATH=.cache/cassette.db python server.py，然后正常发请求。
+
+用法(在仓库根目录)：python benchmarks/replay.py .cache/cassette.db [--speed 0] [--concurrency 1] [--repeat 1]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from core.cassette import Cassette, CassetteLLM, CassetteMiss
+from agents.registry import AGENT_FACTORIES
+
+
+def replay_run(cassette: Cassette, llm: CassetteLLM, tools, agent_name: str, input_text: str) -> Tuple[str, float, bool]:
+    agent = AGENT_FACTORIES[agent_name](llm, tools)
+    start = time.perf_counter()
+    try:
+        agent.run(input_text)
+        ok = True
+    except CassetteMiss:
+        ok = False
+    return agent_name, time.perf_counter() - start, ok
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="回放录制的会话并统计耗时")
+    arg_parser.add_argument("path", help="录制文件")
+    arg_parser.add_argument("--speed", type=float, default=0, help="回放倍速，0 表示不等待")
+    arg_parser.add_argument("--concurrency", type=int, default=1)
+    arg_parser.add_argument("--repeat", type=int, default=1)
+    args = arg_parser.parse_args()
+
+    cassette = Cassette(args.path, mode="replay", speed=args.speed)
+    llm = CassetteLLM(cassette)
+    tools = cassette.tool_executor()
+    runs = [run for run in cassette.runs() if run[0] in AGENT_FACTORIES] * args.repeat
+    if not runs:
+        print("录制文件中没有可回放的会话")
+        return
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results: List[Tuple[str, float, bool]] = list(pool.map(
+            lambda run: replay_run(cassette, llm, tools, *run), runs
+        ))
+    total = time.perf_counter() - start
+
+    print(f"{'智能体':<16}{'会话':>6}{'失败':>6}{'平均(s)':>10}{'最大(s)':>10}")
+    for agent_name in sorted({name for name, _, _ in results}):
+        durations = [d for name, d, ok in results if name == agent_name and ok]
+        failed = sum(1 for name, _, ok in results if name == agent_name and not ok)
+        mean = f"{statistics.mean(durations):.3f}" if durations else "-"
+        worst = f"{max(durations):.3f}" if durations else "-"
+        print(f"{agent_name:<18}{len(durations) + failed:>6}{failed:>6}{mean:>10}{worst:>10}")
+    print(f"\n共 {len(results)} 个会话，总耗时 {total:.3f}s，吞吐 {len(results) / total:.1f} 会话/秒")
+
+
+if __name__ == '__main__':
+    main()
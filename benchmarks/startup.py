@@ -0,0 +1,157 @@
+"""
+冷启动基准测试：对每个入口统计
+1. python -X importtime 下的模块导入耗时(总耗时和最重的若干个依赖)
+2. time-to-first-request：从启动子进程到本地假 LLM 服务收到第一个请求的时间
+
+假 LLM 服务在本进程内用 http.server 实现，兼容 OpenAI 的流式 chat.completions 接口，因此不需要网络和真实的 API Key。
+
+用法(在仓库根目录)：python benchmarks/startup.py [--repeat 5] [--top 8]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Tuple, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 入口名 -> (导入的模块, 触发第一次 LLM 请求的代码)
+ENTRY_POINTS: Dict[str, Tuple[str, str]] = {
+    "core.llm": (
+        "core.llm",
+        "from core.llm import HelloAgentsLLM\n"
+        "HelloAgentsLLM().think([{'role': 'user', 'content': 'hi'}])",
+    ),
+    "agents.ReAct": (
+        "agents.ReAct",
+        "from core.llm import HelloAgentsLLM\n"
+        "from agents.ReAct import ReActAgent\n"
+        "from search_tool import ToolExecutor\n"
+        "ReActAgent(HelloAgentsLLM(), ToolExecutor(), max_steps=1).run('hi')",
+    ),
+    "agents.Plan_and_Solve": (
+        "agents.Plan_and_Solve",
+        "from core.llm import HelloAgentsLLM\n"
+        "from agents.Plan_and_Solve import PlanAndSolveAgent\n"
+        "PlanAndSolveAgent(HelloAgentsLLM()).run('hi')",
+    ),
+    "agents.Reflection": (
+        "agents.Reflection",
+        "from core.llm import HelloAgentsLLM\n"
+        "from agents.Reflection import ReflectionAgent\n"
+        "ReflectionAgent(HelloAgentsLLM(), max_iterations=0).run('hi')",
+    ),
+    "search_tool": ("search_tool", "import search_tool"),
+}
+
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+class _FakeLLMHandler(BaseHTTPRequestHandler):
+    """记录第一个请求到达的时间，并返回一个最小的 SSE 流式响应"""
+    first_request_at: Optional[float] = None
+
+    def do_POST(self):
+        if _FakeLLMHandler.first_request_at is None:
+            _FakeLLMHandler.first_request_at = time.time()
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        chunk = {
+            "id": "bench", "object": "chat.completion.chunk", "created": 0, "model": "bench",
+            "choices": [{"index": 0, "delta": {"role": "assistant", "content": "Action: Finish[ok]"}, "finish_reason": "stop"}],
+        }
+        body = f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n".encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def measure_importtime(module: str, top: int) -> Tuple[float, List[Tuple[str, float]]]:
+    """返回 (总导入耗时ms, 自身耗时最高的 top 个模块)"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    total_us, modules = 0, []
+    # 解释器启动阶段(site 及其之前)的导入与入口无关，不计入
+    after_site = False
+    for line in proc.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = int(match.group(1)), int(match.group(2)), match.group(3), match.group(4)
+        if not after_site:
+            after_site = len(indent) == 1 and name == "site"
+            continue
+        modules.append((name, self_us / 1000))
+        if len(indent) == 1:    # 顶层导入
+            total_us += cumulative_us
+    modules.sort(key=lambda item: item[1], reverse=True)
+    return total_us / 1000, modules[:top]
+
+
+def measure_first_request(code: str, port: int) -> Optional[float]:
+    """返回从启动子进程到假 LLM 服务收到第一个请求的毫秒数，入口没有发出请求时返回 None"""
+    env = dict(
+        os.environ,
+        LLM_BASE_URL=f"http://127.0.0.1:{port}/v1",
+        LLM_API_KEY="bench",
+        LLM_MODEL_ID="bench",
+    )
+    _FakeLLMHandler.first_request_at = None
+    start = time.time()
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True)
+    if _FakeLLMHandler.first_request_at is None:
+        return None
+    return (_FakeLLMHandler.first_request_at - start) * 1000
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="入口模块冷启动基准测试")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="每个入口重复测量的次数，取中位数")
+    arg_parser.add_argument("--top", type=int, default=8, help="显示自身导入耗时最高的模块数")
+    arg_parser.add_argument("entries", nargs="*", help="只测量指定的入口，默认全部")
+    args = arg_parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeLLMHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    try:
+        for name in args.entries or ENTRY_POINTS:
+            module, code = ENTRY_POINTS[name]
+            print(f"\n=== {name} ===")
+            try:
+                import_times = []
+                heaviest: List[Tuple[str, float]] = []
+                for _ in range(args.repeat):
+                    total_ms, heaviest = measure_importtime(module, args.top)
+                    import_times.append(total_ms)
+                print(f"导入耗时(中位数): {statistics.median(import_times):.1f} ms")
+                for mod, self_ms in heaviest:
+                    print(f"    {mod:<40}{self_ms:>8.1f} ms")
+            except RuntimeError as e:
+                print(f"导入失败: {e}")
+                continue
+
+            first_request = [measure_first_request(code, port) for _ in range(args.repeat)]
+            first_request = [t for t in first_request if t is not None]
+            if first_request:
+                print(f"time-to-first-request(中位数): {statistics.median(first_request):.1f} ms")
+            else:
+                print("time-to-first-request: 入口没有发出 LLM 请求")
+    finally:
+        server.shutdown()
@@ -0,0 +1,242 @@
+"""
+模型级联：先用小模型(更快、更便宜)生成，通过廉价的规则校验后直接使用；校验失败再升级到大模型。
+设置 LLM_SMALL_MODEL_ID 后 agents.registry.build_runtime() 自动使用级联客户端，各角色的升级率见 /healthz。
+
+校验按角色(与 core.generation 中的角色一致)进行：
+- react_step:    能解析出 Action: tool[input] / Finish[...]
+- reflect:       是合法的 JSON，且包含 needs_improvement 字段
+- planner:       能解析出非空的计划
+- executor_step: 非空
+未配置校验器的角色(例如 initial / refine 这类代码生成)直接使用大模型。
+"""
+
+import os
+import re
+import time
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Any, TYPE_CHECKING
+
+from core.llm import HelloAgentsLLM
+from core.json_repair import parse_json_tolerant
+from core.plan_parser import StreamingPlanParser, parse_plan_text
+from core.streaming import HeldTokens, RunCancelled, current_sink, token_sink
+from log import get_logger
+
+if TYPE_CHECKING:
+    from core.config import Config
+
+Validator = Callable[[str], bool]
+# 流式校验器：逐块接收输出，返回 True 表示已经可以确认有效
+StreamingValidator = Callable[[str], bool]
+
+logger = get_logger("cascade")
+
+_ACTION_RE = re.compile(r"Action:\s*\w+\[.*\]", re.S)
+
+
+def _valid_react_step(text: str) -> bool:
+    return bool(_ACTION_RE.search(text))
+
+
+def _valid_reflect(text: str) -> bool:
+    try:
+        data = parse_json_tolerant(text)
+    except ValueError:
+        return False
+    return isinstance(data, dict) and "needs_improvement" in data
+
+
+DEFAULT_VALIDATORS: Dict[str, Validator] = {
+    "react_step": _valid_react_step,
+    "reflect": _valid_reflect,
+    "planner": lambda text: bool(parse_plan_text(text)),
+    "executor_step": lambda text: bool(text.strip()),
+}
+
+
+def _planner_accepts() -> StreamingValidator:
+    """解析出第一个计划步骤即确认有效(与 planner 的校验条件"计划非空"一致)"""
+    parser = StreamingPlanParser()
+    return lambda chunk: bool(parser.feed(chunk) or parser.steps)
+
+
+# 角色 -> 流式校验器工厂(每次调用创建一个)
+DEFAULT_STREAMING_VALIDATORS: Dict[str, Callable[[], StreamingValidator]] = {
+    "planner": _planner_accepts,
+}
+
+
+class CascadeStats:
+    """记录每个角色的升级率，以及相对于"全部使用大模型"节省的延迟"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.roles: Dict[str, Dict[str, float]] = {}
+
+    def _entry(self, role: str) -> Dict[str, float]:
+        return self.roles.setdefault(role, {
+            "calls": 0, "escalations": 0,
+            "small_seconds": 0.0, "wasted_seconds": 0.0,
+            "large_calls": 0, "large_seconds": 0.0,
+        })
+
+    def record(self, role: str, small_seconds: float, large_seconds: Optional[float] = None) -> None:
+        with self._lock:
+            entry = self._entry(role)
+            entry["calls"] += 1
+            if large_seconds is None:
+                entry["small_seconds"] += small_seconds
+            else:
+                entry["escalations"] += 1
+                entry["wasted_seconds"] += small_seconds
+                entry["large_calls"] += 1
+                entry["large_seconds"] += large_seconds
+
+    def record_large(self, role: str, seconds: float) -> None:
+        """未参与级联的大模型调用，只用于估算大模型的平均延迟"""
+        with self._lock:
+            entry = self._entry(role)
+            entry["large_calls"] += 1
+            entry["large_seconds"] += seconds
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        result = {}
+        with self._lock:
+            for role, entry in self.roles.items():
+                if not entry["calls"]:
+                    continue
+                served_by_small = entry["calls"] - entry["escalations"]
+                large_avg = entry["large_seconds"] / entry["large_calls"] if entry["large_calls"] else None
+                saved = None
+                if large_avg is not None:
+                    # 小模型直接命中节省的时间，减去升级时浪费在小模型上的时间
+                    saved = large_avg * served_by_small - entry["small_seconds"] - entry["wasted_seconds"]
+                result[role] = {
+                    "calls": entry["calls"],
+                    "escalation_rate": entry["escalations"] / entry["calls"],
+                    "latency_saved_seconds": saved,
+                }
+        return result
+
+    def report(self) -> str:
+        lines = [f"{'角色':<16}{'调用':>6}{'升级率':>10}{'节省延迟(s)':>14}"]
+        for role, item in self.summary().items():
+            saved = item["latency_saved_seconds"]
+            saved_text = f"{saved:.2f}" if saved is not None else "未知"
+            lines.append(f"{role:<18}{item['calls']:>6}{item['escalation_rate']:>10.1%}{saved_text:>14}")
+        return "\n".join(lines)
+
+
+class CascadeLLM(HelloAgentsLLM):
+    """
+    与 HelloAgentsLLM 接口一致的级联客户端，可以直接传给各个智能体(agents.registry 在配置了 LLM_SMALL_MODEL_ID 时使用)。
+    调用时通过 role 参数决定是否走级联(见 DEFAULT_VALIDATORS)。
+    think() / think_structured() 沿用父类实现，经由 stream_think() 走级联。
+    """
+    def __init__(
+            self,
+            small: HelloAgentsLLM,
+            large: HelloAgentsLLM,
+            validators: Optional[Dict[str, Validator]] = None,
+            streaming_validators: Optional[Dict[str, Callable[[], StreamingValidator]]] = None
+    ):
+        # 不调用父类 __init__：客户端、生成参数都直接复用大模型的
+        self.small = small
+        self.large = large
+        self.model = large.model
+        self.config = large.config
+        self.max_tokens = large.max_tokens
+        self.profiles = large.profiles
+        self.json_mode = large.json_mode
+        self.echo_tokens = large.echo_tokens
+        self.profile_calls = large.profile_calls
+        self.validators = dict(DEFAULT_VALIDATORS) if validators is None else validators
+        self.streaming_validators = (
+            dict(DEFAULT_STREAMING_VALIDATORS) if streaming_validators is None else streaming_validators
+        )
+        self.stats = CascadeStats()
+
+    @classmethod
+    def from_env(cls, small_model: Optional[str] = None, config: Optional["Config"] = None) -> "CascadeLLM":
+        """大模型使用 LLM_MODEL_ID，小模型使用 LLM_SMALL_MODEL_ID，服务地址和密钥相同"""
+        large = HelloAgentsLLM(config=config)
+        small_model = small_model or os.getenv("LLM_SMALL_MODEL_ID")
+        if not small_model:
+            raise ValueError("小模型ID必须被提供或在.env文件中定义(LLM_SMALL_MODEL_ID)。")
+        # 共享同一个 GenerationProfiles，避免两份统计写同一个文件
+        small = HelloAgentsLLM(model=small_model, config=large.config, profiles=large.profiles)
+        return cls(small, large)
+
+    @property
+    def client(self):
+        return self.large.client
+
+    def stream_think(
+            self,
+            messages: List[Dict[str, str]],
+            temperature: Optional[float] = None,
+            max_tokens: Optional[int] = None,
+            stop: Optional[List[str]] = None,
+            role: Optional[str] = None,
+            response_format: Optional[Dict[str, Any]] = None
+    ) -> Iterator[str]:
+        """
+        需要校验的角色：小模型的草稿先暂存(不转发给会话的 token 回调)，通过校验后再产出，否则改为流式产出大模型的输出。
+        有流式校验器的角色(planner)不等草稿结束：一旦确认有效就释放已暂存的内容并继续流式产出，
+        保持边生成计划边执行；确认之前失败或结束则升级到大模型。
+        think_structured() 也经由这里调用，因此结构化输出同样走级联。
+        """
+        kwargs = dict(temperature=temperature, max_tokens=max_tokens, stop=stop, role=role, response_format=response_format)
+        validator = self.validators.get(role) if role else None
+        if validator is None:
+            start = time.perf_counter()
+            yield from self.large.stream_think(messages, **kwargs)
+            if role:
+                self.stats.record_large(role, time.perf_counter() - start)
+            return
+
+        start = time.perf_counter()
+        held = HeldTokens(current_sink())
+        accepts = self.streaming_validators[role]() if role in self.streaming_validators else None
+        stream = self.small.stream_think(messages, **kwargs)
+        chunks: List[str] = []
+        accepted = False
+        try:
+            while not accepted:
+                # 只在取下一块时替换 token 回调，不跨越 yield，调用方的上下文不受影响
+                with token_sink(held):
+                    chunk = next(stream, None)
+                if chunk is None:
+                    break
+                chunks.append(chunk)
+                accepted = accepts is not None and accepts(chunk)
+        except RunCancelled:
+            raise
+        except Exception as e:
+            logger.warning("小模型调用失败: %s", e, extra={"role": role, "small": self.small.model})
+            stream.close()
+            chunks = []
+
+        if accepted:
+            held.release()
+            yield from chunks
+            # 已经确认有效，剩余部分直接流式转发；此后出错无法再升级，交给调用方处理
+            yield from stream
+            self.stats.record(role, time.perf_counter() - start)
+            return
+
+        text = "".join(chunks)
+        small_seconds = time.perf_counter() - start
+        if text and validator(text):
+            self.stats.record(role, small_seconds)
+            held.release()
+            yield text
+            return
+
+        held.discard()
+        logger.info("小模型输出未通过校验，升级到大模型", extra={"role": role, "small": self.small.model, "large": self.large.model})
+        start = time.perf_counter()
+        yield from self.large.stream_think(messages, **kwargs)
+        self.stats.record(role, small_seconds, time.perf_counter() - start)
+
+    def stream_with_tools(self, messages, tools=None, temperature: float = 0, max_tokens: Optional[int] = None):
+        return self.large.stream_with_tools(messages, tools=tools, temperature=temperature, max_tokens=max_tokens)
@@ -0,0 +1,358 @@
+"""
+录制 / 回放：把 LLM 的流式响应和工具调用(连同时间信息)录制到一个 SQLite 文件中，之后可以在没有任何后端和密钥的情况下回放。
+
+- 录制：CassetteLLM.record(path, llm) 包装真实的客户端；cassette.wrap_tools(tool_executor) 包装已注册的工具
+- 回放：CassetteLLM.replay(path, speed) 按请求内容查找录制的响应；speed=1 按原始节奏回放，
+        speed=1000 以 1000 倍速回放，speed=0 不等待(尽可能快)
+- 请求按 (角色, messages[, tools]) 的哈希索引；同一个请求出现多次时按出现顺序依次回放，超出录制次数后重复最后一次
+- 请求、响应块、工具参数和结果以 zlib 压缩的 JSON 存储
+
+录制整段会话时可以用 record_run() 记下智能体名和输入，benchmarks/replay.py 据此重放全部会话。
+用法：python -m core.cassette <path>  查看录制内容的概况
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from core.llm import HelloAgentsLLM
+from core.streaming import emit_token
+from log import get_logger
+
+logger = get_logger("cassette")
+
+MODES = ("record", "replay")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS llm_calls (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,             -- think: stream_think 文本块; tools: stream_with_tools 事件
+    key TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    role TEXT,
+    request BLOB NOT NULL,
+    events BLOB NOT NULL,           -- [[相对开始的秒数, 文本块或事件], ...]
+    duration REAL NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS llm_calls_key ON llm_calls (kind, key, seq);
+CREATE TABLE IF NOT EXISTS tool_calls (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    arguments BLOB NOT NULL,
+    result BLOB,
+    error TEXT,
+    duration REAL NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tool_calls_key ON tool_calls (name, key, seq);
+CREATE TABLE IF NOT EXISTS tools (name TEXT PRIMARY KEY, description TEXT, parameters TEXT);
+CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, agent TEXT NOT NULL, input TEXT NOT NULL, created REAL NOT NULL);
+"""
+
+
+class CassetteMiss(KeyError):
+    """回放时找不到对应的录制"""
+
+
+def _pack(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+
+def _unpack(blob: bytes) -> Any:
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def _hash(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    录制文件。同一个 Cassette 可以被多个线程共享(server 中的并发会话)。
+    """
+    def __init__(self, path: str, mode: str = "replay", speed: float = 0):
+        if mode not in MODES:
+            raise ValueError(f"mode 必须是 {MODES} 之一，当前为 {mode}")
+        if mode == "replay" and not os.path.exists(path):
+            raise FileNotFoundError(f"录制文件不存在：{path}")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        # 本次录制 / 回放中每个请求已经出现的次数
+        self._seen: Dict[Tuple[str, str, str], int] = defaultdict(int)
+
+    @classmethod
+    def from_env(cls) -> Optional["Cassette"]:
+        """CASSETTE_MODE=record|replay 时根据 CASSETTE_PATH / CASSETTE_SPEED 创建，否则返回 None"""
+        mode = os.getenv("CASSETTE_MODE")
+        if not mode:
+            return None
+        path = os.getenv("CASSETTE_PATH", os.path.join(".cache", "cassette.db"))
+        return cls(path, mode=mode, speed=float(os.getenv("CASSETTE_SPEED", "0")))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _next_seq(self, table: str, name: str, key: str) -> int:
+        with self._lock:
+            seq = self._seen[(table, name, key)]
+            self._seen[(table, name, key)] = seq + 1
+        return seq
+
+    def _wait_until(self, start: float, offset: float) -> None:
+        if self.speed <= 0:
+            return
+        delay = start + offset / self.speed - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    # --- 元信息 ---
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    # --- LLM ---
+    def record_llm(self, kind: str, key: str, role: Optional[str], request: Dict[str, Any],
+                   events: List[Tuple[float, Any]], duration: float) -> None:
+        seq = self._next_seq(kind, "", key)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO llm_calls (kind, key, seq, role, request, events, duration, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, key, seq, role, _pack(request), _pack(events), duration, time.time())
+            )
+
+    def lookup_llm(self, kind: str, key: str) -> List[Tuple[float, Any]]:
+        seq = self._next_seq(kind, "", key)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT events FROM llm_calls WHERE kind = ? AND key = ? AND seq <= ? ORDER BY seq DESC LIMIT 1",
+                (kind, key, seq)
+            ).fetchone()
+        if row is None:
+            raise CassetteMiss(f"录制中没有该 LLM 请求({kind}, {key[:12]})")
+        return _unpack(row[0])
+
+    def replay_events(self, events: List[Tuple[float, Any]]) -> Iterator[Any]:
+        """按录制的相对时间(除以 speed)依次产出"""
+        start = time.perf_counter()
+        for offset, event in events:
+            self._wait_until(start, offset)
+            yield event
+
+    # --- 工具 ---
+    def wrap_tools(self, tool_executor) -> Any:
+        """
+        原地包装 ToolExecutor 中已注册的工具：录制模式下记录每次调用的参数、结果和耗时，
+        回放模式下直接返回录制的结果，不再调用真实工具。返回 tool_executor 本身。
+        """
+        for name, info in tool_executor.tools.items():
+            if self.mode == "record":
+                with self._lock, self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO tools (name, description, parameters) VALUES (?, ?, ?)",
+                        (name, info["description"], json.dumps(info.get("parameters"), ensure_ascii=False))
+                    )
+            info["function"] = self._wrap_tool(name, info["function"])
+        return tool_executor
+
+    def tool_executor(self):
+        """回放时根据录制的工具列表重建 ToolExecutor，不需要真实的工具实现和密钥"""
+        from search_tool import ToolExecutor
+
+        def unavailable(*args, **kwargs):
+            raise RuntimeError("回放模式下工具不可用")
+
+        executor = ToolExecutor()
+        with self._lock:
+            rows = self._conn.execute("SELECT name, description, parameters FROM tools").fetchall()
+        for name, description, parameters in rows:
+            executor.registerTool(name, description, unavailable, json.loads(parameters) if parameters else None)
+        return self.wrap_tools(executor)
+
+    def _wrap_tool(self, name: str, func: Callable[..., Any]) -> Callable[..., Any]:
+        def recorded(*args, **kwargs):
+            arguments = {"args": list(args), "kwargs": kwargs}
+            key = _hash(arguments)
+            seq = self._next_seq("tool_calls", name, key)
+            if self.mode == "replay":
+                return self._replay_tool(name, key, seq)
+            start = time.perf_counter()
+            result, error = None, None
+            try:
+                result = func(*args, **kwargs)
+                return result
+            except Exception as e:
+                error = str(e)
+                raise
+            finally:
+                duration = time.perf_counter() - start
+                with self._lock, self._conn:
+                    self._conn.execute(
+                        "INSERT INTO tool_calls (name, key, seq, arguments, result, error, duration, created) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (name, key, seq, _pack(arguments), None if error else _pack(result), error, duration, time.time())
+                    )
+        return recorded
+
+    def _replay_tool(self, name: str, key: str, seq: int) -> Any:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, error, duration FROM tool_calls WHERE name = ? AND key = ? AND seq <= ? ORDER BY seq DESC LIMIT 1",
+                (name, key, seq)
+            ).fetchone()
+        if row is None:
+            raise CassetteMiss(f"录制中没有工具 '{name}' 的这次调用")
+        result, error, duration = row
+        self._wait_until(time.perf_counter(), duration)
+        if error is not None:
+            raise RuntimeError(error)
+        return _unpack(result)
+
+    # --- 会话 ---
+    def record_run(self, agent: str, input_text: str) -> None:
+        if self.mode != "record":
+            return
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO runs (agent, input, created) VALUES (?, ?, ?)", (agent, input_text, time.time()))
+
+    def runs(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            return self._conn.execute("SELECT agent, input FROM runs ORDER BY id").fetchall()
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            llm = self._conn.execute(
+                "SELECT COALESCE(role, '-'), COUNT(*), SUM(duration) FROM llm_calls GROUP BY role ORDER BY role"
+            ).fetchall()
+            tools = self._conn.execute(
+                "SELECT name, COUNT(*), SUM(duration) FROM tool_calls GROUP BY name ORDER BY name"
+            ).fetchall()
+            runs = self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+        return {
+            "llm": {role: {"calls": count, "seconds": round(total, 3)} for role, count, total in llm},
+            "tools": {name: {"calls": count, "seconds": round(total, 3)} for name, count, total in tools},
+            "runs": runs,
+        }
+
+
+class CassetteLLM(HelloAgentsLLM):
+    """
+    与 HelloAgentsLLM 接口一致的录制 / 回放客户端。
+    think() / think_structured() 都经由 stream_think()，因此只需要在 stream_think 和 stream_with_tools 上录制和回放。
+    """
+    def __init__(self, cassette: Cassette, llm: Optional[HelloAgentsLLM] = None):
+        if cassette.mode == "record" and llm is None:
+            raise ValueError("录制模式需要提供真实的 LLM 客户端。")
+        from core.generation import GenerationProfiles
+        self.cassette = cassette
+        self.llm = llm
+        if llm is not None:
+            # 录制：生成参数与被录制的客户端保持一致，请求经由 self.llm 发出
+            super().__init__(
+                model=llm.model, apiKey="cassette", baseUrl="cassette://record",
+                max_tokens=llm.max_tokens, profiles=llm.profiles, config=llm.config,
+                json_mode=llm.json_mode, echo_tokens=llm.echo_tokens, profile_calls=llm.profile_calls,
+            )
+            self.stream_usage = llm.stream_usage
+            cassette.set_meta("model", llm.model)
+        else:
+            # 回放：不需要(也可能没有)服务地址和密钥，用占位值初始化；openai 客户端是惰性创建的，不会被用到
+            super().__init__(
+                model=cassette.get_meta("model") or "cassette", apiKey="cassette", baseUrl="cassette://replay",
+                profiles=GenerationProfiles(auto_tune=False),
+            )
+
+    @classmethod
+    def record(cls, path: str, llm: Optional[HelloAgentsLLM] = None) -> "CassetteLLM":
+        return cls(Cassette(path, mode="record"), llm or HelloAgentsLLM())
+
+    @classmethod
+    def replay(cls, path: str, speed: float = 0) -> "CassetteLLM":
+        return cls(Cassette(path, mode="replay", speed=speed))
+
+    @property
+    def client(self):
+        if self.llm is None:
+            raise RuntimeError("回放模式下没有可用的 LLM 客户端。")
+        return self.llm.client
+
+    def stream_think(
+            self,
+            messages: List[Dict[str, str]],
+            temperature: Optional[float] = None,
+            max_tokens: Optional[int] = None,
+            stop: Optional[List[str]] = None,
+            role: Optional[str] = None,
+            response_format: Optional[Dict[str, Any]] = None
+    ) -> Iterator[str]:
+        # 生成参数(自动调整的 max_tokens、json 模式等)可能在录制和回放之间变化，不参与索引
+        key = _hash({"role": role, "messages": messages})
+        if self.cassette.mode == "replay":
+            for content in self.cassette.replay_events(self.cassette.lookup_llm("think", key)):
+                emit_token(content)
+                yield content
+            return
+        request = {
+            "messages": messages, "temperature": temperature, "max_tokens": max_tokens,
+            "stop": stop, "response_format": response_format,
+        }
+        stream = self.llm.stream_think(messages, temperature=temperature, max_tokens=max_tokens,
+                                       stop=stop, role=role, response_format=response_format)
+        yield from self._record("think", key, role, request, stream)
+
+    def stream_with_tools(self, messages, tools=None, temperature: float = 0, max_tokens: Optional[int] = None):
+        key = _hash({"messages": messages, "tools": [tool["function"]["name"] for tool in tools or []]})
+        if self.cassette.mode == "replay":
+            for event in self.cassette.replay_events(self.cassette.lookup_llm("tools", key)):
+                if event["type"] == "content":
+                    emit_token(event["content"])
+                yield event
+            return
+        request = {"messages": messages, "tools": tools, "temperature": temperature, "max_tokens": max_tokens}
+        stream = self.llm.stream_with_tools(messages, tools=tools, temperature=temperature, max_tokens=max_tokens)
+        yield from self._record("tools", key, None, request, stream)
+
+    def _record(self, kind: str, key: str, role: Optional[str], request: Dict[str, Any], stream: Iterator[Any]) -> Iterator[Any]:
+        """
+        透传真实的流并记录每个块相对开始的时间。
+        调用方提前停止消费(例如 think_structured 拿到完整 JSON 后)时录制已收到的部分；出错的请求不录制。
+        """
+        start = time.perf_counter()
+        events: List[Tuple[float, Any]] = []
+        try:
+            for event in stream:
+                events.append((round(time.perf_counter() - start, 4), event))
+                yield event
+        except GeneratorExit:
+            stream.close()
+        self.cassette.record_llm(kind, key, role, request, events, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("用法：python -m core.cassette <path>")
+        sys.exit(1)
+    print(json.dumps(Cassette(sys.argv[1]).summary(), ensure_ascii=False, indent=2))
@@ -0,0 +1,63 @@
+"""检查点存储：每完成一步就把智能体状态落盘，进程中断后可以通过 run_id 恢复，避免重复调用LLM和工具"""
+
+import os
+import re
+import json
+import uuid
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+# run_id 会拼进文件路径，只允许字母、数字、下划线和连字符，避免 "../x" 之类的 id 写到目录之外
+_RUN_ID_RE = re.compile(r"[A-Za-z0-9_-]+")
+
+
+class CheckpointStore:
+    """
+    基于本地文件的检查点存储，每个 run 对应一个 JSON 文件。
+
+    写入采用 "先写临时文件，再 os.replace" 的方式，保证进程在写入途中被杀掉时，
+    磁盘上留下的仍然是上一份完整的检查点，而不是半截 JSON。
+    """
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.getenv("CHECKPOINT_DIR", ".checkpoints")
+        os.makedirs(self.root, exist_ok=True)
+
+    def new_run_id(self) -> str:
+        return uuid.uuid4().hex
+
+    def _path(self, run_id: str) -> str:
+        if not isinstance(run_id, str) or not _RUN_ID_RE.fullmatch(run_id):
+            raise ValueError(f"非法的 run_id: {run_id!r}，只允许字母、数字、下划线和连字符。")
+        return os.path.join(self.root, f"{run_id}.json")
+
+    def save(self, run_id: str, state: Dict[str, Any]) -> None:
+        """保存(覆盖) run_id 对应的状态"""
+        state = dict(state, run_id=run_id, updated_at=datetime.now().isoformat())
+        path = self._path(run_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def load(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """读取 run_id 对应的状态，不存在时返回 None"""
+        try:
+            with open(self._path(run_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def delete(self, run_id: str) -> None:
+        try:
+            os.remove(self._path(run_id))
+        except FileNotFoundError:
+            pass
+
+    def list_runs(self) -> List[str]:
+        return sorted(
+            name[:-len(".json")]
+            for name in os.listdir(self.root)
+            if name.endswith(".json")
+        )
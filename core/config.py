@@ -17,6 +17,13 @@ class Config(BaseModel):
     debug: bool = False
     log_level: str = "INFO"
 
+    # 性能剖析(core.profiling)：被抽样的运行比例(0~1)、报告目录、调用栈采样间隔(秒)
+    profile_sample_rate: float = 0.0
+    profile_dir: str = ".profiles"
+    profile_interval: float = 0.005
+    # 是否同样抽样剖析智能体之外直接发起的 HelloAgentsLLM.think() / think_structured() 调用
+    profile_llm_calls: bool = False
+
     # 其他
     max_history_length: int = 100
 
@@ -27,7 +34,11 @@ class Config(BaseModel):
             debug=os.getenv("DEBUG", "false").lower() == "true",
             log_level = os.getenv("LOG_LEVEL", "INFO"),
             temperature = float(os.getenv("TEMPERATURE", "0.7")),
-            max_tokens = int(os.getenv("MAX_TOKENS")) if os.getenv("MAX_TOKENS") else None
+            max_tokens = int(os.getenv("MAX_TOKENS")) if os.getenv("MAX_TOKENS") else None,
+            profile_sample_rate = float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+            profile_dir = os.getenv("PROFILE_DIR", ".profiles"),
+            profile_interval = float(os.getenv("PROFILE_INTERVAL", "0.005")),
+            profile_llm_calls = os.getenv("PROFILE_LLM_CALLS", "false").lower() == "true"
         )
     
     def to_dict(self) -> Dict[str, any]:
@@ -0,0 +1,171 @@
+"""
+按角色划分的生成参数(max_tokens / temperature / stop)，并根据本地记录的输出长度分位数自动调整 max_tokens。
+
+Reflection 的 JSON 结论、Executor 的"只回答当前步骤"等调用本应很短，
+为它们设置各自的 max_tokens 上限可以截断失控的长输出，降低尾延迟。
+"""
+
+import os
+import math
+import atexit
+import threading
+from typing import Optional, List, Dict
+
+from pydantic import BaseModel
+
+from core.state_file import load_json, update_json
+
+
+class GenerationProfile(BaseModel):
+    """单个角色的生成参数"""
+    max_tokens: Optional[int] = None          # 上限，自动调整不会超过该值
+    min_tokens: int = 64                      # 自动调整的下限
+    temperature: float = 0
+    stop: Optional[List[str]] = None
+
+
+DEFAULT_PROFILES: Dict[str, GenerationProfile] = {
+    "planner": GenerationProfile(max_tokens=1024, temperature=0),
+    "executor_step": GenerationProfile(max_tokens=512, temperature=0),
+    # ReAct 每一步只需要 Thought + Action，模型自己编造的 Observation 直接截断
+    "react_step": GenerationProfile(max_tokens=512, temperature=0, stop=["Observation:"]),
+    "initial": GenerationProfile(max_tokens=2048, temperature=0.3),
+    "reflect": GenerationProfile(max_tokens=512, temperature=0.1),
+    "refine": GenerationProfile(max_tokens=2048, temperature=0.2, min_tokens=256),
+}
+
+
+class GenerationStats:
+    """
+    一个统计文件中各角色的输出长度样本(每个角色保留最近 window 个)。
+
+    同一进程内每个文件只有一个实例(用 for_path 获取)，所有 GenerationProfiles / HelloAgentsLLM 共享，
+    进程退出时保存一次。保存时在文件锁内与文件中的样本合并，只追加本进程新增的样本，多个进程不会互相覆盖。
+    """
+    _instances: Dict[str, "GenerationStats"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, path: str, window: int = 500):
+        self.path = path
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = self._parse(load_json(path))
+        self._pending: Dict[str, List[int]] = {}
+
+    @classmethod
+    def for_path(cls, path: str, window: int = 500) -> "GenerationStats":
+        key = os.path.abspath(path)
+        with cls._instances_lock:
+            stats = cls._instances.get(key)
+            if stats is None:
+                stats = cls._instances[key] = cls(key, window)
+                atexit.register(stats.save)
+            return stats
+
+    def add(self, role: str, completion_tokens: int) -> int:
+        """记录一个样本，返回尚未保存的样本数"""
+        with self._lock:
+            samples = self._samples.setdefault(role, [])
+            samples.append(completion_tokens)
+            del samples[:-self.window]
+            self._pending.setdefault(role, []).append(completion_tokens)
+            return sum(len(values) for values in self._pending.values())
+
+    def samples(self, role: str) -> List[int]:
+        with self._lock:
+            return list(self._samples.get(role, []))
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+
+            def merge(data):
+                merged = self._parse(data)
+                for role, values in pending.items():
+                    merged[role] = (merged.get(role, []) + values)[-self.window:]
+                return merged
+
+            # 合并后的内容也包含其他进程新增的样本
+            self._samples = update_json(self.path, merge)
+
+    @staticmethod
+    def _parse(data) -> Dict[str, List[int]]:
+        try:
+            return {role: [int(v) for v in values] for role, values in data.items()}
+        except (AttributeError, TypeError, ValueError):
+            return {}
+
+
+class GenerationProfiles:
+    """
+    角色 -> 生成参数 的注册表。
+
+    auto_tune=True 时记录每个角色的实际输出 token 数(服务端 usage.completion_tokens，缺失时按文本估算)，
+    样本足够后 max_tokens 取 分位数 * headroom，并限制在 [min_tokens, profile.max_tokens] 之间。
+    被 max_tokens 截断的输出按上限的两倍记录，避免统计值被截断结果越压越低。
+    """
+    def __init__(
+            self,
+            profiles: Optional[Dict[str, GenerationProfile]] = None,
+            max_tokens_ceiling: Optional[int] = None,
+            auto_tune: Optional[bool] = None,
+            stats_path: Optional[str] = None,
+            percentile: float = 0.95,
+            headroom: float = 1.5,
+            min_samples: int = 20,
+            window: int = 500
+    ):
+        self.profiles = dict(DEFAULT_PROFILES)
+        self.profiles.update(profiles or {})
+        self.max_tokens_ceiling = max_tokens_ceiling
+        if auto_tune is None:
+            auto_tune = os.getenv("GENERATION_AUTOTUNE", "true").lower() == "true"
+        self.auto_tune = auto_tune
+        self.stats_path = stats_path or os.getenv("GENERATION_STATS_PATH", os.path.join(".cache", "generation_stats.json"))
+        self.percentile = percentile
+        self.headroom = headroom
+        self.min_samples = min_samples
+        self.stats = GenerationStats.for_path(self.stats_path, window) if auto_tune else None
+
+    def get(self, role: str) -> GenerationProfile:
+        """返回角色的生成参数(已应用全局上限和自动调整后的 max_tokens)"""
+        profile = self.profiles.get(role, GenerationProfile())
+        max_tokens = profile.max_tokens
+        tuned = self._tuned_max_tokens(role, profile)
+        if tuned is not None:
+            max_tokens = tuned
+        if self.max_tokens_ceiling:
+            max_tokens = min(max_tokens or self.max_tokens_ceiling, self.max_tokens_ceiling)
+        return profile.model_copy(update={"max_tokens": max_tokens})
+
+    def observe(self, role: str, completion_tokens: int, truncated: bool = False) -> None:
+        """记录一次生成的输出长度"""
+        if not self.auto_tune:
+            return
+        if truncated:
+            completion_tokens *= 2
+        if self.stats.add(role, completion_tokens) >= 10:
+            self.stats.save()
+
+    def percentiles(self, role: str) -> Dict[str, float]:
+        """返回角色输出长度的 p50 / p95 / p99，便于观察"""
+        samples = sorted(self.stats.samples(role)) if self.stats else []
+        if not samples:
+            return {}
+        return {f"p{int(q * 100)}": samples[min(int(q * len(samples)), len(samples) - 1)] for q in (0.5, 0.95, 0.99)}
+
+    def _tuned_max_tokens(self, role: str, profile: GenerationProfile) -> Optional[int]:
+        if not self.auto_tune:
+            return None
+        samples = sorted(self.stats.samples(role))
+        if len(samples) < self.min_samples:
+            return None
+        value = samples[min(int(self.percentile * len(samples)), len(samples) - 1)]
+        tuned = max(math.ceil(value * self.headroom), profile.min_tokens)
+        return min(tuned, profile.max_tokens) if profile.max_tokens else tuned
+
+    def save(self) -> None:
+        if self.stats:
+            self.stats.save()
@@ -0,0 +1,157 @@
+"""
+容错 JSON 解析：边接收流式输出边扫描，结束时修复常见的格式问题。
+
+能处理的情况：
+- JSON 前后有多余文本或 ``` / ```json 代码块
+- 输出被截断：未闭合的字符串、对象、数组
+- 多余的尾逗号(完整和被截断的 JSON 都会处理，字符串内的逗号不受影响)、缺少值的键
+- 对象没有闭合就接上了其他文本：退回到最后一个闭合的括号处再补全
+"""
+
+import json
+from typing import Any, List, Optional
+
+
+class TolerantJSONParser:
+    """
+    增量扫描器：feed() 只处理新到达的内容，维护 "是否在字符串内 / 括号栈" 等状态，
+    因此整个流的扫描是线性的；finish() 根据扫描状态补全并解析。
+    """
+    def __init__(self):
+        self.text = ""
+        self._start: Optional[int] = None     # 第一个 '{' 或 '[' 的位置
+        self._end: Optional[int] = None       # 顶层 JSON 闭合的位置
+        self._last_close: Optional[int] = None  # 最后一个闭合括号之后的位置
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> None:
+        self.text += chunk
+        self._scan()
+
+    @property
+    def complete(self) -> bool:
+        """顶层 JSON 是否已经闭合"""
+        return self._end is not None
+
+    def _scan(self) -> None:
+        text = self.text
+        while self._pos < len(text) and self._end is None:
+            ch = text[self._pos]
+            if self._start is None:
+                if ch in "{[":
+                    self._start = self._pos
+                    self._stack.append(ch)
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._stack.append(ch)
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                self._last_close = self._pos + 1
+                if not self._stack:
+                    self._end = self._pos + 1
+            self._pos += 1
+
+    def finish(self) -> Any:
+        """返回解析结果，无法修复时抛出 ValueError"""
+        if self._start is None:
+            raise ValueError("输出中没有找到 JSON")
+        body = _strip_trailing_commas(self.text[self._start:self._end] if self._end else self.text[self._start:])
+        try:
+            return json.loads(body)
+        except json.JSONDecodeError:
+            pass
+        if self._end is None:
+            attempts = [(body, self._in_string, 0)]
+            if self._last_close is not None:
+                # 例如 '{"a": {"b": 1} 后面的文本'：丢掉最后一个闭合括号之后的内容再补全
+                prefix = _strip_trailing_commas(self.text[self._start:self._last_close])
+                attempts.append((prefix, False, 0))
+            # 最后才逐步回退到上一个逗号，这会丢掉末尾的部分内容
+            attempts.append((body, self._in_string, 8))
+            for text, in_string, max_cuts in attempts:
+                repaired = _close(text, in_string, max_cuts)
+                if repaired is not None:
+                    return repaired
+        raise ValueError(f"无法解析为 JSON：{body[:200]}")
+
+
+def _strip_trailing_commas(text: str) -> str:
+    """去掉 '}' / ']' 前面多余的逗号，字符串内的内容保持不变"""
+    out: List[str] = []
+    in_string = escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == ",":
+            j = i + 1
+            while j < len(text) and text[j].isspace():
+                j += 1
+            if j < len(text) and text[j] in "}]":
+                continue
+        out.append(ch)
+    return "".join(out)
+
+
+def _close(body: str, in_string: bool, max_cuts: int) -> Any:
+    """补全被截断的 JSON；失败时最多 max_cuts 次回退到上一个逗号再试"""
+    candidate = body + ('"' if in_string else "")
+    for _ in range(max_cuts + 1):
+        trimmed = candidate.rstrip()
+        if trimmed.endswith(","):
+            trimmed = trimmed[:-1]
+        elif trimmed.endswith(":"):
+            trimmed += " null"
+        closing = "".join("}" if opener == "{" else "]" for opener in reversed(_open_brackets(trimmed)))
+        try:
+            return json.loads(trimmed + closing)
+        except json.JSONDecodeError:
+            cut = trimmed.rfind(",")
+            if cut <= 0:
+                return None
+            candidate = trimmed[:cut]
+    return None
+
+
+def _open_brackets(text: str) -> List[str]:
+    stack: List[str] = []
+    in_string = escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]" and stack:
+            stack.pop()
+    return stack
+
+
+def parse_json_tolerant(text: str) -> Any:
+    parser = TolerantJSONParser()
+    parser.feed(text)
+    return parser.finish()
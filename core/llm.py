@@ -1,20 +1,67 @@
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
-from typing import List, Dict
+import json
+import time
+import logging
+from typing import List, Dict, Iterator, Any, Optional, Tuple, Type, TypeVar, TYPE_CHECKING
+from core.runtime import load_env, init
+from core.streaming import RunCancelled, emit_token
+from core.json_repair import TolerantJSONParser
+from core.tokens import estimate_tokens
+from core.profiling import profiled_call, profiled_stream
+from log import get_logger
 
-# 加载 .env 文件中的环境变量
-load_dotenv()
+if TYPE_CHECKING:
+    from pydantic import BaseModel
+    from core.config import Config
+    from core.generation import GenerationProfiles
+
+    SchemaT = TypeVar("SchemaT", bound=BaseModel)
+
+# json_schema: 按 pydantic 模型生成 JSON Schema 约束输出(需要服务端支持)
+# json_object: 只保证输出是合法 JSON 对象
+# off:         不传 response_format，仅靠提示词约束
+JSON_MODES = ("json_schema", "json_object", "off")
+
+logger = get_logger("llm")
+
+STRUCTURED_REPAIR_PROMPT_TEMPLATE = """
+你上一次的输出无法通过校验：
+{error}
+
+请只输出一个符合以下 JSON Schema 的 JSON 对象，不要使用 Markdown，不要包含任何其他文本：
+{schema}
+"""
 
 class HelloAgentsLLM:
     """
     为本书 "Hello Agents" 定制的LLM客户端。
     它用于调用任何兼容OpenAI接口的服务，并默认使用流式响应。
     """
-    def __init__(self, model: str = None, apiKey: str = None, baseUrl: str = None, timeout: int = None):
+    def __init__(
+            self,
+            model: str = None,
+            apiKey: str = None,
+            baseUrl: str = None,
+            timeout: int = None,
+            max_tokens: Optional[int] = None,
+            profiles: Optional["GenerationProfiles"] = None,
+            config: Optional["Config"] = None,
+            json_mode: Optional[str] = None,
+            echo_tokens: Optional[bool] = None,
+            profile_calls: Optional[bool] = None
+    ):
         """
         初始化客户端。优先使用传入参数，如果未提供，则从环境变量加载。
+        openai SDK 推迟到第一次发起请求时才导入和创建。
+        - max_tokens: 所有调用的生成长度上限，未传入时使用 config.max_tokens
+        - config:     未传入时使用 Config.from_env()
+        - profiles:   按角色划分的生成参数，调用时通过 role 参数选择
+        - json_mode:  think_structured() 使用的 response_format 模式(见 JSON_MODES，对应 LLM_JSON_MODE)
+        - echo_tokens: think() 是否把生成内容实时打印到终端(对应 LLM_ECHO_TOKENS，默认关闭)
+        - profile_calls: 是否抽样剖析直接发起的 think() / think_structured() 调用，未传入时使用 config.profile_llm_calls
         """
+        # 加载 .env 文件中的环境变量
+        load_env()
         self.model = model or os.getenv("LLM_MODEL_ID")
         apiKey = apiKey or os.getenv("LLM_API_KEY")
         baseUrl = baseUrl or os.getenv("LLM_BASE_URL")
@@ -22,49 +69,302 @@ class HelloAgentsLLM:
         
         if not all([self.model, apiKey, baseUrl]):
             raise ValueError("模型ID、API密钥和服务地址必须被提供或在.env文件中定义。")
-        # 构建了self.client 即openai的客户端
-        self.client = OpenAI(api_key=apiKey, base_url=baseUrl, timeout=timeout)
+        self._client_kwargs = {"api_key": apiKey, "base_url": baseUrl, "timeout": timeout}
+        self._client = None
+
+        from core.config import Config
+        from core.generation import GenerationProfiles
+        self.config = config or Config.from_env()
+        self.max_tokens = max_tokens or self.config.max_tokens
+        self.profiles = profiles or GenerationProfiles(max_tokens_ceiling=self.max_tokens)
+        # 流式响应末尾附带 usage(stream_options.include_usage)；服务端不支持时自动关闭
+        self.stream_usage = True
+        self.json_mode = json_mode or os.getenv("LLM_JSON_MODE", "json_object")
+        if self.json_mode not in JSON_MODES:
+            raise ValueError(f"LLM_JSON_MODE 必须是 {JSON_MODES} 之一，当前为 {self.json_mode}")
+        if echo_tokens is None:
+            echo_tokens = os.getenv("LLM_ECHO_TOKENS", "false").lower() == "true"
+        self.echo_tokens = echo_tokens
+        self.profile_calls = self.config.profile_llm_calls if profile_calls is None else profile_calls
+
+    @property
+    def client(self):
+        """self.client 即openai的客户端，第一次访问时才创建"""
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(**self._client_kwargs)
+        return self._client
+
+    def _generation_kwargs(
+            self,
+            role: Optional[str],
+            temperature: Optional[float],
+            max_tokens: Optional[int],
+            stop: Optional[List[str]]
+    ) -> Dict[str, Any]:
+        """合并 角色参数 与 调用时显式传入的参数(显式参数优先)"""
+        profile = self.profiles.get(role) if role else None
+        kwargs: Dict[str, Any] = {
+            "temperature": temperature if temperature is not None else (profile.temperature if profile else 0)
+        }
+        max_tokens = max_tokens or (profile.max_tokens if profile else None) or self.max_tokens
+        if max_tokens:
+            kwargs["max_tokens"] = min(max_tokens, self.max_tokens) if self.max_tokens else max_tokens
+        stop = stop if stop is not None else (profile.stop if profile else None)
+        if stop:
+            kwargs["stop"] = stop
+        return kwargs
+
+    @profiled_stream("llm")
+    def stream_think(
+            self,
+            messages: List[Dict[str, str]],
+            temperature: Optional[float] = None,
+            max_tokens: Optional[int] = None,
+            stop: Optional[List[str]] = None,
+            role: Optional[str] = None,
+            response_format: Optional[Dict[str, Any]] = None
+    ) -> Iterator[str]:
+        """
+        stream_think() ————以生成器的形式逐块产出模型的响应内容
+        调用方可以边接收边处理(例如边生成计划边开始执行)，不会打印任何内容，出错时异常直接抛给调用方。
+        每个内容块同时会转发给当前会话绑定的 token 回调(见 core.streaming)。
+        role 用于选择生成参数(见 core.generation)，并记录该角色的输出 token 数用于自动调整 max_tokens：
+        优先使用服务端返回的 usage.completion_tokens，没有时按文本估算(一个 chunk 可能包含多个 token)。
+        """
+        kwargs = self._generation_kwargs(role, temperature, max_tokens, stop)
+        if response_format:
+            kwargs["response_format"] = response_format
+        response = self._create_stream(messages, kwargs)
+        pieces: List[str] = []
+        usage_tokens: Optional[int] = None
+        finish_reason = None
+        observed = False
+        try:
+            # 每次迭代获取一个数据块
+            for chunk in response:
+                usage = getattr(chunk, "usage", None)
+                if usage is not None and usage.completion_tokens is not None:
+                    usage_tokens = usage.completion_tokens
+                if not chunk.choices:
+                    continue
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+                # 为什么需要 or ""？  ————有些 chunk 只包含 metadata（如 role、finish_reason），没有 content
+                content = chunk.choices[0].delta.content or ""
+                if content:
+                    pieces.append(content)
+                    emit_token(content)
+                    yield content
+            observed = True
+        except GeneratorExit:
+            # 调用方提前停止消费(例如结构化输出的 JSON 已经闭合)：已生成的部分仍是有效样本
+            observed = True
+            raise
+        finally:
+            # 提前退出(取消、调用方不再消费)时关闭连接，服务端随之停止生成
+            response.close()
+            if role and observed:
+                if usage_tokens is None:
+                    usage_tokens = estimate_tokens("".join(pieces))
+                self.profiles.observe(role, usage_tokens, truncated=finish_reason == "length")
+
+    def _create_stream(self, messages: List[Dict[str, Any]], kwargs: Dict[str, Any]):
+        if not self.stream_usage:
+            return self.client.chat.completions.create(model=self.model, messages=messages, stream=True, **kwargs)
+        try:
+            return self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                stream=True, # stream 是 Generator，返回的每个chunk是 ChatCompletionChunk, 若为False,则为一次性完整输出
+                stream_options={"include_usage": True},
+                **kwargs
+            )
+        except Exception as e:
+            # 只有明确指出 stream_options 的 400 才是不支持该参数；其他 400(例如上下文过长)直接交给调用方
+            if getattr(e, "status_code", None) != 400 or "stream_options" not in str(e):
+                raise
+            # 部分兼容服务不认识 stream_options：关闭后重试一次
+            logger.warning("服务端不支持 stream_options，改为按文本估算输出 token 数：%s", e)
+            self.stream_usage = False
+            return self.client.chat.completions.create(model=self.model, messages=messages, stream=True, **kwargs)
 
-    def think(self, messages: List[Dict[str, str]], temperature: float = 0) -> str:
+    @profiled_stream("llm")
+    def stream_with_tools(
+            self,
+            messages: List[Dict[str, Any]],
+            tools: Optional[List[Dict[str, Any]]] = None,
+            temperature: float = 0,
+            max_tokens: Optional[int] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        stream_with_tools() ————使用 OpenAI 原生 function calling (tools 参数) 的流式调用
+        逐块产出 {"type": "content", "content": str}；
+        若模型决定调用工具，最后产出一个 {"type": "tool_calls", "tool_calls": [{"id", "name", "arguments"}, ...]}。
+        流式返回的 tool_calls 是按 index 分片的增量，这里负责拼接成完整的调用。
+        """
+        kwargs = self._generation_kwargs(None, temperature, max_tokens, None)
+        if tools:
+            kwargs["tools"] = tools
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True,
+            **kwargs
+        )
+        tool_calls: Dict[int, Dict[str, str]] = {}
+        try:
+            for chunk in response:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    emit_token(delta.content)
+                    yield {"type": "content", "content": delta.content}
+                for call in delta.tool_calls or []:
+                    entry = tool_calls.setdefault(call.index, {"id": "", "name": "", "arguments": ""})
+                    if call.id:
+                        entry["id"] = call.id
+                    if call.function and call.function.name:
+                        entry["name"] += call.function.name
+                    if call.function and call.function.arguments:
+                        entry["arguments"] += call.function.arguments
+        finally:
+            response.close()
+        if tool_calls:
+            yield {"type": "tool_calls", "tool_calls": [tool_calls[i] for i in sorted(tool_calls)]}
+
+    @profiled_call
+    def think(
+            self,
+            messages: List[Dict[str, str]],
+            temperature: Optional[float] = None,
+            max_tokens: Optional[int] = None,
+            stop: Optional[List[str]] = None,
+            role: Optional[str] = None
+    ) -> str:
         """
         think() ————向大语言模型发送消息并获取响应
         流程：
-            1. 打印开始调用提示
+            1. 记录开始调用日志
             2. 创建流式 API 请求
             3. 迭代处理每个响应块
             4. 收集并返回完整响应
-                4.1 实时显示：逐块显示生成内容
+                4.1 实时显示：echo_tokens 开启时逐块打印生成内容(默认关闭，热路径上不写终端)
                 4.2 内存高效：无需等待完整响应即可开始处理
-                4.3 用户体验好：提供实时反馈
+                4.3 token 仍会转发给会话的 token 回调(见 core.streaming)
             5. 处理异常情况
         """
-        print(f"🧠 正在调用 {self.model} 模型...")
+        logger.info("正在调用模型", extra={"model": self.model, "role": role})
+        start = time.perf_counter()
+        chunk_debug = logger.isEnabledFor(logging.DEBUG)
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature,
-                stream=True, # stream 是 Generator，返回的每个chunk是 ChatCompletionChunk, 若为False,则为一次性完整输出
-            )
-            
             # 处理流式响应
-            print("✅ 大语言模型响应成功:")
             collected_content = []
-             # 每次迭代获取一个数据块
-            for chunk in response:  
-                # 为什么需要 or ""？  ————有些 chunk 只包含 metadata（如 role、finish_reason），没有 content
-                content = chunk.choices[0].delta.content or ""
-                print(content, end="", flush=True)
+            for content in self.stream_think(messages, temperature=temperature, max_tokens=max_tokens, stop=stop, role=role):
+                if self.echo_tokens:
+                    print(content, end="", flush=True)
+                if chunk_debug:
+                    logger.debug("收到响应块", extra={"sample": "llm.chunk", "chars": len(content)})
                 collected_content.append(content)    # O(1) 操作
-            print()  # 在流式输出结束后换行
-            return "".join(collected_content)        # 一次性拼接，O(n) 效率
+            if self.echo_tokens:
+                print()  # 在流式输出结束后换行
+            text = "".join(collected_content)        # 一次性拼接，O(n) 效率
+            logger.info("模型响应成功", extra={
+                "model": self.model, "role": role, "chars": len(text),
+                "seconds": round(time.perf_counter() - start, 3),
+            })
+            logger.debug("模型响应内容", extra={"role": role, "content": text})
+            return text
 
+        except RunCancelled:
+            raise
         except Exception as e:
-            print(f"❌ 调用LLM API时发生错误: {e}")
+            logger.error("调用LLM API时发生错误: %s", e, extra={"model": self.model, "role": role})
             return None         # 返回安全值而不是崩溃
 
+    @profiled_call
+    def think_structured(
+            self,
+            messages: List[Dict[str, str]],
+            schema: Type["SchemaT"],
+            temperature: Optional[float] = None,
+            max_tokens: Optional[int] = None,
+            role: Optional[str] = None
+    ) -> Optional["SchemaT"]:
+        """
+        think_structured() ————获取符合 pydantic 模型 schema 的结构化输出
+        1. 服务端支持时通过 response_format 请求 JSON / JSON Schema 模式；服务端拒绝该参数时自动降级为 off
+        2. 流式输出边接收边送入容错 JSON 解析器(core.json_repair)，顶层 JSON 闭合后立即停止接收
+        3. 用 schema 校验；失败时把错误和 schema 发给模型进行一次针对性修复
+        两次都失败时返回 None。
+        """
+        logger.info("正在调用模型(结构化输出)", extra={"model": self.model, "role": role, "schema": schema.__name__})
+        text, result, error = self._structured_attempt(messages, schema, temperature, max_tokens, role)
+        if result is not None:
+            logger.debug("结构化输出", extra={"role": role, "content": text})
+            return result
+        if not text:
+            logger.error(error, extra={"model": self.model, "role": role})
+            return None
+
+        logger.warning("结构化输出校验失败，尝试让模型修复：%s", error, extra={"role": role, "content": text})
+        repair_messages = list(messages) + [
+            {"role": "assistant", "content": text},
+            {"role": "user", "content": STRUCTURED_REPAIR_PROMPT_TEMPLATE.format(
+                error=error, schema=json.dumps(schema.model_json_schema(), ensure_ascii=False)
+            )},
+        ]
+        text, result, error = self._structured_attempt(repair_messages, schema, temperature, max_tokens, role)
+        if result is None:
+            logger.error("修复后仍然无法通过校验：%s", error, extra={"role": role, "content": text})
+            return None
+        logger.info("结构化输出修复成功", extra={"role": role, "schema": schema.__name__})
+        return result
+
+    def _response_format(self, schema: Type["BaseModel"]) -> Optional[Dict[str, Any]]:
+        if self.json_mode == "json_schema":
+            return {
+                "type": "json_schema",
+                "json_schema": {"name": schema.__name__, "schema": schema.model_json_schema()},
+            }
+        if self.json_mode == "json_object":
+            return {"type": "json_object"}
+        return None
+
+    def _structured_attempt(
+            self,
+            messages: List[Dict[str, str]],
+            schema: Type["SchemaT"],
+            temperature: Optional[float],
+            max_tokens: Optional[int],
+            role: Optional[str]
+    ) -> Tuple[str, Optional["SchemaT"], Optional[str]]:
+        """单次结构化调用，返回 (原始输出, 校验通过的对象或 None, 错误信息)"""
+        parser = TolerantJSONParser()
+        try:
+            for content in self.stream_think(
+                    messages, temperature=temperature, max_tokens=max_tokens, role=role,
+                    response_format=self._response_format(schema)
+            ):
+                parser.feed(content)
+                if parser.complete:
+                    break
+        except RunCancelled:
+            raise
+        except Exception as e:
+            if self.json_mode != "off" and not parser.text and getattr(e, "status_code", None) == 400:
+                logger.warning("服务端不支持 response_format(%s)，改为仅用提示词约束 JSON 输出", self.json_mode)
+                self.json_mode = "off"
+                return self._structured_attempt(messages, schema, temperature, max_tokens, role)
+            return parser.text, None, f"调用LLM API时发生错误: {e}"
+        try:
+            return parser.text, schema.model_validate(parser.finish()), None
+        except ValueError as e:     # pydantic 的 ValidationError 也是 ValueError
+            return parser.text, None, str(e)
+
 # --- 客户端使用示例 ---
 if __name__ == '__main__':
+    init()
     try:
         llmClient = HelloAgentsLLM()
         
@@ -0,0 +1,253 @@
+"""
+计划模板缓存：结构相同、只是数字或实体不同的问题复用同一份计划，跳过 Planner 的 LLM 调用。
+
+1. 规范化：只把问题中的数字和明确标出的实体替换为 <NUM0> / <ENT0> 等占位符，得到模板
+   "一个水果店周一卖出了15个苹果..." -> "一个水果店周一卖出了<NUM0>个苹果..."
+   实体只包括引号/书名号中的内容，以及不在句首的首字母大写的英文专有名词(连续的算一个，如 New York)；
+   普通英文单词和全大写缩写(GDP、CEO)保留原文，否则 "What is the GDP of France" 和
+   "Who is the CEO of Apple" 会得到同一个模板。
+   模板中保留下来的字面词(英文单词、汉字)少于 PLAN_CACHE_MIN_LITERALS 个时不缓存也不查找：
+   问题几乎全是槽位时，模板相同并不能说明问题结构相同
+2. 存储：运行成功后，把计划中出现的槽位值同样替换为占位符，按模板保存
+   校验不通过的计划不缓存：
+   - 计划中含有问题里没有的数字(通常是已经算好的中间结果，换一组数字就是错的)
+   - 问题中同一个值出现了多次，并且计划引用了这个值(无法确定对应哪个槽位)
+3. 命中：用新问题的槽位值填回占位符，直接作为计划执行
+
+条目按 LRU 淘汰，记录每个模板的命中次数，并持久化为 JSON({模板: {"plan": [...], "hits": n}}，按 LRU 顺序)。
+同一进程内每个文件只有一个实例(用 for_path 获取)；新增条目和命中次数先记在内存中，
+累计 SAVE_EVERY 次变更或进程退出时才在文件锁内与文件内容合并写回(见 core.state_file)，多个进程不会互相覆盖。
+"""
+
+import os
+import re
+import atexit
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.state_file import load_json, update_json
+
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?%?")
+_QUOTED_RE = re.compile(r"“[^”]+”|\"[^\"]+\"|「[^」]+」|《[^》]+》|'[^']+'")
+# 首字母大写、其余含小写字母的英文单词(Apple、New York)；全大写的缩写不算
+_PROPER_NOUN_RE = re.compile(r"\b[A-Z][a-z][A-Za-z\-]*(?:\s+[A-Z][a-z][A-Za-z\-]*)*\b")
+_PLACEHOLDER_RE = re.compile(r"<(NUM|ENT)(\d+)>")
+# 一次扫描完成替换，已经生成的占位符不会被再次当作实体或数字
+_SLOT_RE = re.compile(
+    rf"(?P<quoted>{_QUOTED_RE.pattern})|(?P<proper>{_PROPER_NOUN_RE.pattern})|(?P<num>{_NUMBER_RE.pattern})"
+)
+_SENTENCE_END = ".?!。？！"
+# 模板中的字面词：英文单词按词计，汉字按字计
+_LITERAL_RE = re.compile(r"[A-Za-z]+|[一-鿿]")
+
+# 累计多少次变更(新增条目或命中)后写回文件
+SAVE_EVERY = 10
+
+
+def normalize_question(question: str) -> Tuple[str, List[str], List[str]]:
+    """返回 (模板, 数字槽位, 实体槽位)"""
+    entities: List[str] = []
+    numbers: List[str] = []
+
+    def mask(match: re.Match) -> str:
+        if match.group("num"):
+            numbers.append(match.group("num"))
+            return f"<NUM{len(numbers) - 1}>"
+        if match.group("proper"):
+            # 句首的大写只是语法上的大写(What / How ...)，不是实体
+            before = match.string[:match.start()].rstrip()
+            if not before or before[-1] in _SENTENCE_END:
+                return match.group(0)
+        entities.append(match.group(0))
+        return f"<ENT{len(entities) - 1}>"
+
+    template = _SLOT_RE.sub(mask, " ".join(question.split()))
+    return template.rstrip("。？?！!. "), numbers, entities
+
+
+def literal_count(template: str) -> int:
+    """模板中去掉占位符后剩下的字面词数量"""
+    return len(_LITERAL_RE.findall(_PLACEHOLDER_RE.sub(" ", template)))
+
+
+def _value_pattern(value: str) -> re.Pattern:
+    """数字只匹配完整的数(15 不匹配 150 或 1.5)"""
+    if _NUMBER_RE.fullmatch(value):
+        tail = "" if value.endswith("%") else r"(?!\d|\.\d|%)"
+        return re.compile(rf"(?<![\d.]){re.escape(value)}{tail}")
+    return re.compile(re.escape(value))
+
+
+def templatize_plan(plan: List[str], numbers: List[str], entities: List[str]) -> Optional[List[str]]:
+    """把计划中的槽位值替换为占位符；校验不通过时返回 None"""
+    slots = [(f"<NUM{i}>", value) for i, value in enumerate(numbers)] + \
+            [(f"<ENT{i}>", value) for i, value in enumerate(entities)]
+    values = [value for _, value in slots]
+    templated = []
+    for step in plan:
+        # 长的值先替换，避免 "150" 中的 "15" 被误替换
+        for placeholder, value in sorted(slots, key=lambda slot: -len(slot[1])):
+            pattern = _value_pattern(value)
+            if not pattern.search(step):
+                continue
+            if values.count(value) > 1:
+                return None
+            step = pattern.sub(placeholder, step)
+        if _NUMBER_RE.search(_PLACEHOLDER_RE.sub("", step)):
+            return None
+        templated.append(step)
+    return templated
+
+
+def instantiate_plan(template_plan: List[str], numbers: List[str], entities: List[str]) -> Optional[List[str]]:
+    """用新问题的槽位值填回占位符，槽位数量不匹配时返回 None"""
+    plan = []
+    for step in template_plan:
+        missing = False
+
+        def fill(match: re.Match) -> str:
+            nonlocal missing
+            slots = numbers if match.group(1) == "NUM" else entities
+            index = int(match.group(2))
+            if index >= len(slots):
+                missing = True
+                return match.group(0)
+            return slots[index]
+
+        step = _PLACEHOLDER_RE.sub(fill, step)
+        if missing:
+            return None
+        plan.append(step)
+    return plan
+
+
+class PlanCache:
+    """
+    模板 -> 计划模板 的 LRU 缓存，可被多个线程共享。
+    - min_literals: 模板中至少保留的字面词数量，不足时不参与缓存
+    """
+    _instances: Dict[str, "PlanCache"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, capacity: Optional[int] = None, path: Optional[str] = None, min_literals: Optional[int] = None):
+        self.capacity = capacity or int(os.getenv("PLAN_CACHE_SIZE", 256))
+        self.path = path or os.getenv("PLAN_CACHE_PATH", os.path.join(".cache", "plan_cache.json"))
+        self.min_literals = int(os.getenv("PLAN_CACHE_MIN_LITERALS", 4)) if min_literals is None else min_literals
+        self._lock = threading.Lock()
+        self._entries = self._parse(load_json(self.path))
+        self.hits = 0
+        self.misses = 0
+        # 尚未写回文件的变更：新增 / 覆盖的计划模板，以及各模板新增的命中次数
+        self._stored: Dict[str, List[str]] = {}
+        self._new_hits: Dict[str, int] = {}
+
+    @classmethod
+    def for_path(cls, path: Optional[str] = None) -> "PlanCache":
+        """进程内共享的实例，进程退出时保存一次"""
+        key = os.path.abspath(path or os.getenv("PLAN_CACHE_PATH", os.path.join(".cache", "plan_cache.json")))
+        with cls._instances_lock:
+            cache = cls._instances.get(key)
+            if cache is None:
+                cache = cls._instances[key] = cls(path=key)
+                atexit.register(cache.save)
+            return cache
+
+    def lookup(self, question: str) -> Optional[List[str]]:
+        """命中时返回填好槽位的计划"""
+        template, numbers, entities = normalize_question(question)
+        if literal_count(template) < self.min_literals:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            entry = self._entries.get(template)
+            plan = instantiate_plan(entry["plan"], numbers, entities) if entry is not None else None
+            if plan is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(template)
+            entry["hits"] += 1
+            self.hits += 1
+            self._new_hits[template] = self._new_hits.get(template, 0) + 1
+            pending = self._pending()
+        if pending >= SAVE_EVERY:
+            self.save()
+        return plan
+
+    def store(self, question: str, plan: List[str]) -> bool:
+        """缓存一次成功运行的计划，返回是否通过校验并被缓存"""
+        if not plan or not all(step.strip() for step in plan):
+            return False
+        template, numbers, entities = normalize_question(question)
+        if literal_count(template) < self.min_literals:
+            return False
+        template_plan = templatize_plan(plan, numbers, entities)
+        if template_plan is None:
+            return False
+        with self._lock:
+            hits = self._entries.pop(template, {}).get("hits", 0)
+            self._entries[template] = {"plan": template_plan, "hits": hits}
+            self._trim(self._entries)
+            self._stored.pop(template, None)
+            self._stored[template] = template_plan
+            pending = self._pending()
+        if pending >= SAVE_EVERY:
+            self.save()
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            top = sorted(self._entries.items(), key=lambda item: -item[1]["hits"])[:10]
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "top_templates": [{"template": template, "hits": entry["hits"]} for template, entry in top],
+            }
+
+    def save(self) -> None:
+        """把本实例的变更合并进文件中的最新内容并写回；内存中的条目同时更新为合并结果(包含其他进程的条目)"""
+        with self._lock:
+            if not self._stored and not self._new_hits:
+                return
+            stored, self._stored = self._stored, {}
+            new_hits, self._new_hits = self._new_hits, {}
+
+            def merge(data):
+                merged = self._parse(data)
+                for template, template_plan in stored.items():
+                    hits = merged.pop(template, {}).get("hits", 0)
+                    merged[template] = {"plan": template_plan, "hits": hits}
+                for template, count in new_hits.items():
+                    if template in merged:
+                        merged[template]["hits"] += count
+                        merged.move_to_end(template)
+                self._trim(merged)
+                return merged
+
+            self._entries = self._parse(update_json(self.path, merge))
+
+    def _pending(self) -> int:
+        return len(self._stored) + sum(self._new_hits.values())
+
+    def _trim(self, entries: "OrderedDict[str, Dict[str, Any]]") -> None:
+        while len(entries) > self.capacity:
+            entries.popitem(last=False)
+
+    def _parse(self, data) -> "OrderedDict[str, Dict[str, Any]]":
+        """按 LRU 顺序解析文件内容，格式不对的条目直接忽略"""
+        entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        if not isinstance(data, dict):
+            return entries
+        for template, entry in data.items():
+            try:
+                if not isinstance(entry["plan"], list):
+                    continue
+                entries[template] = {"plan": [str(step) for step in entry["plan"]], "hits": int(entry.get("hits", 0))}
+            except (KeyError, TypeError, ValueError):
+                continue
+        self._trim(entries)
+        return entries
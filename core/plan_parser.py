@@ -0,0 +1,168 @@
+"""计划解析：从（流式）LLM输出中提取计划步骤列表"""
+
+import re
+import ast
+import json
+from typing import List, Optional, Any
+
+# 列表开始：'[' 之后紧跟一个字符串字面量
+_LIST_START_RE = re.compile(r"\[\s*(?=['\"])")
+# 编号列表的一行："1. xxx" / "1、xxx" / "1) xxx" / "步骤1: xxx"
+_NUMBERED_LINE_RE = re.compile(r"^[ \t]*(?:步骤\s*)?\d+\s*[.、:：)）]\s*(.+?)[ \t]*$", re.M)
+_BULLET_LINE_RE = re.compile(r"^[ \t]*[-*•][ \t]+(.+?)[ \t]*$", re.M)
+_FENCE_RE = re.compile(r"```(?:python|json|py)?\s*\n?(.*?)```", re.S)
+
+
+def _to_steps(value: Any) -> List[str]:
+    """把解析出的对象规整为步骤字符串列表"""
+    if isinstance(value, dict):
+        value = value.get("steps") or value.get("plan")
+    if not isinstance(value, list):
+        return []
+    steps = []
+    for item in value:
+        if isinstance(item, dict):
+            item = item.get("step") or item.get("description") or item.get("content")
+        if item is not None and str(item).strip():
+            steps.append(str(item).strip())
+    return steps
+
+
+def _literal(text: str) -> Any:
+    """依次尝试 python 字面量和 JSON 两种格式"""
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        pass
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return None
+
+
+def parse_plan_text(text: Optional[str]) -> List[str]:
+    """
+    解析一段完整的计划文本，按以下顺序兜底：
+        1. ```python / ```json 代码块中的列表
+        2. 文本中第一个 '[' 到最后一个 ']' 之间的列表，或带 steps/plan 字段的 JSON 对象
+        3. 编号列表 (1. xxx)
+        4. 无序列表 (- xxx)
+    全部失败时返回空列表。
+    """
+    if not text:
+        return []
+    for block in _FENCE_RE.findall(text):
+        steps = _to_steps(_literal(block.strip()))
+        if steps:
+            return steps
+    for left, right in (("[", "]"), ("{", "}")):
+        start, end = text.find(left), text.rfind(right)
+        if start != -1 and end > start:
+            steps = _to_steps(_literal(text[start:end + 1]))
+            if steps:
+                return steps
+    for pattern in (_NUMBERED_LINE_RE, _BULLET_LINE_RE):
+        steps = [m.strip() for m in pattern.findall(text) if m.strip()]
+        if steps:
+            return steps
+    return []
+
+
+class StreamingPlanParser:
+    """
+    增量计划解析器：每收到一段流式输出就调用一次 feed()，返回这一次新解析出的完整步骤。
+    这样执行器可以在计划还没生成完时就开始执行第 1 步。
+
+    支持两种流式格式：
+    - python/JSON 列表：每闭合一个字符串字面量就产出一个步骤
+    - 编号列表：每读完一行 "1. xxx" 就产出一个步骤
+    finish() 在流结束后调用，如果流式解析一无所获，会对完整文本调用 parse_plan_text 兜底。
+    """
+    def __init__(self):
+        self.text = ""
+        self.steps: List[str] = []
+        self.mode: Optional[str] = None    # None / "list" / "numbered" / "done"
+        self._pos = 0
+
+    def feed(self, chunk: str) -> List[str]:
+        self.text += chunk
+        before = len(self.steps)
+        self._scan()
+        return self.steps[before:]
+
+    def finish(self) -> List[str]:
+        """流结束：补齐最后一行，必要时对全文兜底解析。返回本次新增的步骤"""
+        before = len(self.steps)
+        if self.mode in (None, "numbered") and not self.text.endswith("\n"):
+            self.text += "\n"
+            self._scan()
+        if not self.steps:
+            self.steps = parse_plan_text(self.text)
+        self.mode = "done"
+        return self.steps[before:]
+
+    def _scan(self) -> None:
+        if self.mode is None:
+            self._detect_mode()
+        if self.mode == "list":
+            self._scan_list()
+        elif self.mode == "numbered":
+            self._scan_numbered()
+
+    def _detect_mode(self) -> None:
+        list_match = _LIST_START_RE.search(self.text)
+        numbered_match = _NUMBERED_LINE_RE.search(self.text)
+        # 只接受已经完整(读到换行)的编号行
+        if numbered_match and numbered_match.end() >= len(self.text):
+            numbered_match = None
+        # 已经出现 ```python 代码块时，只等待列表格式
+        if "```python" in self.text and numbered_match and not list_match:
+            return
+        if list_match and (not numbered_match or list_match.start() < numbered_match.start()):
+            self.mode = "list"
+            self._pos = list_match.end()
+        elif numbered_match:
+            self.mode = "numbered"
+            self._pos = numbered_match.start()
+
+    def _scan_list(self) -> None:
+        text = self.text
+        while self._pos < len(text):
+            ch = text[self._pos]
+            if ch == "]":
+                self.mode = "done"
+                return
+            if ch not in "'\"":
+                self._pos += 1
+                continue
+            end = self._string_end(text, self._pos)
+            if end is None:
+                return   # 字符串还没闭合，等待更多内容
+            value = _literal(text[self._pos:end + 1])
+            if isinstance(value, str) and value.strip():
+                self.steps.append(value.strip())
+            self._pos = end + 1
+
+    @staticmethod
+    def _string_end(text: str, start: int) -> Optional[int]:
+        quote = text[start]
+        i = start + 1
+        while i < len(text):
+            if text[i] == "\\":
+                i += 2
+                continue
+            if text[i] == quote:
+                return i
+            i += 1
+        return None
+
+    def _scan_numbered(self) -> None:
+        while True:
+            newline = self.text.find("\n", self._pos)
+            if newline == -1:
+                return
+            line = self.text[self._pos:newline]
+            self._pos = newline + 1
+            match = _NUMBERED_LINE_RE.match(line)
+            if match and match.group(1).strip():
+                self.steps.append(match.group(1).strip())
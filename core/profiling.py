@@ -0,0 +1,283 @@
+"""
+运行级别的性能剖析(可选开启)：用于回答"一次慢运行的时间花在了哪里"。
+
+被 @profiled_run 装饰的智能体 run() / resume() 按 Config.profile_sample_rate 的比例抽样，被抽中的运行会：
+- 启动采样线程，每隔 profile_interval 秒记录一次运行线程的调用栈，输出 collapsed stacks
+  (可直接交给 flamegraph.pl / speedscope 生成火焰图)
+- 用 tracemalloc 对比运行前后的快照，输出分配最多的代码行
+  (并发的多个剖析共享 tracemalloc，按引用计数在最后一个结束时停止；快照中会包含同时段其他运行的分配)
+- 按步骤统计 wall time 和 CPU time(time.thread_time)，两者之差即等待时间(网络、锁、sleep)
+  LLM 流式调用和工具调用会自动记为步骤，未归属到任何步骤的时间记为 framework(解析、提示词构建等)
+
+报告写入 profile_dir/<智能体>-<时间>-<id>/：summary.json、stacks.collapsed、allocations.txt
+
+不经过智能体、直接调用 HelloAgentsLLM.think() / think_structured() 的代码默认不剖析，
+设置 PROFILE_LLM_CALLS=true(或构造时传入 profile_calls=True)后这些调用同样按比例抽样(@profiled_call)。
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import functools
+import threading
+import tracemalloc
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypeVar, TYPE_CHECKING
+
+from log import get_logger
+
+if TYPE_CHECKING:
+    from core.config import Config
+
+logger = get_logger("profiling")
+
+T = TypeVar("T")
+
+_current: contextvars.ContextVar[Optional["RunProfile"]] = contextvars.ContextVar("run_profile", default=None)
+_default_config: Optional["Config"] = None
+
+# tracemalloc 是进程级的：正在使用它的剖析数，以及是否由本模块启动(外部启动的不由我们停止)
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+
+
+def _acquire_tracemalloc() -> None:
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracemalloc_owned = True
+        _tracemalloc_users += 1
+
+
+def _release_tracemalloc() -> None:
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+
+def current_profile() -> Optional["RunProfile"]:
+    return _current.get()
+
+
+class SamplingProfiler:
+    """定时采样指定线程的调用栈，统计 collapsed stacks"""
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+class RunProfile:
+    """一次被抽样运行的剖析数据"""
+    def __init__(self, name: str, interval: float, profile_dir: str, top_allocations: int = 25):
+        self.name = name
+        self.profile_dir = profile_dir
+        self.top_allocations = top_allocations
+        self.steps: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._sampler = SamplingProfiler(threading.get_ident(), interval)
+        self._snapshot: Optional[tracemalloc.Snapshot] = None
+
+    def start(self) -> None:
+        _acquire_tracemalloc()
+        self._snapshot = tracemalloc.take_snapshot()
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        self._sampler.start()
+
+    def add_step(self, name: str, wall: float, cpu: float) -> None:
+        with self._lock:
+            self.steps.append({"name": name, "wall": wall, "cpu": cpu, "wait": max(wall - cpu, 0.0)})
+
+    @contextmanager
+    def step(self, name: str) -> Iterator[None]:
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.add_step(name, time.perf_counter() - wall, time.thread_time() - cpu)
+
+    def iter_step(self, name: str, iterator: Iterator[T]) -> Iterator[T]:
+        """只统计迭代器自身 next() 的耗时，调用方处理每个元素的时间不计入该步骤"""
+        wall = cpu = 0.0
+        try:
+            while True:
+                wall_start, cpu_start = time.perf_counter(), time.thread_time()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    wall += time.perf_counter() - wall_start
+                    cpu += time.thread_time() - cpu_start
+                yield item
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+            self.add_step(name, wall, cpu)
+
+    def finish(self, error: Optional[BaseException] = None) -> str:
+        """停止采样并写出报告，返回报告目录"""
+        self._sampler.stop()
+        wall = time.perf_counter() - self._wall
+        cpu = time.thread_time() - self._cpu
+        try:
+            allocations = tracemalloc.take_snapshot().compare_to(self._snapshot, "lineno")[:self.top_allocations]
+        finally:
+            _release_tracemalloc()
+
+        # 聚合同名步骤；LLM 和工具以外的时间归为 framework
+        by_name: Dict[str, Dict[str, float]] = {}
+        for step in self.steps:
+            entry = by_name.setdefault(step["name"], {"count": 0, "wall": 0.0, "cpu": 0.0, "wait": 0.0})
+            entry["count"] += 1
+            for key in ("wall", "cpu", "wait"):
+                entry[key] += step[key]
+        step_wall = sum(step["wall"] for step in self.steps)
+        step_cpu = sum(step["cpu"] for step in self.steps)
+        summary = {
+            "name": self.name,
+            "error": repr(error) if error else None,
+            "wall": round(wall, 4),
+            "cpu": round(cpu, 4),
+            "wait": round(max(wall - cpu, 0.0), 4),
+            "framework": {"wall": round(max(wall - step_wall, 0.0), 4), "cpu": round(max(cpu - step_cpu, 0.0), 4)},
+            "samples": self._sampler.samples,
+            "steps_total": {name: {k: round(v, 4) for k, v in entry.items()} for name, entry in by_name.items()},
+            "steps": [{k: round(v, 4) if isinstance(v, float) else v for k, v in step.items()} for step in self.steps],
+        }
+
+        directory = os.path.join(
+            self.profile_dir, f"{self.name}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        )
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        with open(os.path.join(directory, "stacks.collapsed"), "w", encoding="utf-8") as f:
+            f.write(self._sampler.collapsed())
+        with open(os.path.join(directory, "allocations.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(str(stat) for stat in allocations))
+        logger.info("性能剖析报告已写入 %s", directory, extra={
+            "run": self.name, "wall": summary["wall"], "cpu": summary["cpu"], "wait": summary["wait"]
+        })
+        return directory
+
+
+def _config_of(owner: Any) -> "Config":
+    # core.llm 会导入本模块，Config(pydantic)推迟到第一次剖析时才导入，不影响冷启动
+    global _default_config
+    from core.config import Config
+    config = getattr(owner, "config", None)
+    if isinstance(config, Config):
+        return config
+    if _default_config is None:
+        _default_config = Config.from_env()
+    return _default_config
+
+
+@contextmanager
+def profile_run(name: str, config: Optional["Config"] = None) -> Iterator[Optional[RunProfile]]:
+    """
+    按 config.profile_sample_rate 抽样剖析一段运行；未被抽中或已经处于剖析中时什么也不做(产出 None)。
+    """
+    config = config or _config_of(None)
+    if current_profile() is not None or config.profile_sample_rate <= 0 or random.random() >= config.profile_sample_rate:
+        yield None
+        return
+    profile = RunProfile(name, config.profile_interval, config.profile_dir)
+    token = _current.set(profile)
+    profile.start()
+    error: Optional[BaseException] = None
+    try:
+        yield profile
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current.reset(token)
+        try:
+            profile.finish(error)
+        except Exception as e:
+            logger.error("写入性能剖析报告失败：%s", e)
+
+
+def profiled_run(method: Callable[..., T]) -> Callable[..., T]:
+    """装饰智能体的 run()：使用 self.config(没有时使用 Config.from_env())决定是否抽样剖析"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with profile_run(type(self).__name__, _config_of(self)):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def profiled_call(method: Callable[..., T]) -> Callable[..., T]:
+    """装饰 LLM 客户端的调用方法：self.profile_calls 为真时按比例抽样剖析；在智能体的剖析中调用时只记为步骤"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self.profile_calls:
+            return method(self, *args, **kwargs)
+        with profile_run(f"{type(self).__name__}.{method.__name__}", _config_of(self)):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+def profiled_stream(kind: str) -> Callable[[Callable[..., Iterator[T]]], Callable[..., Iterator[T]]]:
+    """装饰返回迭代器的方法(LLM 流式调用)：处于剖析中时把整个流记为一个步骤 kind:role"""
+    def decorator(method: Callable[..., Iterator[T]]) -> Callable[..., Iterator[T]]:
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            iterator = method(*args, **kwargs)
+            profile = current_profile()
+            if profile is None:
+                return iterator
+            return profile.iter_step(f"{kind}:{kwargs.get('role') or method.__name__}", iterator)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def profile_step(name: str) -> Iterator[None]:
+    """把一段代码记为一个步骤(例如一次工具调用)；不在剖析中时没有额外开销"""
+    profile = current_profile()
+    if profile is None:
+        yield
+        return
+    with profile.step(name):
+        yield
@@ -0,0 +1,43 @@
+"""
+运行时初始化：加载 .env、配置日志。
+
+导入 core / agents 下的模块不再产生任何副作用(不加载 .env、不配置日志、不导入 openai/serpapi 等 SDK)，
+重量级的工作都推迟到第一次使用时，以加快 CLI 和 serverless 场景下的冷启动。
+入口脚本应在开始时显式调用一次 init()；库代码在需要读取环境变量前调用 load_env()。
+"""
+
+import threading
+
+_lock = threading.Lock()
+_env_loaded = False
+_initialized = False
+
+
+def load_env() -> None:
+    """加载 .env 文件中的环境变量，只会执行一次"""
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _lock:
+        if _env_loaded:
+            return
+        try:
+            from dotenv import load_dotenv
+            load_dotenv()
+        except ImportError:
+            pass    # 未安装 python-dotenv 时直接使用系统环境变量
+        _env_loaded = True
+
+
+def init() -> None:
+    """入口脚本的显式初始化：加载 .env 并配置日志，重复调用无副作用"""
+    global _initialized
+    load_env()
+    if _initialized:
+        return
+    with _lock:
+        if _initialized:
+            return
+        from log import setup_logging
+        setup_logging()
+        _initialized = True
@@ -0,0 +1,58 @@
+"""
+多个进程共享的 JSON 状态文件(生成长度统计、计划缓存等)。
+
+update_json() 在文件锁内完成 "读取 - 合并 - 写回"：每个写入方只把自己的增量合并进文件中的最新内容，
+多个进程写同一个文件时不会互相覆盖。写回采用 "先写临时文件，再 os.replace"，中途被杀掉也不会留下半截 JSON。
+文件锁使用 fcntl.flock；没有 fcntl 的平台(Windows)上只在进程内加锁。
+"""
+
+import os
+import json
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+
+_process_lock = threading.Lock()
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """对 path 加排他锁(锁文件为 path.lock)，同一进程内的线程之间同样互斥"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with _process_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(f"{path}.lock", "a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def load_json(path: str) -> Optional[Any]:
+    """读取 JSON 文件，不存在或内容损坏时返回 None"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def update_json(path: str, merge: Callable[[Optional[Any]], Any]) -> Any:
+    """在文件锁内读取当前内容(不存在时为 None)，用 merge 计算新内容并写回，返回写入的内容"""
+    with file_lock(path):
+        data = merge(load_json(path))
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    return data
@@ -0,0 +1,136 @@
+"""
+Plan-and-Solve 执行器的步骤结果存储：长计划模式下，每一步只把与当前步骤相关的历史结果放进提示词。
+
+- 每完成一步记录一条 StepRecord：完整结果、抽取式摘要(不额外调用 LLM)、两者的 token 估算和词频
+- 渲染历史时在 token 预算内按优先级挑选：
+  1. 上一步(后续步骤最常直接依赖上一步的结果)
+  2. 当前步骤中显式引用的步骤("步骤3" / "第3步")
+  3. 其余步骤按与当前步骤的 BM25 相关度排序；相关度为 0 的步骤只考虑摘要
+  放得下完整结果就用完整结果，否则退而使用摘要，仍放不下则省略
+- 词频和语料统计在加入时增量维护，每一步的渲染开销只与已完成的步骤数线性相关，提示词长度不超过预算
+"""
+
+import re
+from collections import Counter
+from typing import Dict, List, NamedTuple, Set, Tuple
+
+from core.tokens import bm25_score, estimate_tokens, tokenize
+
+_SENTENCE_RE = re.compile(r"[^。！？!?\n]+[。！？!?]?")
+_STEP_REF_RE = re.compile(r"(?:步骤\s*|第\s*)(\d+)")
+
+
+class StepRecord(NamedTuple):
+    index: int
+    step: str
+    result: str
+    summary: str
+    cost: int               # 以完整结果渲染时的 token 数
+    summary_cost: int       # 以摘要渲染时的 token 数
+    tf: Counter
+    length: int
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """按 estimate_tokens 的口径截断到 max_tokens 以内"""
+    used = 0.0
+    for i, char in enumerate(text):
+        used += 1 if "\u4e00" <= char <= "\u9fff" else 0.25
+        if used > max_tokens:
+            return text[:i].rstrip() + "…"
+    return text
+
+
+def summarize(text: str, max_tokens: int = 80) -> str:
+    """抽取式摘要：保留开头的句子，并尽量保留最后一句(执行器的结论通常在最后)"""
+    text = " ".join(text.split())
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    sentences = [s.strip() for s in _SENTENCE_RE.findall(text) if s.strip()]
+    if len(sentences) < 2:
+        return _truncate(text, max_tokens)
+    last = sentences[-1]
+    budget = max_tokens - estimate_tokens(last) - 1
+    head: List[str] = []
+    for sentence in sentences[:-1]:
+        if estimate_tokens("".join(head) + sentence) > budget:
+            break
+        head.append(sentence)
+    if not head:
+        return _truncate(text, max_tokens)
+    return "".join(head) + "…" + last
+
+
+class StepResultStore:
+    """
+    已完成步骤的紧凑存储。
+    - history_tokens: 渲染历史时的 token 预算
+    - summary_tokens: 每条摘要的 token 上限
+    """
+    def __init__(self, history_tokens: int = 800, summary_tokens: int = 80):
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.records: List[StepRecord] = []
+        self._df: Counter = Counter()
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def add(self, index: int, step: str, result: str) -> None:
+        summary = summarize(result, self.summary_tokens)
+        tokens = tokenize(f"{step} {result}")
+        tf = Counter(tokens)
+        self.records.append(StepRecord(
+            index, step, result, summary,
+            estimate_tokens(self._format(index, step, result)),
+            estimate_tokens(self._format(index, step, summary)),
+            tf, len(tokens)
+        ))
+        self._df.update(tf.keys())
+        self._total_length += len(tokens)
+
+    def render_all(self) -> str:
+        """完整历史(短计划模式使用，与原有提示词格式一致)"""
+        return "".join(self._format(r.index, r.step, r.result) for r in self.records)
+
+    def render(self, current_step: str) -> str:
+        """在 token 预算内渲染与 current_step 相关的历史"""
+        if not self.records:
+            return "无"
+        chosen: Dict[int, str] = {}
+        used = 0
+        for position, relevant in self._priority(current_step):
+            record = self.records[position]
+            if relevant and used + record.cost <= self.history_tokens:
+                chosen[position] = record.result
+                used += record.cost
+            elif used + record.summary_cost <= self.history_tokens:
+                chosen[position] = record.summary
+                used += record.summary_cost
+        parts = [
+            self._format(self.records[position].index, self.records[position].step, text)
+            for position, text in sorted(chosen.items())
+        ]
+        omitted = len(self.records) - len(chosen)
+        if omitted:
+            parts.append(f"(另有 {omitted} 个关联较弱的步骤已省略)\n")
+        return "".join(parts)
+
+    def _priority(self, current_step: str) -> List[Tuple[int, bool]]:
+        """返回 [(记录位置, 是否值得放完整结果)]，按优先级从高到低；同等优先级时较近的步骤优先"""
+        referenced: Set[int] = {int(n) for n in _STEP_REF_RE.findall(current_step)}
+        query_tokens = set(tokenize(current_step))
+        avgdl = self._total_length / len(self.records) or 1.0
+        ranked = []
+        for position, record in enumerate(self.records[:-1]):
+            score = bm25_score(query_tokens, record.tf, record.length, avgdl, self._df, len(self.records))
+            ranked.append((record.index in referenced, score, position))
+        ranked.sort(reverse=True)
+        return [(len(self.records) - 1, True)] + [
+            (position, is_referenced or score > 0) for is_referenced, score, position in ranked
+        ]
+
+    @staticmethod
+    def _format(index: int, step: str, result: str) -> str:
+        return f"步骤 {index}: {step}\n结果: {result}\n\n"
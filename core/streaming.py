@@ -0,0 +1,64 @@
+"""
+按会话转发 LLM 生成的 token。
+
+多个会话共享同一个 HelloAgentsLLM 时，通过 contextvars 为每个会话(线程/协程)绑定各自的 token 回调，互不干扰。
+回调可以抛出 RunCancelled 来中止当前运行：LLM 的流式请求会被立即关闭，不再继续消耗 token。
+回调收到空字符串时不转发任何内容，只检查是否已取消(见 HeldTokens)。
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, List, Optional
+
+TokenSink = Callable[[str], None]
+
+_token_sink: ContextVar[Optional[TokenSink]] = ContextVar("token_sink", default=None)
+
+
+class RunCancelled(Exception):
+    """运行被取消(例如客户端已断开连接)，各层不应吞掉该异常"""
+
+
+@contextmanager
+def token_sink(callback: TokenSink) -> Iterator[None]:
+    """在 with 块内，当前上下文中所有 LLM 调用生成的 token 都会交给 callback"""
+    reset_token = _token_sink.set(callback)
+    try:
+        yield
+    finally:
+        _token_sink.reset(reset_token)
+
+
+def emit_token(text: str) -> None:
+    callback = _token_sink.get()
+    if callback is not None:
+        callback(text)
+
+
+def current_sink() -> Optional[TokenSink]:
+    return _token_sink.get()
+
+
+class HeldTokens:
+    """
+    暂存 token 而不转发，确认后再 release() 给原来的回调，或 discard() 丢弃。
+    用于级联中小模型的草稿：未通过校验的草稿不能出现在客户端的输出里。
+    暂存期间每个 token 仍以空字符串通知原回调，使会话被取消时能立即中止。
+    """
+    def __init__(self, sink: Optional[TokenSink]):
+        self.sink = sink
+        self.chunks: List[str] = []
+
+    def __call__(self, text: str) -> None:
+        self.chunks.append(text)
+        if self.sink is not None:
+            self.sink("")
+
+    def release(self) -> None:
+        chunks, self.chunks = self.chunks, []
+        if self.sink is not None:
+            for chunk in chunks:
+                self.sink(chunk)
+
+    def discard(self) -> None:
+        self.chunks = []
@@ -0,0 +1,65 @@
+"""
+不依赖分词库和 tokenizer 的轻量 token 工具：切词和 BM25 打分(用于检索排序 / 本地索引 / 步骤历史挑选)，
+以及 token 数估算(用于预算控制)。
+
+估算口径：中文约 1 字 1 token，其他字符约 4 个 1 token，足以用于预算控制，不追求与具体模型的 tokenizer 一致。
+"""
+
+import re
+import math
+from collections import Counter
+from typing import Iterable, List
+
+_CJK_RE = re.compile(r"[一-鿿]")
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[一-鿿]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """英文/数字按单词切分；中文按单字加相邻二字切分，无需分词库"""
+    tokens: List[str] = []
+    for piece in _TOKEN_RE.findall(text.lower()):
+        if _CJK_RE.match(piece):
+            tokens.extend(piece)
+            tokens.extend(piece[i:i + 2] for i in range(len(piece) - 1))
+        else:
+            tokens.append(piece)
+    return tokens
+
+
+def bm25_score(
+        query_tokens: Iterable[str],
+        tf: Counter,
+        doc_len: int,
+        avgdl: float,
+        df: Counter,
+        num_docs: int,
+        k1: float = 1.5,
+        b: float = 0.75
+) -> float:
+    """单篇文档的 BM25 得分；语料统计(df、平均长度)由调用方维护，便于增量更新"""
+    score = 0.0
+    for token in query_tokens:
+        if token not in tf:
+            continue
+        idf = math.log(1 + (num_docs - df[token] + 0.5) / (df[token] + 0.5))
+        score += idf * tf[token] * (k1 + 1) / (tf[token] + k1 * (1 - b + b * doc_len / avgdl))
+    return score
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中文约 1 字 1 token，其他字符约 4 个 1 token"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """按 estimate_tokens 的口径截断到 max_tokens 以内(含结尾的省略号)"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    limit = max_tokens - 0.25       # 给省略号留位置
+    used = 0.0
+    for i, char in enumerate(text):
+        used += 1 if _CJK_RE.match(char) else 0.25
+        if used > limit:
+            return text[:i].rstrip() + "…"
+    return text
@@ -3,7 +3,6 @@
 import os
 from log import logger
 from typing import Optional
-from openai import OpenAI   
 from core.llm import HelloAgentsLLM
 
 class MyLLM(HelloAgentsLLM):
@@ -36,6 +35,7 @@ class MyLLM(HelloAgentsLLM):
             self.max_tokens = kwargs.get('max_tokens')
             self.timeout = kwargs.get('timeout', 60)
 
+            from openai import OpenAI
             self._client = OpenAI(api_key=self.api_key, base_url=self.base_url, timeout=self.timeout)
 
         else:
@@ -0,0 +1,429 @@
+"""
+任务队列的 broker：保存任务、把任务租借(reserve)给 worker，并记录结果。
+
+投递语义为 at-least-once：
+- reserve() 把任务标记为 running，并设置租约到期时间 lease_until = now + visibility_timeout
+- worker 运行期间定期 extend() 续租；worker 崩溃或失联时租约过期，任务会被重新投递给其他 worker
+- 每次 reserve 生成新的 token，complete() / fail() 必须带上 token，
+  已经被重新投递的任务不会被失联后又恢复的旧 worker 覆盖结果
+- 投递次数超过 max_attempts 的任务标记为 failed，不再重试
+
+实现：
+- SQLiteBroker: 本地文件，多个进程共享同一个数据库文件即可在单机上运行多个 worker
+- RedisBroker:  兼容 Redis 协议的服务(Redis / Valkey / KeyDB 等)，需要安装 redis，可跨机器部署。
+                Lua 脚本访问的每个键都通过 KEYS 传入，键名带同一个 hash tag，在 Redis Cluster 上落在同一个槽
+
+通过 create_broker(url) 创建：sqlite:///path/to/jobs.db 或 redis://host:6379/0
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from core.runtime import load_env
+
+STATUSES = ("queued", "running", "done", "failed")
+
+
+class Job(BaseModel):
+    """一个待运行的智能体任务"""
+    id: str
+    agent: str
+    input: str
+    status: str = "queued"
+    attempts: int = 0                     # 已经投递的次数
+    max_attempts: int = 3
+    result: Optional[str] = None
+    error: Optional[str] = None
+    worker: Optional[str] = None
+    token: Optional[str] = None           # 当前租约的 token
+    lease_until: Optional[float] = None
+    created: float = 0
+    updated: float = 0
+
+
+class Broker(ABC):
+    """broker 基类，所有方法都可以被多个线程 / 进程并发调用"""
+
+    @abstractmethod
+    def enqueue(self, agent: str, input_text: str, max_attempts: int = 3) -> str:
+        """新增任务，返回任务 id"""
+
+    @abstractmethod
+    def reserve(self, worker: str, visibility_timeout: float) -> Optional[Job]:
+        """租借一个排队中或租约已过期的任务，没有任务时返回 None"""
+
+    @abstractmethod
+    def extend(self, job_id: str, token: str, visibility_timeout: float) -> bool:
+        """续租，租约已经被他人接管时返回 False"""
+
+    @abstractmethod
+    def complete(self, job_id: str, token: str, result: Optional[str]) -> bool:
+        """记录结果，租约已经被他人接管时返回 False"""
+
+    @abstractmethod
+    def fail(self, job_id: str, token: str, error: str) -> bool:
+        """记录一次失败：还有重试次数时重新排队，否则标记为 failed"""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Job]:
+        pass
+
+    @abstractmethod
+    def list_jobs(self, status: Optional[str] = None, limit: int = 20) -> List[Job]:
+        """按创建时间倒序列出任务"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """各状态的任务数"""
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteBroker(Broker):
+    """
+    基于 SQLite 的 broker。reserve 在 BEGIN IMMEDIATE 事务中完成"查找 + 标记"，
+    多个进程同时 reserve 时由 SQLite 的写锁保证同一个任务只会租借给一个 worker。
+    """
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                seq INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                agent TEXT NOT NULL,
+                input TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                result TEXT,
+                error TEXT,
+                worker TEXT,
+                token TEXT,
+                lease_until REAL,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, seq);
+        """)
+
+    @classmethod
+    def from_url(cls, url: str) -> "SQLiteBroker":
+        return cls(url[len("sqlite:///"):] if url.startswith("sqlite:///") else url)
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def enqueue(self, agent: str, input_text: str, max_attempts: int = 3) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, agent, input, status, max_attempts, created, updated) VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+            (job_id, agent, input_text, max_attempts, now, now)
+        )
+        return job_id
+
+    def reserve(self, worker: str, visibility_timeout: float) -> Optional[Job]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 租约过期且投递次数已用完的任务直接判定失败
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = COALESCE(error, '超过最大投递次数'), token = NULL, updated = ? "
+                    "WHERE status = 'running' AND lease_until < ? AND attempts >= max_attempts",
+                    (now, now)
+                )
+                row = self._conn.execute(
+                    "SELECT seq FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) "
+                    "ORDER BY seq LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?, token = ?, "
+                    "lease_until = ?, updated = ? WHERE seq = ?",
+                    (worker, uuid.uuid4().hex, now + visibility_timeout, now, row["seq"])
+                )
+                job = self._conn.execute("SELECT * FROM jobs WHERE seq = ?", (row["seq"],)).fetchone()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self._to_job(job)
+
+    def extend(self, job_id: str, token: str, visibility_timeout: float) -> bool:
+        now = time.time()
+        cursor = self._execute(
+            "UPDATE jobs SET lease_until = ?, updated = ? WHERE id = ? AND token = ? AND status = 'running'",
+            (now + visibility_timeout, now, job_id, token)
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, token: str, result: Optional[str]) -> bool:
+        cursor = self._execute(
+            "UPDATE jobs SET status = 'done', result = ?, error = NULL, token = NULL, lease_until = NULL, updated = ? "
+            "WHERE id = ? AND token = ? AND status = 'running'",
+            (result, time.time(), job_id, token)
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id: str, token: str, error: str) -> bool:
+        cursor = self._execute(
+            "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END, "
+            "error = ?, token = NULL, lease_until = NULL, updated = ? "
+            "WHERE id = ? AND token = ? AND status = 'running'",
+            (error, time.time(), job_id, token)
+        )
+        return cursor.rowcount == 1
+
+    def get(self, job_id: str) -> Optional[Job]:
+        row = self._execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 20) -> List[Job]:
+        if status:
+            rows = self._execute("SELECT * FROM jobs WHERE status = ? ORDER BY seq DESC LIMIT ?", (status, limit)).fetchall()
+        else:
+            rows = self._execute("SELECT * FROM jobs ORDER BY seq DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        counts = dict.fromkeys(STATUSES, 0)
+        for status, count in self._execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall():
+            counts[status] = count
+        return counts
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Job:
+        data = dict(row)
+        data.pop("seq", None)
+        return Job(**data)
+
+
+# reserve：先把租约过期的任务放回队列(投递次数用完的判定失败)，再从队列头部取出一个任务
+# 把租约已过期的任务放回队列(或在超过投递次数时标记为 failed)
+# KEYS: queue, leases, 各任务的 hash；ARGV: now, 与 KEYS[3..] 对应的任务 id
+# 客户端先读出过期的 id，脚本内重新检查租约：读取之后被续租或已完成的任务不受影响
+_REDIS_REQUEUE = """
+local queue, leases, now = KEYS[1], KEYS[2], tonumber(ARGV[1])
+for i = 3, #KEYS do
+    local key, id = KEYS[i], ARGV[i - 1]
+    local lease_until = redis.call('ZSCORE', leases, id)
+    if lease_until and tonumber(lease_until) <= now then
+        redis.call('ZREM', leases, id)
+        if tonumber(redis.call('HGET', key, 'attempts')) >= tonumber(redis.call('HGET', key, 'max_attempts')) then
+            redis.call('HSET', key, 'status', 'failed', 'error', '超过最大投递次数', 'token', '', 'updated', now)
+        else
+            redis.call('HSET', key, 'status', 'queued', 'token', '', 'updated', now)
+            redis.call('RPUSH', queue, id)
+        end
+    end
+end
+return 1
+"""
+
+# 取出队头的任务 id 并租给 worker
+# KEYS: queue, leases, 任务的 hash；ARGV: id, now, lease_until, worker, token
+# 客户端先读出队头的 id，脚本内确认队头仍是该任务再取出；被其他 worker 抢先时返回 0，由客户端重试
+_REDIS_RESERVE = """
+local queue, leases, key = KEYS[1], KEYS[2], KEYS[3]
+local id, now, lease_until, worker, token = ARGV[1], ARGV[2], ARGV[3], ARGV[4], ARGV[5]
+if redis.call('LINDEX', queue, -1) ~= id then return 0 end
+redis.call('RPOP', queue)
+redis.call('HINCRBY', key, 'attempts', 1)
+redis.call('HSET', key, 'status', 'running', 'worker', worker, 'token', token, 'lease_until', lease_until, 'updated', now)
+redis.call('ZADD', leases, lease_until, id)
+return 1
+"""
+
+# extend / complete / fail 共用：只有 token 匹配(租约仍属于调用方)时才修改
+_REDIS_SETTLE = """
+local queue, leases, key = KEYS[1], KEYS[2], KEYS[3]
+local id, token, action, value, now = ARGV[1], ARGV[2], ARGV[3], ARGV[4], ARGV[5]
+if redis.call('HGET', key, 'token') ~= token or redis.call('HGET', key, 'status') ~= 'running' then
+    return 0
+end
+if action == 'extend' then
+    redis.call('HSET', key, 'lease_until', value, 'updated', now)
+    redis.call('ZADD', leases, value, id)
+    return 1
+end
+redis.call('ZREM', leases, id)
+if action == 'complete' then
+    redis.call('HSET', key, 'status', 'done', 'result', value, 'token', '', 'updated', now)
+    redis.call('HDEL', key, 'error')
+elseif tonumber(redis.call('HGET', key, 'attempts')) >= tonumber(redis.call('HGET', key, 'max_attempts')) then
+    redis.call('HSET', key, 'status', 'failed', 'error', value, 'token', '', 'updated', now)
+else
+    redis.call('HSET', key, 'status', 'queued', 'error', value, 'token', '', 'updated', now)
+    redis.call('RPUSH', queue, id)
+end
+return 1
+"""
+
+# reserve() 被其他 worker 抢先时的重试次数；仍然失败时返回 None，worker 会在下一轮轮询时再取
+_RESERVE_RETRIES = 8
+
+
+class RedisBroker(Broker):
+    """
+    基于 Redis 协议的 broker：
+    - {prefix}:job:{id}   任务的 hash
+    - {prefix}:queue      排队中的任务 id 列表(LPUSH 新任务，RPOP 取出，重试的任务 RPUSH 回到队头)
+    - {prefix}:leases     运行中任务的租约到期时间(sorted set)
+    - {prefix}:jobs       全部任务 id 按创建时间排序(sorted set)，用于列表和统计
+    键名中的 {prefix} 是 hash tag(带花括号)，同一个 broker 的键在 Redis Cluster 上位于同一个槽。
+    状态变更都在 Lua 脚本中原子完成，脚本访问的键全部通过 KEYS 传入。
+    client 可以传入已创建的客户端(例如测试中的 fakeredis)，此时忽略 url。
+    """
+    def __init__(self, url: str, prefix: str = "hello_agents", client: Any = None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.client = client
+        self.prefix = prefix
+        self.queue_key = self._key("queue")
+        self.leases_key = self._key("leases")
+        self.jobs_key = self._key("jobs")
+        self._requeue = self.client.register_script(_REDIS_REQUEUE)
+        self._reserve = self.client.register_script(_REDIS_RESERVE)
+        self._settle = self.client.register_script(_REDIS_SETTLE)
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisBroker":
+        return cls(url, prefix=os.getenv("JOB_REDIS_PREFIX", "hello_agents"))
+
+    def _key(self, name: str) -> str:
+        return f"{{{self.prefix}}}:{name}"
+
+    def _job_key(self, job_id: str) -> str:
+        return self._key(f"job:{job_id}")
+
+    def enqueue(self, agent: str, input_text: str, max_attempts: int = 3) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        pipe = self.client.pipeline()
+        pipe.hset(self._job_key(job_id), mapping={
+            "id": job_id, "agent": agent, "input": input_text, "status": "queued",
+            "attempts": 0, "max_attempts": max_attempts, "created": now, "updated": now,
+        })
+        pipe.zadd(self.jobs_key, {job_id: now})
+        pipe.lpush(self.queue_key, job_id)
+        pipe.execute()
+        return job_id
+
+    def reserve(self, worker: str, visibility_timeout: float) -> Optional[Job]:
+        now = time.time()
+        expired = self.client.zrangebyscore(self.leases_key, "-inf", now)
+        if expired:
+            self._requeue(
+                keys=[self.queue_key, self.leases_key, *map(self._job_key, expired)],
+                args=[now, *expired]
+            )
+        token = uuid.uuid4().hex
+        # 队头的任务可能在读出之后被其他 worker 取走，此时换成新的队头重试
+        for _ in range(_RESERVE_RETRIES):
+            job_id = self.client.lindex(self.queue_key, -1)
+            if job_id is None:
+                return None
+            if self._reserve(
+                keys=[self.queue_key, self.leases_key, self._job_key(job_id)],
+                args=[job_id, now, now + visibility_timeout, worker, token]
+            ):
+                return self.get(job_id)
+        return None
+
+    def _settle_job(self, job_id: str, token: str, action: str, value: Any) -> bool:
+        return bool(self._settle(
+            keys=[self.queue_key, self.leases_key, self._job_key(job_id)],
+            args=[job_id, token, action, "" if value is None else value, time.time()]
+        ))
+
+    def extend(self, job_id: str, token: str, visibility_timeout: float) -> bool:
+        return self._settle_job(job_id, token, "extend", time.time() + visibility_timeout)
+
+    def complete(self, job_id: str, token: str, result: Optional[str]) -> bool:
+        # 区分 None 和空字符串：结果统一以 JSON 保存
+        return self._settle_job(job_id, token, "complete", json.dumps(result, ensure_ascii=False))
+
+    def fail(self, job_id: str, token: str, error: str) -> bool:
+        return self._settle_job(job_id, token, "fail", error)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        data = self.client.hgetall(self._job_key(job_id))
+        if not data:
+            return None
+        if data.get("status") == "done" and "result" in data:
+            data["result"] = json.loads(data["result"])
+        data = {key: value for key, value in data.items() if value != ""}
+        return Job(**data)
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 20) -> List[Job]:
+        jobs = []
+        # 按状态过滤时需要多扫描一些，这里以 limit 的 50 倍为上限
+        for job_id in self.client.zrevrange(self.jobs_key, 0, (limit if not status else limit * 50) - 1):
+            job = self.get(job_id)
+            if job and (status is None or job.status == status):
+                jobs.append(job)
+                if len(jobs) >= limit:
+                    break
+        return jobs
+
+    def stats(self) -> Dict[str, int]:
+        counts = dict.fromkeys(STATUSES, 0)
+        pipe = self.client.pipeline()
+        for job_id in self.client.zrange(self.jobs_key, 0, -1):
+            pipe.hget(self._job_key(job_id), "status")
+        for status in pipe.execute():
+            if status:
+                counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def close(self) -> None:
+        self.client.close()
+
+
+# URL scheme -> broker 构造函数，新的实现可以通过 register_broker 接入
+BROKERS: Dict[str, Callable[[str], Broker]] = {
+    "sqlite": SQLiteBroker.from_url,
+    "redis": RedisBroker.from_url,
+    "rediss": RedisBroker.from_url,
+}
+
+
+def register_broker(scheme: str, factory: Callable[[str], Broker]) -> None:
+    BROKERS[scheme] = factory
+
+
+def create_broker(url: Optional[str] = None) -> Broker:
+    """根据 URL 创建 broker，默认读取 JOB_BROKER_URL(sqlite:///.cache/jobs.db)"""
+    load_env()
+    url = url or os.getenv("JOB_BROKER_URL", "sqlite:///.cache/jobs.db")
+    scheme = url.split("://", 1)[0] if "://" in url else "sqlite"
+    factory = BROKERS.get(scheme)
+    if factory is None:
+        raise ValueError(f"不支持的 broker：{url}")
+    return factory(url)
@@ -0,0 +1,112 @@
+"""
+任务队列命令行：
+
+    python -m jobs.cli enqueue react "NBA快船队现在的战绩如何？" [--wait]
+    python -m jobs.cli get <job_id>
+    python -m jobs.cli list [--status failed] [--limit 20]
+    python -m jobs.cli stats
+    python -m jobs.cli monitor [--interval 2]
+    python -m jobs.cli worker [--processes 2] [--concurrency 4]
+
+所有子命令都支持 --broker，默认读取 JOB_BROKER_URL(sqlite:///.cache/jobs.db)。
+"""
+
+import sys
+import time
+import argparse
+from typing import List
+
+from jobs.broker import Job, create_broker
+from jobs.worker import add_worker_arguments, run_workers
+
+
+def _print_jobs(jobs: List[Job]) -> None:
+    print(f"{'id':<34}{'智能体':<16}{'状态':<10}{'投递':>4}  输入")
+    for job in jobs:
+        text = job.input if len(job.input) <= 40 else job.input[:40] + "..."
+        print(f"{job.id:<34}{job.agent:<18}{job.status:<10}{job.attempts:>4}  {text}")
+
+
+def _print_job(job: Job) -> None:
+    for key, value in job.model_dump(exclude={"token"}).items():
+        print(f"{key:<14}{value}")
+
+
+def main(argv: List[str] = None) -> int:
+    arg_parser = argparse.ArgumentParser(description="Hello Agents 任务队列")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="新增任务")
+    enqueue.add_argument("agent", help="react / plan_and_solve / reflection")
+    enqueue.add_argument("input", help="问题或任务描述")
+    enqueue.add_argument("--max-attempts", type=int, default=3)
+    enqueue.add_argument("--wait", action="store_true", help="等待任务结束并打印结果")
+
+    get = commands.add_parser("get", help="查看任务")
+    get.add_argument("job_id")
+
+    list_cmd = commands.add_parser("list", help="列出最近的任务")
+    list_cmd.add_argument("--status", choices=["queued", "running", "done", "failed"])
+    list_cmd.add_argument("--limit", type=int, default=20)
+
+    commands.add_parser("stats", help="各状态的任务数")
+
+    monitor = commands.add_parser("monitor", help="持续显示队列状态")
+    monitor.add_argument("--interval", type=float, default=2.0)
+
+    worker = commands.add_parser("worker", help="在本机启动 worker")
+    add_worker_arguments(worker)
+
+    for command in (enqueue, get, list_cmd, commands.choices["stats"], monitor):
+        command.add_argument("--broker", default=None, help="broker URL，默认读取 JOB_BROKER_URL")
+    args = arg_parser.parse_args(argv)
+
+    if args.command == "worker":
+        run_workers(args.processes, args.broker, args.concurrency, args.visibility_timeout, args.poll_interval)
+        return 0
+
+    broker = create_broker(args.broker)
+    try:
+        if args.command == "enqueue":
+            from agents.registry import AGENT_FACTORIES
+            if args.agent not in AGENT_FACTORIES:
+                print(f"未知的智能体：{args.agent}，可选：{', '.join(AGENT_FACTORIES)}")
+                return 1
+            job_id = broker.enqueue(args.agent, args.input, max_attempts=args.max_attempts)
+            print(job_id)
+            if args.wait:
+                job = broker.get(job_id)
+                while job.status in ("queued", "running"):
+                    time.sleep(1)
+                    job = broker.get(job_id)
+                _print_job(job)
+                return 0 if job.status == "done" else 1
+        elif args.command == "get":
+            job = broker.get(args.job_id)
+            if job is None:
+                print(f"未找到任务：{args.job_id}")
+                return 1
+            _print_job(job)
+        elif args.command == "list":
+            _print_jobs(broker.list_jobs(status=args.status, limit=args.limit))
+        elif args.command == "stats":
+            for status, count in broker.stats().items():
+                print(f"{status:<10}{count:>8}")
+        elif args.command == "monitor":
+            try:
+                while True:
+                    stats = broker.stats()
+                    print("\033[2J\033[H", end="")     # 清屏
+                    print("  ".join(f"{status}: {count}" for status, count in stats.items()))
+                    print()
+                    _print_jobs(broker.list_jobs(status="running", limit=10) + broker.list_jobs(status="queued", limit=10))
+                    time.sleep(args.interval)
+            except KeyboardInterrupt:
+                pass
+    finally:
+        broker.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""
+任务 worker：从 broker 租借任务，运行对应的智能体并写回结果。
+
+- 每个 worker 进程内有 concurrency 个执行槽(线程)，共享同一个 LLM 客户端和 ToolExecutor
+- 任务运行期间后台线程按 visibility_timeout / 3 的间隔续租；进程崩溃后租约过期，任务由其他 worker 重新执行
+- 支持检查点的智能体(react / plan_and_solve)以任务 id 作为 run_id 保存检查点，
+  任务被重新投递时从检查点恢复，已经完成的步骤不会重复调用 LLM 和工具
+- 收到 SIGINT / SIGTERM 后不再领取新任务，等待正在运行的任务结束后退出
+
+用法：python -m jobs.worker [--concurrency 4] [--processes 2]，或通过 python -m jobs.cli worker
+"""
+
+import os
+import time
+import socket
+import signal
+import argparse
+import threading
+import multiprocessing
+from typing import Optional
+
+from core.checkpoint import CheckpointStore
+from core.runtime import init, load_env
+from jobs.broker import Broker, Job, create_broker
+from log import get_logger, shutdown_logging
+
+logger = get_logger("jobs")
+
+
+class Worker:
+    def __init__(
+            self,
+            broker: Broker,
+            concurrency: int = 2,
+            visibility_timeout: float = 300,
+            poll_interval: float = 1.0,
+            worker_id: Optional[str] = None,
+            checkpoint_store: Optional[CheckpointStore] = None
+    ):
+        self.broker = broker
+        self.concurrency = concurrency
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.checkpoint_store = checkpoint_store
+        self.stop_event = threading.Event()
+        self.processed = 0
+        self._processed_lock = threading.Lock()
+        self._llm = None
+        self._tools = None
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    def run(self) -> None:
+        """启动全部执行槽，直到 stop() 被调用"""
+        from agents.registry import build_runtime, cascade_stats
+        from core.cassette import Cassette
+        self._llm, self._tools = build_runtime(Cassette.from_env())
+        logger.info("worker 已启动", extra={"worker": self.worker_id, "concurrency": self.concurrency})
+        slots = [
+            threading.Thread(target=self._slot_loop, name=f"{self.worker_id}-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for slot in slots:
+            slot.start()
+        for slot in slots:
+            # join 带超时，主线程才能及时响应信号
+            while slot.is_alive():
+                slot.join(timeout=0.5)
+        logger.info("worker 已退出", extra={"worker": self.worker_id, "processed": self.processed})
+        stats = cascade_stats(self._llm)
+        if stats is not None and stats.summary():
+            logger.info("模型级联统计\n%s", stats.report(), extra={"worker": self.worker_id})
+
+    def _slot_loop(self) -> None:
+        while not self.stop_event.is_set():
+            try:
+                job = self.broker.reserve(self.worker_id, self.visibility_timeout)
+            except Exception as e:
+                logger.error("领取任务失败：%s", e, extra={"worker": self.worker_id})
+                job = None
+            if job is None:
+                self.stop_event.wait(self.poll_interval)
+                continue
+            self.process(job)
+
+    def process(self, job: Job) -> None:
+        """运行一个已租借的任务，期间持续续租"""
+        logger.info("开始运行任务", extra={"job": job.id, "agent": job.agent, "attempt": job.attempts})
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, done), daemon=True)
+        heartbeat.start()
+        start = time.perf_counter()
+        try:
+            result = self._run_agent(job)
+        except Exception as e:
+            done.set()
+            if not self.broker.fail(job.id, job.token, f"{type(e).__name__}: {e}"):
+                logger.warning("任务租约已被接管，失败结果被丢弃", extra={"job": job.id})
+            logger.error("任务运行失败：%s", e, extra={"job": job.id, "attempt": job.attempts})
+            return
+        finally:
+            done.set()
+            heartbeat.join()
+        if result is None:
+            # 智能体内部出错时返回 None(例如 LLM 调用失败)，按失败处理，还有投递次数时重新排队
+            if not self.broker.fail(job.id, job.token, "智能体没有返回结果"):
+                logger.warning("任务租约已被接管，失败结果被丢弃", extra={"job": job.id})
+            logger.error("任务运行失败：智能体没有返回结果", extra={"job": job.id, "attempt": job.attempts})
+            return
+        if self.broker.complete(job.id, job.token, str(result)):
+            # 多个执行槽并发完成任务
+            with self._processed_lock:
+                self.processed += 1
+            logger.info("任务完成", extra={"job": job.id, "seconds": round(time.perf_counter() - start, 3)})
+        else:
+            logger.warning("任务租约已被接管，结果被丢弃", extra={"job": job.id})
+
+    def _run_agent(self, job: Job):
+        from agents.registry import AGENT_FACTORIES
+        factory = AGENT_FACTORIES.get(job.agent)
+        if factory is None:
+            raise ValueError(f"未知的智能体：{job.agent}")
+        agent = factory(self._llm, self._tools)
+        if self.checkpoint_store is not None and hasattr(agent, "resume"):
+            agent.checkpoint_store = self.checkpoint_store
+            if self.checkpoint_store.load(job.id) is not None:
+                logger.info("从检查点恢复任务", extra={"job": job.id})
+                return agent.resume(job.id)
+            return agent.run(job.input, run_id=job.id)
+        return agent.run(job.input)
+
+    def _heartbeat(self, job: Job, done: threading.Event) -> None:
+        interval = max(self.visibility_timeout / 3, 0.1)
+        while not done.wait(interval):
+            if not self.broker.extend(job.id, job.token, self.visibility_timeout):
+                logger.warning("续租失败，任务可能已被重新投递", extra={"job": job.id})
+                return
+
+
+def run_worker(broker_url: Optional[str], concurrency: int, visibility_timeout: float, poll_interval: float) -> None:
+    """单个 worker 进程的入口"""
+    init()
+    worker = Worker(
+        create_broker(broker_url), concurrency=concurrency, visibility_timeout=visibility_timeout,
+        poll_interval=poll_interval, checkpoint_store=CheckpointStore()
+    )
+
+    def handle_signal(signum, frame):
+        logger.info("收到退出信号，等待运行中的任务结束", extra={"worker": worker.worker_id})
+        worker.stop()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+    worker.run()
+    worker.broker.close()
+    # multiprocessing 子进程退出时不会执行 atexit，需要手动写完队列中的日志
+    shutdown_logging()
+
+
+def run_workers(processes: int, broker_url: Optional[str], concurrency: int, visibility_timeout: float, poll_interval: float) -> None:
+    """在本机启动多个 worker 进程"""
+    if processes <= 1:
+        run_worker(broker_url, concurrency, visibility_timeout, poll_interval)
+        return
+    children = [
+        multiprocessing.Process(target=run_worker, args=(broker_url, concurrency, visibility_timeout, poll_interval))
+        for _ in range(processes)
+    ]
+    for child in children:
+        child.start()
+
+    def forward_signal(signum, frame):
+        # 把退出信号转发给子进程，由它们处理完当前任务后退出
+        for child in children:
+            if child.is_alive():
+                os.kill(child.pid, signum)
+
+    signal.signal(signal.SIGINT, forward_signal)
+    signal.signal(signal.SIGTERM, forward_signal)
+    for child in children:
+        child.join()
+
+
+def add_worker_arguments(arg_parser: argparse.ArgumentParser) -> None:
+    load_env()
+    arg_parser.add_argument("--broker", default=None, help="broker URL，默认读取 JOB_BROKER_URL")
+    arg_parser.add_argument("--processes", type=int, default=1, help="启动的 worker 进程数")
+    arg_parser.add_argument("--concurrency", type=int, default=int(os.getenv("JOB_WORKER_CONCURRENCY", 2)),
+                            help="每个进程同时运行的任务数")
+    arg_parser.add_argument("--visibility-timeout", type=float, default=float(os.getenv("JOB_VISIBILITY_TIMEOUT", 300)),
+                            help="租约时长(秒)，超时未续租的任务会被重新投递")
+    arg_parser.add_argument("--poll-interval", type=float, default=1.0, help="队列为空时的轮询间隔(秒)")
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="Hello Agents 任务 worker")
+    add_worker_arguments(arg_parser)
+    args = arg_parser.parse_args()
+    run_workers(args.processes, args.broker, args.concurrency, args.visibility_timeout, args.poll_interval)
@@ -1,4 +1,14 @@
+import os
+import sys
+import json
+import queue
+import atexit
 import logging
+import threading
+import logging.handlers
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Optional
 """
  logger.info 代替流程 print
  logger.debug 打印内部数据
@@ -25,9 +35,147 @@ format="%(asctime)s - %(levelname)s - %(name)s - %(message)s"
 举例：2026-02-04 17:12:10 - INFO - reflection_agent - Starting initial attempt...
 """
 
+"""
+非阻塞日志：
+    业务线程只把日志记录放进队列(QueueHandler)，由后台线程(QueueListener)负责格式化和写 stderr，
+    并发运行多个会话时不会在 stdout/stderr 的锁上排队。
+
+环境变量：
+    LOG_LEVEL          全局级别，默认 INFO
+    LOG_LEVELS         按组件设置级别，例如 "llm=WARNING,tools=DEBUG"
+    LOG_FORMAT         json(默认，每行一条 JSON 记录) 或 text
+    LOG_SAMPLE_RATE    高频事件的采样率，默认 0.1(每 10 条保留 1 条)
+
+高频事件(每个 token、每次工具调用的观察结果等)记录时带上 extra={"sample": "事件名"}，
+同一事件名按采样率保留，被丢弃的记录不会进入队列。
+
+调用 setup_logging() 之前(例如直接 import 某个模块做实验)，hello_agents.* 的记录由一个同步的文本 handler
+写到 stderr，默认级别 INFO，不会丢失 INFO 记录，也不会落到 logging.lastResort(只输出 WARNING 及以上)；
+setup_logging() 会移除这个默认 handler，之后统一经由队列输出。
+"""
+
+ROOT_LOGGER = "hello_agents"
+
+# LogRecord 自带的属性，其余属性视为通过 extra 传入的结构化字段
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "sample"}
+
+
+def get_logger(component: str) -> logging.Logger:
+    """返回组件的 logger(hello_agents.<component>)，级别可通过 LOG_LEVELS 单独设置"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{component}")
+
+
+class JsonFormatter(logging.Formatter):
+    """每条记录输出为一行 JSON，extra 中的字段原样保留"""
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "component": record.name.removeprefix(f"{ROOT_LOGGER}."),
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc_info"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """带 sample 属性的记录按事件名计数，每 1/rate 条保留一条；WARNING 及以上总是保留"""
+    def __init__(self, rate: float):
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        key = getattr(record, "sample", None)
+        if key is None or record.levelno >= logging.WARNING:
+            return True
+        if not self.every:
+            return False
+        with self._lock:
+            count = self._counts[key]
+            self._counts[key] = count + 1
+        return count % self.every == 0
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """入队前只渲染消息文本，异常堆栈放在 exc_text 中，由格式化器单独输出"""
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+# setup_logging() 之前使用的默认输出，见模块说明
+_default_handler = logging.StreamHandler(sys.stderr)
+_default_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s"))
+_package_logger = logging.getLogger(ROOT_LOGGER)
+_package_logger.addHandler(_default_handler)
+_package_logger.setLevel(logging.INFO)
+_package_logger.propagate = False
+
+
+def _parse_levels(spec: str) -> Dict[str, str]:
+    levels = {}
+    for item in spec.split(","):
+        if "=" in item:
+            component, level = item.split("=", 1)
+            levels[component.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(level: Optional[int | str] = None) -> None:
+    """
+    配置日志输出。不在导入时执行，由 core.runtime.init() 在入口处显式调用；重复调用会替换之前的配置。
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s"))
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+
+    queue_handler = _QueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(SamplingFilter(float(os.getenv("LOG_SAMPLE_RATE", "0.1"))))
+    _listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+    _package_logger.removeHandler(_default_handler)
+    _package_logger.setLevel(logging.NOTSET)
+    _package_logger.propagate = True
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level if level is not None else os.getenv("LOG_LEVEL", "INFO").upper())
+    for component, component_level in _parse_levels(os.getenv("LOG_LEVELS", "")).items():
+        get_logger(component).setLevel(component_level)
+
+
+def shutdown_logging() -> None:
+    """停止后台线程并写完队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
 
-logging.basicConfig(
-    level=logging.INFO, 
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
-logger = logging.getLogger(__name__)
+logger = get_logger("main")
@@ -0,0 +1,302 @@
+"""
+可插拔的搜索后端：
+
+- SerpApiBackend:     Google 搜索 (SerpApi)
+- TavilyBackend:      Tavily 搜索 (需要安装 tavily-python)
+- LocalIndexBackend:  基于 SQLite FTS5 的本地离线索引，适合无网络的压测和调试
+- FanOutSearch:       并发查询多个后端，返回最先得到的有效结果(或合并全部结果)，并取消较慢的请求
+
+通过 create_search_tool() 得到一个 str -> str 的函数，可以直接注册到 ToolExecutor；
+search_tool.search() 也按 SEARCH_BACKENDS 使用这里的后端。
+
+本地索引需要先写入文档(默认写到 LOCAL_SEARCH_DB=.cache/local_search.db)：
+    python search_backends.py index ./docs [--db .cache/local_search.db]
+    python search_backends.py query "快船 战绩"
+"""
+
+import os
+import glob
+import time
+import sqlite3
+import argparse
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from typing import Optional, List, Dict, Iterable, Tuple, Callable, Type, NamedTuple
+
+from core.runtime import load_env
+from core.tokens import tokenize
+from search_tool import NOT_FOUND_TEMPLATE, fetch_serpapi_results, parse_results
+from log import get_logger
+
+logger = get_logger("tools")
+
+
+class SearchOutcome(NamedTuple):
+    """一次搜索的结果：文本(没有有效结果时为 None) 和 各后端的错误信息"""
+    text: Optional[str]
+    errors: Dict[str, str]
+
+
+class SearchBackend(ABC):
+    """
+    搜索后端基类。
+    search() 返回整理好的文本；没有找到有效结果时返回 None，出错时直接抛出异常，由调用方决定如何处理。
+    timeout 为本次搜索允许的秒数，后端应尽量在超时后自行结束请求(FanOutSearch 依赖这一点回收线程)。
+    """
+    name: str = "base"
+
+    @abstractmethod
+    def search(self, query: str, timeout: Optional[float] = None) -> Optional[str]:
+        pass
+
+    def search_with_errors(self, query: str, timeout: Optional[float] = None) -> SearchOutcome:
+        """不抛异常的版本：错误随结果一起返回，而不是保存在实例上(同一个后端会被多个会话并发使用)"""
+        try:
+            return SearchOutcome(self.search(query, timeout=timeout), {})
+        except Exception as e:
+            return SearchOutcome(None, {self.name: str(e)})
+
+
+class SerpApiBackend(SearchBackend):
+    """SerpApi 客户端不支持设置超时，超时的请求只能在后台线程中自然结束，其结果会被丢弃"""
+    name = "serpapi"
+
+    def search(self, query: str, timeout: Optional[float] = None) -> Optional[str]:
+        results = fetch_serpapi_results(query)
+        if "error" in results:
+            raise RuntimeError(results["error"])
+        text = parse_results(results, query)
+        if not text or text == NOT_FOUND_TEMPLATE.format(query=query):
+            return None
+        return text
+
+
+class TavilyBackend(SearchBackend):
+    name = "tavily"
+
+    def __init__(self, api_key: Optional[str] = None, max_results: int = 5):
+        load_env()
+        self.api_key = api_key or os.getenv("TAVILY_API_KEY")
+        self.max_results = max_results
+        self._client = None
+
+    def search(self, query: str, timeout: Optional[float] = None) -> Optional[str]:
+        if not self.api_key:
+            raise ValueError("TAVILY_API_KEY 没有在.env文件中配置")
+        if self._client is None:
+            from tavily import TavilyClient
+            self._client = TavilyClient(api_key=self.api_key)
+
+        kwargs = {"timeout": max(int(timeout), 1)} if timeout else {}
+        response = self._client.search(query, max_results=self.max_results, include_answer=True, **kwargs)
+        parts = []
+        if response.get("answer"):
+            parts.append(str(response["answer"]).strip())
+        for i, item in enumerate(response.get("results") or [], 1):
+            title = (item.get("title") or "").strip()
+            content = (item.get("content") or "").strip()
+            if title or content:
+                parts.append(f"[{i}] {title}\n{content}".strip())
+        return "\n\n".join(parts) if parts else None
+
+
+class LocalIndexBackend(SearchBackend):
+    """
+    本地离线搜索：SQLite FTS5 全文索引。
+    写入和查询前都用 core.tokens.tokenize 切词(中文单字+二字)，因此不依赖 FTS5 的中文分词能力。
+    索引文件默认为 LOCAL_SEARCH_DB(.cache/local_search.db)，通过 index_directory() 或
+    `python search_backends.py index <目录>` 写入文档。
+    """
+    name = "local"
+
+    def __init__(self, db_path: Optional[str] = None, max_results: int = 5):
+        load_env()
+        self.db_path = db_path or os.getenv("LOCAL_SEARCH_DB", os.path.join(".cache", "local_search.db"))
+        self.max_results = max_results
+        directory = os.path.dirname(self.db_path)
+        if directory and self.db_path != ":memory:":
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS documents "
+            "USING fts5(title UNINDEXED, content UNINDEXED, terms)"
+        )
+        if self.count() == 0:
+            logger.warning(
+                "本地搜索索引 %s 为空，请先运行 python search_backends.py index <目录> 写入文档", self.db_path
+            )
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT count(*) FROM documents").fetchone()[0]
+
+    def add_documents(self, documents: Iterable[Tuple[str, str]]) -> int:
+        """批量写入 (标题, 正文)，返回写入条数"""
+        rows = [(title, content, " ".join(tokenize(f"{title} {content}"))) for title, content in documents]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT INTO documents (title, content, terms) VALUES (?, ?, ?)", rows)
+        return len(rows)
+
+    def index_directory(self, directory: str, patterns: Tuple[str, ...] = ("*.md", "*.txt")) -> int:
+        """把目录下的文本文件逐个写入索引，文件名作为标题"""
+        documents = []
+        for pattern in patterns:
+            for path in glob.glob(os.path.join(directory, "**", pattern), recursive=True):
+                with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                    documents.append((os.path.relpath(path, directory), f.read()))
+        return self.add_documents(documents)
+
+    def search(self, query: str, timeout: Optional[float] = None) -> Optional[str]:
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return None
+        match = " OR ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+        with self._lock:
+            if timeout is not None:
+                # 超过截止时间后由 SQLite 中断查询(抛出 OperationalError: interrupted)
+                deadline = time.monotonic() + timeout
+                self._conn.set_progress_handler(lambda: int(time.monotonic() > deadline), 1000)
+            try:
+                rows = self._conn.execute(
+                    "SELECT title, content FROM documents WHERE documents MATCH ? "
+                    "ORDER BY bm25(documents) LIMIT ?",
+                    (f"terms : ({match})", self.max_results)
+                ).fetchall()
+            finally:
+                if timeout is not None:
+                    self._conn.set_progress_handler(None, 0)
+        if not rows:
+            return None
+        return "\n\n".join(f"[{i}] {title}\n{content[:500].strip()}" for i, (title, content) in enumerate(rows, 1))
+
+
+class FanOutSearch(SearchBackend):
+    """
+    并发查询多个后端，可被多个会话共享：线程池在实例内复用，每次搜索的错误随结果返回。
+    - mode="first": 返回最先完成的有效结果，取消还在排队的请求；
+                    已经发出的请求带着剩余的超时时间，由后端自行结束(见 SearchBackend.search)
+    - mode="merge": 在超时时间内等待全部后端，按后端顺序合并结果
+    - max_workers:  线程池大小，默认 后端数 * 4，即约 4 个并发搜索
+    """
+    name = "fanout"
+
+    def __init__(
+            self,
+            backends: List[SearchBackend],
+            mode: str = "first",
+            timeout: float = 15,
+            max_workers: Optional[int] = None
+    ):
+        if mode not in ("first", "merge"):
+            raise ValueError(f"不支持的 fan-out 模式：{mode}")
+        self.backends = backends
+        self.mode = mode
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers or len(backends) * 4, thread_name_prefix="search"
+        )
+
+    def search(self, query: str, timeout: Optional[float] = None) -> Optional[str]:
+        return self.search_with_errors(query, timeout).text
+
+    def search_with_errors(self, query: str, timeout: Optional[float] = None) -> SearchOutcome:
+        timeout = timeout or self.timeout
+        futures = {
+            self._pool.submit(backend.search, query, timeout=timeout): backend for backend in self.backends
+        }
+        results: Dict[str, str] = {}
+        errors: Dict[str, str] = {}
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                backend = futures[future]
+                try:
+                    text = future.result()
+                except Exception as e:
+                    errors[backend.name] = str(e)
+                    continue
+                if not text:
+                    continue
+                if self.mode == "first":
+                    return SearchOutcome(text, errors)
+                results[backend.name] = text
+        except FuturesTimeoutError:
+            for future, backend in futures.items():
+                if not future.done():
+                    errors[backend.name] = "超时"
+        finally:
+            # 不等待较慢的后端：排队中的请求直接取消
+            for future in futures:
+                future.cancel()
+
+        if not results:
+            return SearchOutcome(None, errors)
+        return SearchOutcome("\n\n".join(
+            f"【{backend.name}】\n{results[backend.name]}" for backend in self.backends if backend.name in results
+        ), errors)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+BACKENDS: Dict[str, Type[SearchBackend]] = {
+    SerpApiBackend.name: SerpApiBackend,
+    TavilyBackend.name: TavilyBackend,
+    LocalIndexBackend.name: LocalIndexBackend,
+}
+
+
+def register_backend(backend_cls: Type[SearchBackend]) -> Type[SearchBackend]:
+    """注册新的搜索后端，可作为类装饰器使用"""
+    BACKENDS[backend_cls.name] = backend_cls
+    return backend_cls
+
+
+def create_search_tool(
+        backends: Optional[List[SearchBackend]] = None,
+        mode: Optional[str] = None,
+        timeout: float = 15
+) -> Callable[[str], str]:
+    """
+    创建一个可注册到 ToolExecutor 的搜索函数。
+    未传入 backends 时按环境变量 SEARCH_BACKENDS (逗号分隔，默认 serpapi) 创建，
+    mode 默认读取 SEARCH_FANOUT_MODE (first / merge)。
+    """
+    if backends is None:
+        load_env()
+        names = [n.strip() for n in os.getenv("SEARCH_BACKENDS", "serpapi").split(",") if n.strip()]
+        unknown = [n for n in names if n not in BACKENDS]
+        if unknown:
+            raise ValueError(f"未知的搜索后端：{', '.join(unknown)}")
+        backends = [BACKENDS[n]() for n in names]
+    mode = mode or os.getenv("SEARCH_FANOUT_MODE", "first")
+    backend = backends[0] if len(backends) == 1 else FanOutSearch(backends, mode=mode, timeout=timeout)
+
+    def search(query: str) -> str:
+        logger.info("正在执行【%s】网页搜索：%s", backend.name, query, extra={"backend": backend.name})
+        text, errors = backend.search_with_errors(query, timeout=timeout)
+        if text:
+            return text
+        if errors:
+            return "搜索时发生了错误：" + "; ".join(f"{name}: {err}" for name, err in errors.items())
+        return NOT_FOUND_TEMPLATE.format(query=query)
+
+    return search
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="本地离线搜索索引 (LocalIndexBackend)")
+    arg_parser.add_argument("--db", default=None, help="索引文件，默认读取 LOCAL_SEARCH_DB(.cache/local_search.db)")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    index_cmd = commands.add_parser("index", help="把目录下的 .md / .txt 文件写入索引")
+    index_cmd.add_argument("directory")
+    query_cmd = commands.add_parser("query", help="在索引中搜索")
+    query_cmd.add_argument("query")
+    args = arg_parser.parse_args()
+
+    local = LocalIndexBackend(args.db)
+    if args.command == "index":
+        print(f"已写入 {local.index_directory(args.directory)} 个文档，索引共 {local.count()} 个文档：{local.db_path}")
+    else:
+        print(local.search(args.query) or NOT_FOUND_TEMPLATE.format(query=args.query))
@@ -0,0 +1,212 @@
+"""
+批量解析：对大量已存储的 SerpApi 原始结果重新执行解析(search_tool.parse_results)，用于调优解析器。
+
+- 输入：可迭代的结果(dict / JSON 字符串 / bytes)，或一个 JSONL 文件(通过 mmap 逐行读取)
+- 多进程：JSON 解码和解析都在进程池中完成，按输入顺序流式产出结果
+- 统计：每个解析器的命中率、被选中次数和耗时，用来判断哪些解析器值得它的开销
+- 结果与 search() 使用同一个解析入口(parse_results，同样遵循 SEARCH_RESULT_MODE)，批量输出与在线搜索一致；
+  rank 模式下全部解析器的结果都参与排序，"选中"记为优先级最高的命中解析器
+
+用法：python search_bulk.py archive.jsonl --out parsed.jsonl --workers 8
+"""
+
+import os
+import sys
+import json
+import mmap
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Optional, Iterable, Iterator, List, Dict, Any, Tuple, Union
+
+from search_tool import PARSERS, ParserTrace, parse_results, run_parser
+
+try:
+    import orjson
+
+    def _loads(data: Union[str, bytes]) -> Any:
+        return orjson.loads(data)
+except ImportError:
+    def _loads(data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+RawResult = Union[Dict[str, Any], str, bytes]
+
+
+class BulkParseStats:
+    """汇总批量解析过程中每个解析器的调用次数、命中次数、被选中次数和耗时"""
+    def __init__(self):
+        self.records = 0
+        self.errors = 0
+        self.elapsed = 0.0
+        self.parsers: Dict[str, Dict[str, float]] = {
+            parser.__name__: {"calls": 0, "hits": 0, "wins": 0, "seconds": 0.0}
+            for parser in PARSERS
+        }
+
+    def add(self, timings: ParserTrace, winner: Optional[str], error: bool = False) -> None:
+        self.records += 1
+        self.errors += int(error)
+        for name, hit, seconds in timings:
+            entry = self.parsers[name]
+            entry["calls"] += 1
+            entry["hits"] += int(hit)
+            entry["seconds"] += seconds
+        if winner:
+            self.parsers[winner]["wins"] += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "records": self.records,
+            "errors": self.errors,
+            "elapsed": self.elapsed,
+            "parsers": self.parsers,
+        }
+
+    def report(self) -> str:
+        lines = [
+            f"共解析 {self.records} 条结果，失败 {self.errors} 条，耗时 {self.elapsed:.2f}s",
+            f"{'解析器':<26}{'命中率':>8}{'选中率':>8}{'平均耗时(us)':>14}",
+        ]
+        for name, entry in self.parsers.items():
+            calls = entry["calls"] or 1
+            lines.append(
+                f"{name:<28}{entry['hits'] / calls:>8.1%}{entry['wins'] / max(self.records, 1):>8.1%}"
+                f"{entry['seconds'] / calls * 1e6:>14.1f}"
+            )
+        return "\n".join(lines)
+
+
+def parse_with_stats(results: Dict[str, Any], evaluate_all: bool = True) -> Tuple[Optional[str], ParserTrace, Optional[str]]:
+    """
+    调用 parse_results 得到结果，同时记录每个解析器的命中情况和耗时，返回 (结果, 记录, 被选中的解析器名)。
+    evaluate_all=True 时在得到结果后继续运行尚未运行的解析器(结果不变)，以便统计完整的命中率。
+    """
+    trace: ParserTrace = []
+    answer = parse_results(results, _query_of(results), trace)
+    winner = next((name for name, hit, _ in trace if hit), None)
+    if evaluate_all and isinstance(results, dict) and "error" not in results:
+        evaluated = {name for name, _, _ in trace}
+        for parser in PARSERS:
+            if parser.__name__ not in evaluated:
+                run_parser(parser, results, trace)
+    return answer, trace, winner
+
+
+def _query_of(results: Any) -> str:
+    if isinstance(results, dict):
+        return (results.get("search_parameters") or {}).get("q", "")
+    return ""
+
+
+def _parse_batch(batch: List[RawResult], evaluate_all: bool) -> List[Tuple[Optional[str], ParserTrace, Optional[str], bool]]:
+    """在工作进程中执行：解码并解析一批结果"""
+    out = []
+    for raw in batch:
+        try:
+            results = raw if isinstance(raw, dict) else _loads(raw)
+            answer, timings, winner = parse_with_stats(results, evaluate_all)
+            out.append((answer, timings, winner, False))
+        except Exception as e:
+            out.append((f"解析失败：{e}", [], None, True))
+    return out
+
+
+def iter_raw_results(source: Union[str, os.PathLike, Iterable[RawResult]]) -> Iterator[RawResult]:
+    """
+    把输入统一为逐条的原始结果。
+    文件路径按 JSONL 处理，使用 mmap 逐行读取，不把整个文件读进内存，也不在主进程中解码 JSON。
+    """
+    if not isinstance(source, (str, os.PathLike)):
+        yield from source
+        return
+    with open(source, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for line in iter(mm.readline, b""):
+                line = line.strip()
+                if line:
+                    yield line
+
+
+def _batches(items: Iterable[RawResult], batch_size: int) -> Iterator[List[RawResult]]:
+    batch: List[RawResult] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bulk_parse_results(
+        source: Union[str, os.PathLike, Iterable[RawResult]],
+        workers: Optional[int] = None,
+        batch_size: int = 256,
+        evaluate_all: bool = True,
+        stats: Optional[BulkParseStats] = None
+) -> Iterator[Optional[str]]:
+    """
+    批量解析 SerpApi 原始结果，按输入顺序流式产出 parse_results 的结果。
+
+    参数:
+    - source:       JSONL 文件路径，或可迭代的 dict / JSON 字符串 / bytes
+    - workers:      进程数，默认使用全部 CPU 核；<= 1 时在当前进程内解析
+    - batch_size:   每个任务包含的结果条数，批量提交以摊薄进程间通信开销
+    - evaluate_all: 是否对每条结果运行全部解析器，用于统计完整的命中率
+    - stats:        传入 BulkParseStats 以收集统计信息
+    """
+    stats = stats if stats is not None else BulkParseStats()
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+
+    def collect(parsed) -> Iterator[Optional[str]]:
+        for answer, timings, winner, error in parsed:
+            stats.add(timings, winner, error)
+            yield answer
+
+    batches = _batches(iter_raw_results(source), batch_size)
+    try:
+        if workers <= 1:
+            for batch in batches:
+                yield from collect(_parse_batch(batch, evaluate_all))
+            return
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # 限制在途任务数量，避免把整个归档一次性提交到进程池
+            pending: deque[Future] = deque()
+            for batch in batches:
+                pending.append(pool.submit(_parse_batch, batch, evaluate_all))
+                if len(pending) >= workers * 2:
+                    yield from collect(pending.popleft().result())
+            while pending:
+                yield from collect(pending.popleft().result())
+    finally:
+        stats.elapsed += time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description="批量解析已存储的 SerpApi 结果 (JSONL)")
+    arg_parser.add_argument("source", help="JSONL 文件，每行一个 SerpApi 原始结果")
+    arg_parser.add_argument("--out", help="解析结果输出文件 (JSONL)，默认不输出")
+    arg_parser.add_argument("--workers", type=int, default=None, help="进程数，默认使用全部 CPU 核")
+    arg_parser.add_argument("--batch-size", type=int, default=256)
+    arg_parser.add_argument("--first-only", action="store_true", help="命中后不再运行后面的解析器(更快，但命中率统计不完整)")
+    args = arg_parser.parse_args()
+
+    bulk_stats = BulkParseStats()
+    out = open(args.out, "w", encoding="utf-8") if args.out else None
+    try:
+        for parsed in bulk_parse_results(
+                args.source, workers=args.workers, batch_size=args.batch_size,
+                evaluate_all=not args.first_only, stats=bulk_stats
+        ):
+            if out:
+                out.write(json.dumps({"result": parsed}, ensure_ascii=False) + "\n")
+    finally:
+        if out:
+            out.close()
+    print(bulk_stats.report(), file=sys.stderr)
@@ -0,0 +1,157 @@
+"""
+多结果排序：汇总所有解析器的候选内容，去除近似重复，按与查询的相关度排序，并在 token 预算内打包成一个 Observation。
+
+与 smart_parse_results 的"第一个命中的解析器胜出"不同，这里 answer_box、知识图谱和多条网页摘要可以同时出现，
+模型拿到的信息更全，需要再次搜索(即额外的 ReAct 步骤)的概率更低。
+"""
+
+import re
+import time
+import zlib
+import random
+from collections import Counter
+from typing import Optional, List, Dict, Any, Tuple, NamedTuple
+
+from core.tokens import bm25_score, estimate_tokens, tokenize, truncate_to_tokens
+from search_tool import (
+    PARSERS,
+    NOT_FOUND_TEMPLATE,
+    ParserTrace,
+    run_parser,
+    _parse_local_results,
+    _parse_organic_results,
+    _parse_related_questions,
+)
+
+# 这些解析器的结果由多条独立条目组成，逐条拆成候选
+_ITEM_PARSERS = {
+    _parse_organic_results: "organic_results",
+    _parse_related_questions: "related_questions",
+    _parse_local_results: "local_results",
+}
+# 来源先验分：直接答案类的结果通常很短，BM25 得分偏低，需要补偿
+SOURCE_PRIOR: Dict[str, float] = {
+    "_parse_answer_box": 3.0,
+    "_parse_answer_box_list": 2.5,
+    "_parse_sports_results": 2.5,
+    "_parse_knowledge_graph": 2.0,
+    "_parse_related_questions": 0.5,
+    "_parse_local_results": 0.5,
+    "_parse_organic_results": 0.0,
+    "_parse_related_searches": -1.0,
+}
+
+class Candidate(NamedTuple):
+    source: str
+    text: str
+
+
+def collect_candidates(results: Dict[str, Any], trace: Optional[ParserTrace] = None) -> List[Candidate]:
+    """
+    运行全部解析器收集候选，多条目的结果(网页摘要、相关问题、地点)逐条拆开且不限制条数。
+    传入 trace 时每个解析器记录一条(逐条拆开的解析器记录总耗时，任意一条有结果即为命中)。
+    """
+    candidates: List[Candidate] = []
+    for parser in PARSERS:
+        key = _ITEM_PARSERS.get(parser)
+        if key is None:
+            text = run_parser(parser, results, trace)
+            if text and text.strip():
+                candidates.append(Candidate(parser.__name__, text.strip()))
+            continue
+        start = time.perf_counter()
+        found = len(candidates)
+        items = results.get(key)
+        for item in items if isinstance(items, list) else []:
+            text = parser({key: [item]})
+            if text and text.strip():
+                # 去掉单条解析时产生的 "[1] " 编号，最终输出时重新编号
+                candidates.append(Candidate(parser.__name__, re.sub(r"^\[\d+\]\s*", "", text.strip())))
+        if trace is not None:
+            trace.append((parser.__name__, len(candidates) > found, time.perf_counter() - start))
+    return candidates
+
+
+class MinHashDeduper:
+    """
+    基于字符 shingle + MinHash 的近似去重。
+    估计的 Jaccard 相似度达到阈值即视为重复，先加入的候选(优先级更高)被保留。
+    """
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, shingle_size: int = 3, seed: int = 1):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        rng = random.Random(seed)
+        self._masks = [rng.getrandbits(32) for _ in range(num_perm)]
+        self._signatures: List[Tuple[int, ...]] = []
+
+    def _signature(self, text: str) -> Tuple[int, ...]:
+        text = re.sub(r"\s+", " ", text.lower())
+        n = self.shingle_size
+        shingles = {text[i:i + n] for i in range(max(len(text) - n + 1, 1))}
+        hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles]
+        return tuple(min(h ^ mask for h in hashes) for mask in self._masks)
+
+    def add(self, text: str) -> bool:
+        """加入一条文本；若与已加入的文本近似重复则返回 False"""
+        signature = self._signature(text)
+        for other in self._signatures:
+            same = sum(a == b for a, b in zip(signature, other))
+            if same / len(signature) >= self.threshold:
+                return False
+        self._signatures.append(signature)
+        return True
+
+
+def bm25_scores(query: str, documents: List[str], k1: float = 1.5, b: float = 0.75) -> List[float]:
+    """以候选集合本身作为语料计算 BM25 得分"""
+    docs = [tokenize(doc) for doc in documents]
+    if not docs:
+        return []
+    avgdl = sum(len(doc) for doc in docs) / len(docs) or 1.0
+    df = Counter(token for doc in docs for token in set(doc))
+    query_tokens = set(tokenize(query))
+    return [bm25_score(query_tokens, Counter(doc), len(doc), avgdl, df, len(docs), k1, b) for doc in docs]
+
+
+def rank_parse_results(
+        results: Dict[str, Any],
+        query: str = "",
+        token_budget: int = 400,
+        dedup_threshold: float = 0.8,
+        trace: Optional[ParserTrace] = None
+) -> Optional[str]:
+    """
+    smart_parse_results 的排序版：汇总全部解析器的候选 → 去重 → BM25 + 来源先验排序 → 在 token 预算内打包。
+    """
+    if not isinstance(results, dict):
+        return None
+
+    if "error" in results:
+        return f"搜索出错：{results.get('error', '未知错误')}"
+
+    deduper = MinHashDeduper(threshold=dedup_threshold)
+    candidates = [c for c in collect_candidates(results, trace) if deduper.add(c.text)]
+    if not candidates:
+        return NOT_FOUND_TEMPLATE.format(query=query)
+
+    scores = bm25_scores(query, [c.text for c in candidates])
+    ranked = sorted(
+        zip(candidates, scores),
+        key=lambda pair: pair[1] + SOURCE_PRIOR.get(pair[0].source, 0.0),
+        reverse=True
+    )
+
+    parts: List[str] = []
+    used = 0
+    for candidate, _ in ranked:
+        text = f"[{len(parts) + 1}] {candidate.text}"
+        cost = estimate_tokens(text)
+        if used + cost > token_budget:
+            if parts:
+                continue
+            # 第一条就超出预算时按 token 截断，保证至少返回一条
+            text = truncate_to_tokens(text, token_budget)
+            cost = estimate_tokens(text)
+        parts.append(text)
+        used += cost
+    return "\n\n".join(parts)
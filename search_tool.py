@@ -1,9 +1,12 @@
-import serpapi
 import os 
-from dotenv import load_dotenv
-from typing import Optional, Callable, List, Dict, Any
-import json; 
-load_dotenv()
+import time
+from typing import Optional, Callable, List, Dict, Any, Tuple
+import json
+from core.runtime import load_env, init
+from core.profiling import profile_step
+from log import get_logger
+
+logger = get_logger("tools")
 
 def _parse_answer_box(results: Dict[str, Any]) -> Optional[str]:
     box = results.get("answer_box")
@@ -169,7 +172,36 @@ def _parse_related_searches(results: Dict[str, Any]) -> Optional[str]:
 
     return "相关搜索: " + ", ".join(queries[:5])
 
-def smart_parse_results(results: Dict[str, Any], query: str = "") -> Optional[str]:           
+NOT_FOUND_TEMPLATE = "抱歉，没有找到关于'{query}'的相关信息"
+
+# 按优先级排列的解析器，smart_parse_results 返回第一个非空结果
+PARSERS: List[Callable[[Dict[str, Any]], Optional[str]]] = [
+    _parse_answer_box,
+    _parse_answer_box_list,
+    _parse_sports_results,
+    _parse_knowledge_graph,
+    _parse_related_questions,
+    _parse_local_results,
+    _parse_organic_results,
+    _parse_related_searches,
+]
+
+# 解析过程记录：[(解析器名, 是否命中, 耗时秒)]，供批量解析(search_bulk)统计各解析器的命中率和开销
+ParserTrace = List[Tuple[str, bool, float]]
+
+
+def run_parser(parser: Callable[[Dict[str, Any]], Optional[str]], results: Dict[str, Any],
+               trace: Optional[ParserTrace] = None) -> Optional[str]:
+    """运行一个解析器；传入 trace 时记录是否命中和耗时"""
+    if trace is None:
+        return parser(results)
+    start = time.perf_counter()
+    result = parser(results)
+    trace.append((parser.__name__, bool(result and result.strip()), time.perf_counter() - start))
+    return result
+
+
+def smart_parse_results(results: Dict[str, Any], query: str = "", trace: Optional[ParserTrace] = None) -> Optional[str]:
     """
     智能解析SerpApi返回的结果，按优先级提取最相关的答案。
     1. 基础校验
@@ -182,51 +214,65 @@ def smart_parse_results(results: Dict[str, Any], query: str = "") -> Optional[st
     if "error" in results: 
         return f"搜索出错：{results.get('error', '未知错误')}"
     
-    parsers: List[Callable[[Dict[str, Any]], Optional[str]]] = [
-        _parse_answer_box,
-        _parse_answer_box_list,
-        _parse_sports_results,
-        _parse_knowledge_graph,
-        _parse_related_questions,
-        _parse_local_results,
-        _parse_organic_results,
-        _parse_related_searches,
-    ]
-
-    for parser in parsers:
-        result = parser(results)
+    for parser in PARSERS:
+        result = run_parser(parser, results, trace)
         if result and result.strip():
             return result.strip()
     
-    return f"抱歉，没有找到关于'{query}'的相关信息"
+    return NOT_FOUND_TEMPLATE.format(query=query)
 
 
+def fetch_serpapi_results(query: str) -> Dict[str, Any]:
+    """
+    调用 SerpApi 获取原始搜索结果
+    使用SerpApiClient去进行搜索，它是底层class，可以选择搜索引擎；而GoogleSearch只能用Google搜索
+    """
+    # serpapi 只在真正发起搜索时才导入，避免拖慢 import search_tool
+    import serpapi
+
+    load_env()
+    api_key = os.getenv("SERPAPI_API_KEY")
+    if not api_key:
+        raise ValueError("SERPAPI_API_KEY 没有在.env文件中配置")
+
+    params = {
+        "engine" : "google",
+        "q"      :  query,
+        "api_key":  api_key,
+        "gl"     : "cn",
+        "hl"     : "zh-cn",
+    }
+    client = serpapi.Client(params)
+    return client.get_dict()
+
+
+def parse_results(results: Dict[str, Any], query: str = "", trace: Optional[ParserTrace] = None) -> Optional[str]:
+    """
+    search() 和批量解析(search_bulk)共用的解析入口：
+    SEARCH_RESULT_MODE=rank 时汇总全部解析器的结果并按相关度排序，默认返回第一个命中的解析器结果
+    """
+    if os.getenv("SEARCH_RESULT_MODE", "first") == "rank":
+        from search_rank import rank_parse_results
+        return rank_parse_results(results, query, token_budget=int(os.getenv("SEARCH_TOKEN_BUDGET", 400)), trace=trace)
+    return smart_parse_results(results, query, trace)
+
+
+_default_search: Optional[Callable[[str], str]] = None
+
 
 def search(query: str) -> str:
     """
-    基于SerpApi的实战网页搜索引擎工具，智能解析搜索结果，优先返回 直接答案或者知识图谱信息
-    使用SerpApiClient去进行搜索，它是底层class，可以选择搜索引擎；而GoogleSearch只能用Google搜索
+    实战网页搜索引擎工具，智能解析搜索结果，优先返回 直接答案或者知识图谱信息
+    后端由 SEARCH_BACKENDS 决定(默认 serpapi，多个时并发查询，见 search_backends)，第一次调用时创建
     """
-    print(f"正在执行【SerpiApi】网页搜索：{query}")
-    try:
-        api_key = os.getenv("SERPAPI_API_KEY")
-        if not api_key:
-            return "错误：SERPAPI_API_KEY 没有在.env文件中配置"
-        
-        params = {
-            "engine" : "google",
-            "q"      :  query,
-            "api_key":  api_key,
-            "gl"     : "cn",
-            "hl"     : "zh-cn",
-        }
-        client = serpapi.Client(params)
-        results = client.get_dict()
-        # print(json.dumps(results, indent=2, ensure_ascii=False))
-        return smart_parse_results(results, query)
-    
-    except Exception as e:
-        return f"搜索时发生了错误：{e}"
+    global _default_search
+    if _default_search is None:
+        from search_backends import create_search_tool
+        try:
+            _default_search = create_search_tool()
+        except ValueError as e:
+            return f"错误：{e}"
+    return _default_search(query)
 
 
 class ToolExecutor:
@@ -236,14 +282,16 @@ class ToolExecutor:
     def __init__(self):
         self.tools: Dict[str, Dict[str, Any]] = {}
 
-    def registerTool(self, name: str, description: str, func:callable):
+    def registerTool(self, name: str, description: str, func:callable, parameters: Optional[Dict[str, Any]] = None):
         """
         向工具箱中注册一个新工具
+        parameters 为 JSON Schema 格式的参数定义，用于 function calling；
+        不提供时视为只接收一个字符串参数 input 的工具(与 ReAct 的 tool[input] 调用方式一致)。
         """
         if name in self.tools:
-            print(f"警告：工具 '{name}'已经存在，将被覆盖。")
-        self.tools[name] = {"description": description, "function": func}
-        print(f"工具 '{name}' 已注册")
+            logger.warning("工具 '%s' 已经存在，将被覆盖", name)
+        self.tools[name] = {"description": description, "function": func, "parameters": parameters}
+        logger.debug("工具 '%s' 已注册", name)
 
     def getTool(self, name: str) -> callable:
         """ 
@@ -259,9 +307,54 @@ class ToolExecutor:
             f"- {name}: {info['description']}" 
             for name, info in self.tools.items()
         ])
+
+    def getToolSchemas(self) -> List[Dict[str, Any]]:
+        """
+        获取所有工具的 OpenAI tools 格式定义，用于原生 function calling
+        """
+        return [
+            {
+                "type": "function",
+                "function": {
+                    "name": name,
+                    "description": info["description"],
+                    "parameters": info.get("parameters") or {
+                        "type": "object",
+                        "properties": {"input": {"type": "string", "description": "工具的输入"}},
+                        "required": ["input"],
+                    },
+                },
+            }
+            for name, info in self.tools.items()
+        ]
+
+    def executeTool(self, name: str, arguments: Dict[str, Any]) -> str:
+        """
+        按 function calling 返回的参数执行工具，出错时返回错误信息而不是抛出异常
+        """
+        info = self.tools.get(name)
+        if info is None:
+            logger.warning("未找到名为 '%s' 的工具", name)
+            return f"错误：未找到名为 '{name}' 的工具。"
+        start = time.perf_counter()
+        try:
+            with profile_step(f"tool:{name}"):
+                if info.get("parameters"):
+                    result = str(info["function"](**arguments))
+                else:
+                    result = str(info["function"](arguments.get("input", "")))
+        except Exception as e:
+            logger.error("工具 '%s' 执行失败：%s", name, e, extra={"tool": name})
+            return f"错误：工具 '{name}' 执行失败：{e}"
+        logger.info("工具调用完成", extra={
+            "tool": name, "chars": len(result), "seconds": round(time.perf_counter() - start, 3)
+        })
+        logger.debug("工具输出", extra={"sample": f"tools.{name}", "tool": name, "content": result})
+        return result
     
 
 if __name__ == '__main__':
+    init()
 
     # 1. 初始化工具执行器
     toolExecutor = ToolExecutor()
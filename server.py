@@ -0,0 +1,285 @@
+"""
+智能体服务：通过 HTTP / SSE / WebSocket 对外提供 ReAct、Plan-and-Solve 和 Reflection 智能体。
+
+- 所有会话共享同一个 HelloAgentsLLM(内部是带连接池的 OpenAI 客户端)和同一个 ToolExecutor
+- 智能体本身是同步代码，每个会话在线程池中运行；asyncio 事件循环只负责网络 IO
+- token 通过有界队列转发给客户端：客户端读得慢时，生成线程会阻塞等待(背压)
+- 客户端断开后会话被取消：三种接口都在整个会话期间监听断开，token 回调在转发每个 token 前检查取消标记，
+  正在进行的 LLM 流式请求会在下一个 token 到来时被关闭，不再消耗 token
+- 设置 LLM_SMALL_MODEL_ID 时使用小模型 / 大模型级联，各角色的升级率和节省的延迟见 GET /healthz 的 cascade 字段
+- 设置 CASSETTE_MODE=record 时录制全部会话的 LLM / 工具流量；CASSETTE_MODE=replay 时不访问任何后端，直接回放录制内容(见 core.cassette)
+
+接口：
+    POST /v1/agents/{agent}/runs          {"input": "..."}  -> {"output": "..."}
+    POST /v1/agents/{agent}/runs/stream   {"input": "..."}  -> SSE: token / done / error 事件
+    WS   /v1/agents/{agent}/ws            发送 {"input": "..."}，接收 {"type": "token" | "done" | "error", ...}
+
+用法：python server.py --host 0.0.0.0 --port 8000
+"""
+
+import os
+import json
+import asyncio
+import argparse
+import threading
+import concurrent.futures
+from contextlib import asynccontextmanager, aclosing
+from typing import Any, AsyncIterator, Optional, Tuple
+
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.websockets import WebSocketState
+from pydantic import BaseModel
+
+from core.cassette import Cassette
+from core.runtime import init
+from core.streaming import RunCancelled, token_sink
+from agents.registry import AGENT_FACTORIES, build_runtime, cascade_stats
+
+
+class RunRequest(BaseModel):
+    input: str
+
+
+class AgentSession:
+    """
+    一次智能体运行。在工作线程中执行 agent.run()，生成的 token 经有界队列交给事件循环。
+    """
+    def __init__(self, agent_name: str, agent: Any, loop: asyncio.AbstractEventLoop, queue_size: int):
+        self.agent_name = agent_name
+        self.agent = agent
+        self.loop = loop
+        self.queue: asyncio.Queue[Tuple[str, Optional[str]]] = asyncio.Queue(maxsize=queue_size)
+        self.cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        """在事件循环中调用：设置取消标记，并唤醒正在等待事件的 events()"""
+        if self.cancelled.is_set():
+            return
+        self.cancelled.set()
+        try:
+            self.queue.put_nowait(("cancelled", None))
+        except asyncio.QueueFull:
+            pass    # 队列非空，events() 取下一个事件时就会发现取消标记
+
+    def _put(self, event: Tuple[str, Optional[str]]) -> None:
+        """在工作线程中调用：队列已满时阻塞等待，期间若会话被取消则抛出 RunCancelled"""
+        if self.cancelled.is_set():
+            raise RunCancelled()
+        future = asyncio.run_coroutine_threadsafe(self.queue.put(event), self.loop)
+        while True:
+            try:
+                future.result(timeout=0.5)
+                return
+            except concurrent.futures.TimeoutError:
+                if self.cancelled.is_set():
+                    future.cancel()
+                    raise RunCancelled()
+
+    def _emit(self, text: str) -> None:
+        """token 回调：每个 token 转发前都检查取消标记；空字符串只检查取消(见 core.streaming.HeldTokens)"""
+        if self.cancelled.is_set():
+            raise RunCancelled()
+        if text:
+            self._put(("token", text))
+
+    def run(self, input_text: str) -> None:
+        try:
+            with token_sink(self._emit):
+                output = self.agent.run(input_text)
+            self._put(("done", output))
+        except RunCancelled:
+            pass
+        except Exception as e:
+            if not self.cancelled.is_set():
+                self._put(("error", str(e)))
+
+    async def events(self) -> AsyncIterator[Tuple[str, Optional[str]]]:
+        while True:
+            event = await self.queue.get()
+            if self.cancelled.is_set():
+                return
+            yield event
+            if event[0] in ("done", "error"):
+                return
+
+
+class AgentServer:
+    """持有共享资源，并限制同时运行的会话数量"""
+    def __init__(self, max_sessions: int, queue_size: int):
+        self.cassette = Cassette.from_env()
+        self.llm, self.tools = build_runtime(self.cassette)
+        self.queue_size = queue_size
+        self.semaphore = asyncio.Semaphore(max_sessions)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_sessions, thread_name_prefix="agent")
+        self.active_sessions = 0
+
+    def new_session(self, agent_name: str) -> AgentSession:
+        factory = AGENT_FACTORIES.get(agent_name)
+        if factory is None:
+            raise HTTPException(status_code=404, detail=f"未知的智能体：{agent_name}")
+        return AgentSession(agent_name, factory(self.llm, self.tools), asyncio.get_running_loop(), self.queue_size)
+
+    async def stream(self, session: AgentSession, input_text: str) -> AsyncIterator[Tuple[str, Optional[str]]]:
+        """运行会话并产出事件；调用方停止迭代(客户端断开)时取消会话"""
+        if self.cassette:
+            self.cassette.record_run(session.agent_name, input_text)
+        await self.semaphore.acquire()
+        self.active_sessions += 1
+        try:
+            worker = asyncio.get_running_loop().run_in_executor(self.executor, session.run, input_text)
+        except BaseException:
+            self._release_slot()
+            raise
+        # 名额在工作线程真正结束后才归还，否则被取消但还没退出的线程加上新会话会超过 max_sessions
+        worker.add_done_callback(lambda _: self._release_slot())
+        try:
+            async for event in session.events():
+                yield event
+        finally:
+            # 不等待工作线程结束：它会在下一个 token 到来时发现会话已取消并退出
+            session.cancel()
+
+    def _release_slot(self) -> None:
+        self.active_sessions -= 1
+        self.semaphore.release()
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.cassette:
+            self.cassette.close()
+
+
+async def cancel_on_disconnect(request: Request, session: AgentSession) -> None:
+    """
+    非流式接口的断开监听：请求体已经读完，之后 receive() 只会在客户端断开时返回 http.disconnect。
+    """
+    while not session.cancelled.is_set():
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            session.cancel()
+            return
+
+
+def create_app(max_sessions: Optional[int] = None, queue_size: Optional[int] = None) -> FastAPI:
+    max_sessions = max_sessions or int(os.getenv("SERVER_MAX_SESSIONS", 32))
+    queue_size = queue_size or int(os.getenv("SERVER_QUEUE_SIZE", 256))
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        init()
+        app.state.server = AgentServer(max_sessions, queue_size)
+        yield
+        app.state.server.shutdown()
+
+    app = FastAPI(title="Hello Agents Server", lifespan=lifespan)
+
+    @app.get("/healthz")
+    async def healthz(request: Request):
+        server: AgentServer = request.app.state.server
+        result = {"status": "ok", "active_sessions": server.active_sessions, "agents": list(AGENT_FACTORIES)}
+        stats = cascade_stats(server.llm)
+        if stats is not None:
+            result["cascade"] = stats.summary()
+        return result
+
+    @app.post("/v1/agents/{agent_name}/runs")
+    async def run_agent(agent_name: str, body: RunRequest, request: Request):
+        server: AgentServer = request.app.state.server
+        session = server.new_session(agent_name)
+        watcher = asyncio.create_task(cancel_on_disconnect(request, session))
+        try:
+            async with aclosing(server.stream(session, body.input)) as events:
+                async for kind, data in events:
+                    if kind == "done":
+                        return {"output": data}
+                    if kind == "error":
+                        raise HTTPException(status_code=500, detail=data)
+        finally:
+            watcher.cancel()
+        # 客户端已断开，会话被取消；这个响应不会被任何人读到
+        return JSONResponse({"detail": "客户端已断开，运行已取消"}, status_code=499)
+
+    @app.post("/v1/agents/{agent_name}/runs/stream")
+    async def stream_agent(agent_name: str, body: RunRequest, request: Request):
+        server: AgentServer = request.app.state.server
+        session = server.new_session(agent_name)
+
+        async def sse() -> AsyncIterator[str]:
+            # 客户端断开时 Starlette 会取消该生成器，server.stream 的 finally 随之取消会话
+            async with aclosing(server.stream(session, body.input)) as events:
+                async for kind, data in events:
+                    payload = json.dumps({"content": data} if kind == "token" else {"output": data}, ensure_ascii=False)
+                    yield f"event: {kind}\ndata: {payload}\n\n"
+
+        return StreamingResponse(sse(), media_type="text/event-stream")
+
+    @app.websocket("/v1/agents/{agent_name}/ws")
+    async def websocket_agent(websocket: WebSocket, agent_name: str):
+        server: AgentServer = websocket.app.state.server
+        await websocket.accept()
+        if agent_name not in AGENT_FACTORIES:
+            await websocket.close(code=4404, reason=f"未知的智能体：{agent_name}")
+            return
+
+        # 整个连接期间只有 reader 调用 receive()：断开时立即取消正在运行的会话，
+        # 主循环通过 inbox 中的 None 得知连接已断开，不会在断开后再次调用 receive()
+        inbox: asyncio.Queue[Optional[str]] = asyncio.Queue()
+        active: Dict[str, Optional[AgentSession]] = {"session": None}
+
+        async def reader() -> None:
+            try:
+                while True:
+                    message = await websocket.receive()
+                    if message["type"] == "websocket.disconnect":
+                        return
+                    # 运行期间收到的其他消息会被忽略
+                    if active["session"] is None:
+                        inbox.put_nowait(message.get("text") or (message.get("bytes") or b"").decode("utf-8"))
+            finally:
+                if active["session"] is not None:
+                    active["session"].cancel()
+                inbox.put_nowait(None)
+
+        reader_task = asyncio.create_task(reader())
+        try:
+            while True:
+                text = await inbox.get()
+                if text is None:
+                    return
+                try:
+                    message = json.loads(text)
+                except ValueError:
+                    await websocket.send_json({"type": "error", "output": "消息必须是 JSON：{\"input\": \"...\"}"})
+                    continue
+                session = server.new_session(agent_name)
+                active["session"] = session
+                try:
+                    input_text = str(message.get("input", "")) if isinstance(message, dict) else ""
+                    async with aclosing(server.stream(session, input_text)) as events:
+                        async for kind, data in events:
+                            key = "content" if kind == "token" else "output"
+                            await websocket.send_json({"type": kind, key: data})
+                finally:
+                    active["session"] = None
+        except WebSocketDisconnect:
+            return
+        except RuntimeError:
+            # 连接已断开后再发送时 Starlette 抛出 RuntimeError，其他情况不应吞掉
+            if websocket.client_state != WebSocketState.DISCONNECTED:
+                raise
+        finally:
+            reader_task.cancel()
+
+    return app
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    arg_parser = argparse.ArgumentParser(description="Hello Agents 智能体服务")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8000)
+    arg_parser.add_argument("--max-sessions", type=int, default=None, help="同时运行的最大会话数")
+    args = arg_parser.parse_args()
+    uvicorn.run(create_app(max_sessions=args.max_sessions), host=args.host, port=args.port)
@@ -0,0 +1,113 @@
+"""
+测试公共设施。仓库是平铺布局(没有安装为包)，这里把仓库根目录加入 sys.path。
+
+ScriptedLLM 按顺序返回预先写好的响应，用于在不访问网络的情况下驱动智能体；
+make_chunk / FakeOpenAIClient 模拟 openai SDK 的流式返回，用于测试 HelloAgentsLLM 本身。
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+from typing import Any, Dict, Iterator, List, Optional
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(autouse=True)
+def isolated_env(tmp_path, monkeypatch):
+    """每个测试在临时目录中运行，.cache / .checkpoints 等落盘文件不会污染仓库，也不受本机 .env 影响"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("GENERATION_AUTOTUNE", "false")
+    monkeypatch.setenv("PLAN_CACHE", "false")
+    monkeypatch.setenv("PROFILE_SAMPLE_RATE", "0")
+    for name in ("LLM_SMALL_MODEL_ID", "MAX_TOKENS", "LLM_JSON_MODE", "SEARCH_BACKENDS", "CASSETTE_MODE"):
+        monkeypatch.delenv(name, raising=False)
+    yield tmp_path
+
+
+class ScriptedLLM:
+    """按顺序返回 responses 中的内容；调用记录在 calls 中 (role, messages)"""
+    def __init__(self, responses: List[Optional[str]]):
+        self.responses = list(responses)
+        self.calls: List[Dict[str, Any]] = []
+        self.model = "scripted"
+        self.json_mode = "off"
+
+    def _next(self, messages, role) -> Optional[str]:
+        self.calls.append({"role": role, "messages": messages})
+        if not self.responses:
+            raise AssertionError(f"ScriptedLLM 没有更多响应(role={role})")
+        return self.responses.pop(0)
+
+    def think(self, messages, temperature=None, max_tokens=None, stop=None, role=None) -> Optional[str]:
+        return self._next(messages, role)
+
+    def stream_think(self, messages, temperature=None, max_tokens=None, stop=None, role=None,
+                     response_format=None) -> Iterator[str]:
+        text = self._next(messages, role) or ""
+        for i in range(0, len(text), 8):
+            yield text[i:i + 8]
+
+
+def make_chunk(
+        content: Optional[str] = None,
+        finish_reason: Optional[str] = None,
+        usage: Optional[int] = None,
+        tool_calls: Optional[List[Any]] = None
+):
+    """
+    构造一个 ChatCompletionChunk 形状的对象；tool_calls 为 make_tool_call_delta() 的列表，
+    usage 为 completion_tokens，给出时是一个只带 usage 的结尾块
+    """
+    if usage is not None:
+        return SimpleNamespace(choices=[], usage=SimpleNamespace(completion_tokens=usage))
+    delta = SimpleNamespace(content=content, tool_calls=tool_calls)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=finish_reason)], usage=None)
+
+
+def make_tool_call_delta(index: int, id: Optional[str] = None, name: Optional[str] = None, arguments: Optional[str] = None):
+    """流式 tool_calls 的一个增量分片"""
+    return SimpleNamespace(index=index, id=id, function=SimpleNamespace(name=name, arguments=arguments))
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self._chunks = list(chunks)
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeOpenAIClient:
+    """client.chat.completions.create(...) 依次返回 streams 中的块列表；传入的参数记录在 requests 中"""
+    def __init__(self, streams: List[List[Any]]):
+        self.streams = list(streams)
+        self.requests: List[Dict[str, Any]] = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.requests.append(kwargs)
+        item = self.streams.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        return FakeStream(item)
+
+
+@pytest.fixture
+def make_llm():
+    """创建使用 FakeOpenAIClient 的 HelloAgentsLLM：make_llm([[chunk, ...], ...], **kwargs)"""
+    from core.llm import HelloAgentsLLM
+
+    def factory(streams, **kwargs):
+        llm = HelloAgentsLLM(model="test-model", apiKey="test", baseUrl="http://localhost", **kwargs)
+        llm._client = FakeOpenAIClient(streams)
+        return llm
+    return factory
@@ -0,0 +1,127 @@
+"""broker 的租约语义：同一任务只租给一个 worker、旧 token 无法覆盖结果、租约过期重新投递、超过最大投递次数判定失败"""
+
+import time
+
+import pytest
+
+from jobs.broker import RedisBroker, SQLiteBroker, create_broker
+
+
+def redis_broker():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")     # fakeredis 执行 Lua 脚本需要 lupa
+    return RedisBroker("redis://fake", prefix="test", client=fakeredis.FakeRedis(decode_responses=True))
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def broker(request, tmp_path):
+    broker = SQLiteBroker(str(tmp_path / "jobs.db")) if request.param == "sqlite" else redis_broker()
+    yield broker
+    broker.close()
+
+
+def expire(broker, job_id):
+    """让租约立即过期(不等待 visibility_timeout)"""
+    assert broker.extend(job_id, broker.get(job_id).token, -1)
+    time.sleep(0.01)
+
+
+def test_reserve_is_exclusive_and_fifo(broker):
+    first = broker.enqueue("react", "a")
+    second = broker.enqueue("react", "b")
+    job = broker.reserve("w1", 60)
+    assert (job.id, job.status, job.attempts, job.worker) == (first, "running", 1, "w1")
+    assert broker.reserve("w2", 60).id == second
+    assert broker.reserve("w3", 60) is None
+
+
+def test_complete_requires_current_token(broker):
+    job_id = broker.enqueue("react", "a")
+    job = broker.reserve("w1", 60)
+    assert not broker.complete(job_id, "stale", "x")
+    assert broker.extend(job_id, job.token, 60)
+    assert broker.complete(job_id, job.token, "结果")
+    done = broker.get(job_id)
+    assert (done.status, done.result, done.token) == ("done", "结果", None)
+    # 已完成的任务不能再续租或失败
+    assert not broker.extend(job_id, job.token, 60)
+    assert not broker.fail(job_id, job.token, "迟到的失败")
+
+
+def test_expired_lease_is_redelivered_and_old_worker_is_fenced(broker):
+    job_id = broker.enqueue("react", "a")
+    old = broker.reserve("w1", 60)
+    expire(broker, job_id)
+    new = broker.reserve("w2", 60)
+    assert new.id == job_id and new.attempts == 2 and new.token != old.token
+    assert not broker.complete(job_id, old.token, "旧结果")
+    assert not broker.extend(job_id, old.token, 60)
+    assert broker.complete(job_id, new.token, "新结果")
+    assert broker.get(job_id).result == "新结果"
+
+
+def test_fail_requeues_until_max_attempts(broker):
+    job_id = broker.enqueue("react", "a", max_attempts=2)
+    job = broker.reserve("w1", 60)
+    assert broker.fail(job_id, job.token, "第一次")
+    assert broker.get(job_id).status == "queued"
+    job = broker.reserve("w1", 60)
+    assert job.attempts == 2
+    assert broker.fail(job_id, job.token, "第二次")
+    failed = broker.get(job_id)
+    assert (failed.status, failed.error) == ("failed", "第二次")
+    assert broker.reserve("w1", 60) is None
+
+
+def test_expired_lease_without_attempts_left_is_failed(broker):
+    job_id = broker.enqueue("react", "a", max_attempts=1)
+    broker.reserve("w1", 60)
+    expire(broker, job_id)
+    assert broker.reserve("w2", 60) is None
+    assert broker.get(job_id).status == "failed"
+    assert broker.stats()["failed"] == 1
+
+
+def test_list_jobs_and_stats(broker):
+    ids = [broker.enqueue("react", str(i)) for i in range(3)]
+    job = broker.reserve("w1", 60)
+    broker.complete(job.id, job.token, None)
+    assert [j.id for j in broker.list_jobs()] == ids[::-1]
+    assert [j.id for j in broker.list_jobs("queued")] == ids[:0:-1]
+    assert broker.stats() == {"queued": 2, "running": 0, "done": 1, "failed": 0}
+
+
+def test_create_broker_from_url(tmp_path):
+    broker = create_broker(f"sqlite:///{tmp_path / 'jobs.db'}")
+    assert isinstance(broker, SQLiteBroker)
+    broker.close()
+    with pytest.raises(ValueError):
+        create_broker("amqp://localhost")
+
+
+def test_redis_keys_share_hash_tag():
+    broker = redis_broker()
+    job_id = broker.enqueue("react", "a")
+    job = broker.reserve("w1", 60)
+    broker.complete(job_id, job.token, "x")
+    # Redis Cluster 要求同一脚本访问的键位于同一个槽
+    assert all(key.startswith("{test}:") for key in broker.client.keys("*"))
+
+
+def test_redis_reserve_retries_when_head_was_taken(monkeypatch):
+    broker = redis_broker()
+    first = broker.enqueue("react", "a")
+    second = broker.enqueue("react", "b")
+    lindex = broker.client.lindex
+
+    def stale_head(key, index):
+        # 第一次读出队头后，另一个 worker 抢先取走了它
+        monkeypatch.setattr(broker.client, "lindex", lindex)
+        head = lindex(key, index)
+        assert broker.reserve("w2", 60).id == head
+        return head
+
+    monkeypatch.setattr(broker.client, "lindex", stale_head)
+    job = broker.reserve("w1", 60)
+    assert (job.id, job.worker, job.attempts) == (second, "w1", 1)
+    assert broker.get(first).worker == "w2"
@@ -0,0 +1,80 @@
+"""模型级联：未通过校验的小模型草稿不能出现在 token 回调里；planner 确认有效后不再整体缓冲；registry 按配置启用级联"""
+
+import pytest
+
+from conftest import make_chunk
+from core.cascade import CascadeLLM
+from core.streaming import RunCancelled, token_sink
+
+
+def chunks(*parts):
+    return [make_chunk(p) for p in parts] + [make_chunk(finish_reason="stop"), make_chunk(usage=len(parts))]
+
+
+def cascade(make_llm, small_streams, large_streams):
+    large = make_llm(large_streams)
+    small = make_llm(small_streams, profiles=large.profiles)
+    return CascadeLLM(small, large)
+
+
+def test_rejected_draft_never_reaches_sink(make_llm):
+    llm = cascade(make_llm, [chunks("随便", "说说")], [chunks("Thought: 查\n", "Action: Search[x]")])
+    seen = []
+    with token_sink(seen.append):
+        text = llm.think([{"role": "user", "content": "q"}], role="react_step")
+    assert text == "Thought: 查\nAction: Search[x]"
+    assert "".join(seen) == text
+    assert llm.stats.summary()["react_step"]["escalation_rate"] == 1.0
+
+
+def test_accepted_draft_is_released_and_large_model_skipped(make_llm):
+    llm = cascade(make_llm, [chunks("Action: ", "Finish[42]")], [])
+    seen = []
+    with token_sink(seen.append):
+        text = llm.think([{"role": "user", "content": "q"}], role="react_step")
+    assert text == "Action: Finish[42]"
+    assert "".join(seen) == text
+    assert llm.large.client.requests == []
+    assert llm.stats.summary()["react_step"]["escalation_rate"] == 0.0
+
+
+def test_planner_streams_after_first_step_is_confirmed(make_llm):
+    llm = cascade(make_llm, [chunks("1. 第一步\n", "2. 第二步\n", "3. 第三步\n")], [])
+    seen = []
+    with token_sink(seen.append):
+        pieces = list(llm.stream_think([{"role": "user", "content": "q"}], role="planner"))
+    # 不是整段缓冲后一次性产出
+    assert len(pieces) > 1
+    assert "".join(pieces) == "1. 第一步\n2. 第二步\n3. 第三步\n"
+    assert "".join(seen) == "".join(pieces)
+
+
+def test_cancellation_is_checked_while_draft_is_held(make_llm):
+    llm = cascade(make_llm, [chunks("a", "b", "c")], [])
+
+    def sink(text):
+        raise RunCancelled()
+
+    with token_sink(sink), pytest.raises(RunCancelled):
+        list(llm.stream_think([{"role": "user", "content": "q"}], role="react_step"))
+
+
+def test_roles_without_validator_go_to_large_model(make_llm):
+    llm = cascade(make_llm, [], [chunks("def f(): pass")])
+    assert llm.think([{"role": "user", "content": "q"}], role="initial") == "def f(): pass"
+    assert llm.small.client.requests == []
+
+
+def test_registry_builds_cascade_when_small_model_configured(monkeypatch):
+    from agents.registry import build_runtime, cascade_stats
+    monkeypatch.setenv("LLM_MODEL_ID", "large")
+    monkeypatch.setenv("LLM_API_KEY", "test")
+    monkeypatch.setenv("LLM_BASE_URL", "http://localhost")
+    llm, _ = build_runtime()
+    assert cascade_stats(llm) is None
+
+    monkeypatch.setenv("LLM_SMALL_MODEL_ID", "small")
+    llm, _ = build_runtime()
+    assert isinstance(llm, CascadeLLM)
+    assert (llm.small.model, llm.large.model) == ("small", "large")
+    assert cascade_stats(llm) is llm.stats
@@ -0,0 +1,137 @@
+"""录制 / 回放：录下的 LLM 流和工具调用在没有后端的情况下原样回放"""
+
+import pytest
+
+from conftest import make_chunk
+from core.cassette import Cassette, CassetteLLM, CassetteMiss
+from core.streaming import token_sink
+from search_tool import ToolExecutor
+
+MESSAGES = [{"role": "user", "content": "1+1=?"}]
+
+
+def stream(*parts):
+    return [make_chunk(p) for p in parts] + [make_chunk(finish_reason="stop"), make_chunk(usage=len(parts))]
+
+
+@pytest.fixture
+def recorded(make_llm, tmp_path):
+    """录制两次相同请求(响应不同)和一次工具调用，返回录制文件路径"""
+    path = str(tmp_path / "cassette.db")
+    llm = CassetteLLM(Cassette(path, mode="record"), make_llm([stream("等于", "2"), stream("还是", "2")]))
+    calls = []
+    tools = ToolExecutor()
+    tools.registerTool("Search", "搜索", lambda query: calls.append(query) or f"结果:{query}")
+    llm.cassette.wrap_tools(tools)
+    llm.cassette.record_run("react", "1+1=?")
+
+    assert llm.think(MESSAGES, role="react_step") == "等于2"
+    assert llm.think(MESSAGES, role="react_step") == "还是2"
+    assert tools.getTool("Search")("一加一") == "结果:一加一"
+    assert calls == ["一加一"]
+    llm.cassette.close()
+    return path
+
+
+def test_replay_reproduces_llm_stream_and_tokens(recorded):
+    llm = CassetteLLM.replay(recorded)
+    assert llm.model == "test-model"
+    seen = []
+    with token_sink(seen.append):
+        assert list(llm.stream_think(MESSAGES, role="react_step")) == ["等于", "2"]
+    assert seen == ["等于", "2"]
+    # 同一请求按出现顺序回放，超出录制次数后重复最后一次
+    assert llm.think(MESSAGES, role="react_step") == "还是2"
+    assert llm.think(MESSAGES, role="react_step") == "还是2"
+
+
+def test_replay_tools_without_real_implementation(recorded):
+    cassette = Cassette(recorded)
+    tools = cassette.tool_executor()
+    assert tools.getTool("Search")("一加一") == "结果:一加一"
+    with pytest.raises(CassetteMiss):
+        tools.getTool("Search")("没录过")
+    assert cassette.runs() == [("react", "1+1=?")]
+    summary = cassette.summary()
+    assert summary["llm"]["react_step"]["calls"] == 2
+    assert summary["tools"]["Search"]["calls"] == 1
+
+
+def test_unrecorded_request_is_a_miss(recorded):
+    llm = CassetteLLM.replay(recorded)
+    with pytest.raises(CassetteMiss):
+        list(llm.stream_think([{"role": "user", "content": "别的问题"}], role="react_step"))
+    # 角色参与索引
+    with pytest.raises(CassetteMiss):
+        list(llm.stream_think(MESSAGES, role="planner"))
+
+
+def test_early_stopped_stream_is_recorded_up_to_the_stop(make_llm, tmp_path):
+    path = str(tmp_path / "cassette.db")
+    upstream = make_llm([stream("{\"a\": 1}", " 多余的文本")])
+    llm = CassetteLLM(Cassette(path, mode="record"), upstream)
+    events = llm.stream_think(MESSAGES, role="reflect")
+    assert next(events) == "{\"a\": 1}"
+    events.close()
+    llm.cassette.close()
+
+    assert list(CassetteLLM.replay(path).stream_think(MESSAGES, role="reflect")) == ["{\"a\": 1}"]
+
+
+def test_replay_requires_existing_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        CassetteLLM.replay(str(tmp_path / "missing.db"))
+
+
+def test_replay_exposes_client_attributes(recorded):
+    llm = CassetteLLM.replay(recorded)
+    # 回放客户端与普通客户端的属性一致，依赖这些属性的代码(级联、生成参数)不需要特殊处理
+    assert llm.config.max_tokens == llm.max_tokens
+    assert llm.stream_usage is True
+    assert llm.json_mode == "json_object"
+    with pytest.raises(RuntimeError):
+        llm.client
+
+
+def _record_and_replay(make_llm, tmp_path, streams, run):
+    """用录制客户端运行一次 run(llm)，再用回放客户端运行一次，返回两次的结果和回放时产出的 token"""
+    path = str(tmp_path / "cassette.db")
+    recorder = CassetteLLM(Cassette(path, mode="record"), make_llm(streams))
+    recorded = run(recorder)
+    recorder.cassette.close()
+
+    seen = []
+    with token_sink(seen.append):
+        replayed = run(CassetteLLM.replay(path))
+    return recorded, replayed, seen
+
+
+def test_plan_and_solve_replays_streamed_plan_and_steps(make_llm, tmp_path):
+    from agents.Plan_and_Solve import PlanAndSolveAgent
+
+    streams = [
+        stream("```python\n[\"查资料\", ", "\"算结果\"]\n```"),
+        stream("资料: 2"),
+        stream("结果: 4"),
+    ]
+    recorded, replayed, seen = _record_and_replay(
+        make_llm, tmp_path, streams, lambda llm: PlanAndSolveAgent(llm).run("2 的平方是多少?")
+    )
+    assert recorded == replayed == "结果: 4"
+    # 回放同样边生成计划边执行：第 1 步在计划的第二个块之前执行
+    assert seen == ["```python\n[\"查资料\", ", "资料: 2", "\"算结果\"]\n```", "结果: 4"]
+
+
+def test_reflection_replays_structured_verdicts(make_llm, tmp_path):
+    from agents.Reflection import ReflectionAgent
+
+    streams = [
+        stream("def f(): pass"),
+        stream('{"needs_improvement": true, "analysis": "没有实现", "suggestion": "返回 1"}'),
+        stream("def f(): return 1"),
+        stream('{"needs_improvement": false, "analysis": "可以了", "suggestion": ""}'),
+    ]
+    recorded, replayed, _ = _record_and_replay(
+        make_llm, tmp_path, streams, lambda llm: ReflectionAgent(llm, max_iterations=3).run("写一个返回 1 的函数")
+    )
+    assert recorded == replayed == "def f(): return 1"
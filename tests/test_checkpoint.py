@@ -0,0 +1,89 @@
+import json
+import os
+
+import pytest
+
+from core.checkpoint import CheckpointStore
+from search_tool import ToolExecutor
+from agents.ReAct import ReActAgent
+from conftest import ScriptedLLM
+
+
+def test_save_load_roundtrip(tmp_path):
+    store = CheckpointStore(str(tmp_path / "ckpt"))
+    store.save("run_1", {"question": "q", "step_results": ["a"]})
+    state = store.load("run_1")
+    assert state["question"] == "q"
+    assert state["step_results"] == ["a"]
+    assert state["run_id"] == "run_1"
+    assert store.list_runs() == ["run_1"]
+    # 原子写入不会留下临时文件
+    assert os.listdir(tmp_path / "ckpt") == ["run_1.json"]
+    store.delete("run_1")
+    assert store.load("run_1") is None
+
+
+@pytest.mark.parametrize("run_id", ["../x", "a/b", "..", "", "a.json", "run id"])
+def test_rejects_run_id_outside_store(tmp_path, run_id):
+    store = CheckpointStore(str(tmp_path / "ckpt"))
+    with pytest.raises(ValueError):
+        store.save(run_id, {})
+    with pytest.raises(ValueError):
+        store.load(run_id)
+    assert not (tmp_path / "x.json").exists()
+
+
+class CrashingTool:
+    """第一次调用时模拟进程崩溃"""
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, query):
+        self.calls += 1
+        if self.calls == 1:
+            raise KeyboardInterrupt
+        return f"结果:{query}"
+
+
+def test_react_resume_reuses_llm_response_saved_before_tool_call(tmp_path):
+    store = CheckpointStore(str(tmp_path / "ckpt"))
+    tool = CrashingTool()
+    tools = ToolExecutor()
+    tools.registerTool("Search", "搜索", tool)
+
+    llm = ScriptedLLM(["Thought: 先搜索\nAction: Search[快船]"])
+    agent = ReActAgent(llm, tools, checkpoint_store=store)
+    with pytest.raises(KeyboardInterrupt):
+        agent.run("快船战绩如何？", run_id="r1")
+    state = store.load("r1")
+    assert state["current_step"] == 0
+    assert state["pending_response"].startswith("Thought: 先搜索")
+
+    # 恢复时直接执行保存的 Action，只为下一步调用一次 LLM
+    llm = ScriptedLLM(["Thought: 完成\nAction: Finish[10胜2负]"])
+    agent = ReActAgent(llm, tools, checkpoint_store=store)
+    assert agent.resume("r1") == "10胜2负"
+    assert len(llm.calls) == 1
+    assert tool.calls == 2
+    assert "Observation: 结果:快船" in llm.calls[0]["messages"][0]["content"]
+    state = store.load("r1")
+    assert state["status"] == "finished"
+    assert state["pending_response"] is None
+
+
+def test_plan_and_solve_resume_skips_completed_steps(tmp_path):
+    from agents.Plan_and_Solve import PlanAndSolveAgent
+
+    store = CheckpointStore(str(tmp_path / "ckpt"))
+    store.save("p1", {
+        "question": "q", "plan": ["步骤一", "步骤二", "步骤三"], "plan_complete": True,
+        "step_results": ["1", "2"], "current_step": 2, "status": "running",
+    })
+    llm = ScriptedLLM(["3"])
+    agent = PlanAndSolveAgent(llm, checkpoint_store=store)
+    assert agent.resume("p1") == "3"
+    assert len(llm.calls) == 1
+    with open(tmp_path / "ckpt" / "p1.json", encoding="utf-8") as f:
+        state = json.load(f)
+    assert state["status"] == "finished"
+    assert state["step_results"] == ["1", "2", "3"]
@@ -0,0 +1,133 @@
+import json
+import subprocess
+import sys
+
+from pydantic import BaseModel
+
+from core.config import Config
+from core.generation import GenerationProfile, GenerationProfiles, GenerationStats
+from conftest import ROOT, make_chunk
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+def tuned_profiles(tmp_path, **kwargs):
+    return GenerationProfiles(auto_tune=True, stats_path=str(tmp_path / "stats.json"), min_samples=3, **kwargs)
+
+
+def test_completion_tokens_come_from_usage_not_chunk_count(make_llm, tmp_path):
+    profiles = tuned_profiles(tmp_path)
+    chunks = [make_chunk("0123456789"), make_chunk("0123456789"), make_chunk("0123456789", "stop"), make_chunk(usage=9)]
+    llm = make_llm([chunks], profiles=profiles)
+    assert "".join(llm.stream_think([{"role": "user", "content": "hi"}], role="executor_step")) == "0123456789" * 3
+    assert llm.client.requests[0]["stream_options"] == {"include_usage": True}
+    assert profiles.stats.samples("executor_step") == [9]
+
+
+def test_completion_tokens_estimated_without_usage(make_llm, tmp_path):
+    profiles = tuned_profiles(tmp_path)
+    llm = make_llm([[make_chunk("a" * 40), make_chunk("快船" * 5, "stop")]], profiles=profiles)
+    list(llm.stream_think([{"role": "user", "content": "hi"}], role="executor_step"))
+    # 40 个英文字符约 10 token + 10 个汉字；只数 chunk 会记成 2
+    assert profiles.stats.samples("executor_step") == [20]
+
+
+def test_stream_options_rejected_falls_back_once(make_llm, tmp_path):
+    llm = make_llm([BadRequest("unknown field stream_options"), [make_chunk("ok")], [make_chunk("ok")]])
+    assert llm.think([{"role": "user", "content": "hi"}]) == "ok"
+    assert "stream_options" not in llm.client.requests[1]
+    assert llm.think([{"role": "user", "content": "hi"}]) == "ok"
+    assert "stream_options" not in llm.client.requests[2]
+
+
+def test_other_bad_requests_keep_stream_usage(make_llm):
+    llm = make_llm([BadRequest("context length exceeded"), [make_chunk("ok")]])
+    assert llm.think([{"role": "user", "content": "hi"}]) is None
+    assert len(llm.client.requests) == 1
+    assert llm.stream_usage
+    assert llm.think([{"role": "user", "content": "hi"}]) == "ok"
+    assert llm.client.requests[1]["stream_options"] == {"include_usage": True}
+
+
+def test_early_stop_still_records_sample(make_llm, tmp_path):
+    """调用方提前停止消费(例如 JSON 已经闭合)时，已生成的部分仍记为一个样本"""
+    profiles = tuned_profiles(tmp_path)
+    chunks = [make_chunk("快船"), make_chunk("领先"), make_chunk(" 多余的内容不会被读取")]
+    llm = make_llm([chunks], profiles=profiles)
+    stream = llm.stream_think([{"role": "user", "content": "hi"}], role="reflect")
+    assert next(stream) == "快船"
+    stream.close()
+    assert profiles.stats.samples("reflect") == [2]
+
+
+class Verdict(BaseModel):
+    ok: bool
+
+
+def test_structured_output_records_sample_after_json_closes(make_llm, tmp_path):
+    """think_structured 在 JSON 闭合后停止消费，reflect 等角色也要能收集到样本"""
+    profiles = tuned_profiles(tmp_path)
+    chunks = [make_chunk('{"ok": '), make_chunk("true}"), make_chunk(" 多余的内容不会被读取")]
+    llm = make_llm([chunks], profiles=profiles)
+    assert llm.think_structured([{"role": "user", "content": "hi"}], Verdict, role="reflect") == Verdict(ok=True)
+    assert len(profiles.stats.samples("reflect")) == 1
+
+
+def test_auto_tune_uses_percentile_with_headroom_and_bounds(tmp_path):
+    profiles = tuned_profiles(tmp_path, profiles={"x": GenerationProfile(max_tokens=1000, min_tokens=64)})
+    assert profiles.get("x").max_tokens == 1000
+    for _ in range(3):
+        profiles.observe("x", 200)
+    assert profiles.get("x").max_tokens == 300
+    for _ in range(3):
+        profiles.observe("x", 10)
+    assert profiles.get("x").max_tokens == 300      # p95 仍是 200
+    # 被截断的输出按两倍记录，上限不超过 profile.max_tokens
+    for _ in range(10):
+        profiles.observe("x", 900, truncated=True)
+    assert profiles.get("x").max_tokens == 1000
+
+
+def test_stats_persisted(tmp_path):
+    profiles = tuned_profiles(tmp_path)
+    profiles.observe("reflect", 120)
+    profiles.save()
+    assert json.loads((tmp_path / "stats.json").read_text()) == {"reflect": [120]}
+    # 新进程从文件中读回
+    assert GenerationStats(str(tmp_path / "stats.json")).samples("reflect") == [120]
+
+
+def test_instances_share_stats_per_path(tmp_path):
+    first, second = tuned_profiles(tmp_path), tuned_profiles(tmp_path)
+    assert first.stats is second.stats
+    first.observe("reflect", 1)
+    second.observe("reflect", 2)
+    first.save()
+    assert json.loads((tmp_path / "stats.json").read_text()) == {"reflect": [1, 2]}
+
+
+def test_save_merges_samples_from_other_processes(tmp_path):
+    path = str(tmp_path / "stats.json")
+    profiles = tuned_profiles(tmp_path)
+    profiles.observe("reflect", 1)
+    code = (
+        "from core.generation import GenerationStats\n"
+        f"stats = GenerationStats.for_path({path!r})\n"
+        "stats.add('reflect', 2)\n"
+        "stats.add('planner', 3)\n"
+    )
+    # 另一个进程退出时(atexit)保存自己的样本
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, timeout=60)
+    profiles.save()
+    assert json.loads((tmp_path / "stats.json").read_text()) == {"reflect": [2, 1], "planner": [3]}
+    assert profiles.stats.samples("planner") == [3]
+
+
+def test_max_tokens_comes_from_config(make_llm, monkeypatch):
+    monkeypatch.setenv("MAX_TOKENS", "9999")
+    llm = make_llm([[make_chunk("ok")]], config=Config(max_tokens=100))
+    assert llm.max_tokens == 100
+    llm.think([{"role": "user", "content": "hi"}], role="planner")
+    assert llm.client.requests[0]["max_tokens"] == 100
@@ -0,0 +1,39 @@
+"""
+冷启动：导入 core.llm 和各个智能体模块时不应加载 serpapi / search_tool(以及 openai SDK)。
+
+每个用例在独立的子进程中导入，避免受到本进程中其他测试已加载模块的影响。
+"""
+
+import json
+import subprocess
+import sys
+
+import pytest
+
+from conftest import ROOT
+
+LAZY_MODULES = ("serpapi", "search_tool", "openai")
+
+
+def loaded_after_import(module: str):
+    code = (
+        "import json, sys\n"
+        f"import {module}\n"
+        f"print(json.dumps([name for name in {LAZY_MODULES!r} if name in sys.modules]))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", [
+    "core.llm",
+    "agents.ReAct",
+    "agents.Plan_and_Solve",
+    "agents.Reflection",
+    "agents.SimpleAgent",
+])
+def test_import_does_not_load_sdks(module):
+    assert loaded_after_import(module) == []
@@ -0,0 +1,63 @@
+"""容错 JSON 解析，以及 think_structured 在 schema 校验失败时的修复调用"""
+
+import pytest
+
+from conftest import make_chunk
+from core.json_repair import TolerantJSONParser, parse_json_tolerant
+from agents.Reflection import ReflectionVerdict
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('```json\n{"a": 1}\n```', {"a": 1}),
+    ('结论如下：{"a": [1, 2]} 以上', {"a": [1, 2]}),
+    ('{"a": "截断的字符', {"a": "截断的字符"}),
+    ('{"a": 1, "b": [1, 2', {"a": 1, "b": [1, 2]}),
+    ('{"a": 1,', {"a": 1}),
+    ('{"a": 1, "b":', {"a": 1, "b": None}),
+    ('{"a":1,}', {"a": 1}),
+    ('```json\n{"a": [1,2,]}\n```', {"a": [1, 2]}),
+    ('{"a": [1, 2 ,\n], "b": {"c": 3, },}', {"a": [1, 2], "b": {"c": 3}}),
+    ('{"a": "x,}", "b": ",]",}', {"a": "x,}", "b": ",]"}),
+    ('text {"a": {"b": 1} more', {"a": {"b": 1}}),
+    ('{"a": [1, 2], "b": {"c": 1,} 然后, 其他', {"a": [1, 2], "b": {"c": 1}}),
+])
+def test_parse_json_tolerant_repairs_common_damage(text, expected):
+    assert parse_json_tolerant(text) == expected
+
+
+def test_parse_json_tolerant_rejects_text_without_json():
+    with pytest.raises(ValueError):
+        parse_json_tolerant("没有 JSON")
+
+
+def test_parser_reports_completion_as_soon_as_top_level_closes():
+    parser = TolerantJSONParser()
+    for chunk in ['{"a": "}"', ', "b": {"c": 1}', '} 后面的多余文本']:
+        parser.feed(chunk)
+    assert parser.complete
+    assert parser.finish() == {"a": "}", "b": {"c": 1}}
+
+
+def stream(text):
+    return [make_chunk(text), make_chunk(finish_reason="stop"), make_chunk(usage=1)]
+
+
+def test_empty_verdict_triggers_repair_call(make_llm):
+    fixed = '{"needs_improvement": false, "analysis": "已经是 O(n log log n)", "suggestion": ""}'
+    llm = make_llm([stream("{}"), stream(fixed)])
+    verdict = llm.think_structured([{"role": "user", "content": "q"}], ReflectionVerdict, role="reflect")
+    assert verdict == ReflectionVerdict(needs_improvement=False, analysis="已经是 O(n log log n)", suggestion="")
+    assert len(llm.client.requests) == 2
+    # 修复请求带上了原始输出和校验错误
+    repair = llm.client.requests[1]["messages"]
+    assert repair[-2] == {"role": "assistant", "content": "{}"}
+    assert "needs_improvement" in repair[-1]["content"]
+
+
+def test_verdict_requires_suggestion_when_improvement_needed(make_llm):
+    llm = make_llm([
+        stream('{"needs_improvement": true, "analysis": "O(n^2)", "suggestion": ""}'),
+        stream('{"needs_improvement": true, "analysis": "O(n^2)", "suggestion": ""}'),
+    ])
+    assert llm.think_structured([{"role": "user", "content": "q"}], ReflectionVerdict, role="reflect") is None
+    assert len(llm.client.requests) == 2
@@ -0,0 +1,110 @@
+import sys
+import json
+import logging
+
+import pytest
+
+import log
+from log import JsonFormatter, SamplingFilter, get_logger, setup_logging, shutdown_logging
+
+
+@pytest.fixture
+def restore_logging():
+    """setup_logging() 会改动根 logger，测试结束后恢复到导入 log 时的状态"""
+    root = logging.getLogger()
+    package = logging.getLogger(log.ROOT_LOGGER)
+    saved = (list(root.handlers), root.level, list(package.handlers), package.level, package.propagate)
+    yield
+    shutdown_logging()
+    root.handlers[:] = saved[0]
+    root.setLevel(saved[1])
+    package.handlers[:] = saved[2]
+    package.setLevel(saved[3])
+    package.propagate = saved[4]
+    for name in ("llm", "tools"):
+        get_logger(name).setLevel(logging.NOTSET)
+
+
+def _record(level=logging.INFO, msg="hello", **extra) -> logging.LogRecord:
+    record = logging.LogRecord("hello_agents.llm", level, __file__, 1, msg, None, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def test_json_formatter_keeps_extra_fields():
+    data = json.loads(JsonFormatter().format(_record(msg="调用完成", model="m", tokens=12)))
+    assert data["level"] == "INFO"
+    assert data["component"] == "llm"
+    assert data["message"] == "调用完成"
+    assert data["model"] == "m" and data["tokens"] == 12
+    assert "levelno" not in data and "sample" not in data
+
+
+def test_json_formatter_includes_exception():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord("hello_agents.llm", logging.ERROR, __file__, 1, "failed", None, sys.exc_info())
+    data = json.loads(JsonFormatter().format(record))
+    assert "ValueError: boom" in data["exc_info"]
+
+
+def test_sampling_filter_keeps_one_in_every_n():
+    sampler = SamplingFilter(0.25)
+    kept = [sampler.filter(_record(sample="token")) for _ in range(8)]
+    assert kept == [True, False, False, False, True, False, False, False]
+    # 不带 sample 的记录和 WARNING 及以上总是保留
+    assert sampler.filter(_record())
+    assert sampler.filter(_record(level=logging.WARNING, sample="token"))
+
+
+def test_sampling_filter_zero_rate_drops_sampled_records():
+    sampler = SamplingFilter(0)
+    assert not sampler.filter(_record(sample="token"))
+    assert sampler.filter(_record())
+
+
+def test_info_is_written_before_setup(capsys, restore_logging):
+    # 默认 handler 在导入时绑定了当时的 stderr，这里换成被捕获的 stderr
+    previous = log._default_handler.setStream(sys.stderr)
+    get_logger("llm").info("before init")
+    log._default_handler.setStream(previous)
+    assert "before init" in capsys.readouterr().err
+
+
+def test_setup_logging_writes_json_lines_and_flushes_on_shutdown(capsys, monkeypatch, restore_logging):
+    monkeypatch.setenv("LOG_FORMAT", "json")
+    monkeypatch.setenv("LOG_LEVELS", "tools=WARNING")
+    monkeypatch.setenv("LOG_SAMPLE_RATE", "0.5")
+    setup_logging("DEBUG")
+
+    get_logger("llm").debug("step", extra={"step": 1})
+    get_logger("tools").info("filtered by component level")
+    for i in range(4):
+        get_logger("llm").info("token", extra={"sample": "token", "i": i})
+    shutdown_logging()
+
+    lines = [json.loads(line) for line in capsys.readouterr().err.splitlines()]
+    assert [(line["message"], line.get("step"), line.get("i")) for line in lines] == [
+        ("step", 1, None),
+        ("token", None, 0),
+        ("token", None, 2),
+    ]
+    assert log._listener is None
+    # 默认 handler 已被移除，不会重复输出
+    assert log._default_handler not in logging.getLogger(log.ROOT_LOGGER).handlers
+
+
+def test_setup_logging_twice_replaces_listener(capsys, monkeypatch, restore_logging):
+    monkeypatch.setenv("LOG_FORMAT", "text")
+    setup_logging()
+    first = log._listener
+    setup_logging()
+    assert log._listener is not first
+    assert len(logging.getLogger().handlers) == 1
+
+    get_logger("main").info("once")
+    shutdown_logging()
+    err = capsys.readouterr().err
+    assert err.count("once") == 1 and "INFO - hello_agents.main - once" in err
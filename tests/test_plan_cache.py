@@ -0,0 +1,97 @@
+"""计划模板缓存的键：只有数字和明确的实体是槽位，结构不同的问题不能共用同一份计划"""
+
+import os
+import json
+
+import pytest
+
+from core.plan_cache import SAVE_EVERY, PlanCache, normalize_question
+from core.state_file import load_json
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PlanCache(path=str(tmp_path / "plan_cache.json"))
+
+
+def test_ordinary_english_words_are_not_slots():
+    assert normalize_question("What is the GDP of France?") == ("What is the GDP of <ENT0>", [], ["France"])
+    assert normalize_question("How far is New York from Los Angeles?")[2] == ["New York", "Los Angeles"]
+    # 句首的大写单词不是实体
+    assert normalize_question("Python 和 Java 哪个更快")[0] == "Python 和 <ENT0> 哪个更快"
+
+
+@pytest.mark.parametrize("stored, other", [
+    ("What is the GDP of France?", "Who is the CEO of Apple?"),
+    ("What is the population of Germany?", "What is the capital of Germany?"),
+    ("Summarize the history of Rome", "Translate the history of Rome"),
+])
+def test_unrelated_questions_with_same_shape_miss(cache, stored, other):
+    assert cache.store(stored, ["查找相关资料", "整理答案"])
+    assert cache.lookup(other) is None
+    assert cache.lookup(stored) == ["查找相关资料", "整理答案"]
+
+
+def test_same_structure_with_different_slots_hits(cache):
+    question = "一个水果店周一卖出了15个苹果，周二卖出了20个，一共卖了多少？"
+    plan = ["计算 15 + 20", "给出总数"]
+    assert cache.store(question, plan)
+    assert cache.lookup("一个水果店周一卖出了7个苹果，周二卖出了9个，一共卖了多少？") == ["计算 7 + 9", "给出总数"]
+
+    assert cache.store("What is the GDP of France?", ["搜索 France 的 GDP", "回答"])
+    assert cache.lookup("What is the GDP of Japan?") == ["搜索 Japan 的 GDP", "回答"]
+
+
+def test_templates_with_too_few_literals_are_not_cached(cache):
+    assert not cache.store("What is 3 + 5?", ["计算 3 + 5"])
+    assert cache.lookup("What is 4 + 6?") is None
+    assert cache.stats()["entries"] == 0
+
+    permissive = PlanCache(path=cache.path + ".2", min_literals=0)
+    assert permissive.store("What is 3 + 5?", ["计算 3 + 5"])
+    assert permissive.lookup("What is 4 + 6?") == ["计算 4 + 6"]
+
+
+def test_plans_with_derived_numbers_are_not_cached(cache):
+    assert not cache.store("小明有15个苹果，又买了20个，一共有多少个？", ["15 + 20 = 35", "回答 35"])
+
+
+def test_cache_is_saved_in_batches_and_reloaded(tmp_path):
+    path = str(tmp_path / "plan_cache.json")
+    cache = PlanCache(path=path)
+    cache.store("What is the GDP of France?", ["搜索 France 的 GDP"])
+    # store() 不会每次都重写文件
+    assert not os.path.exists(path)
+    cache.save()
+    assert PlanCache(path=path).lookup("What is the GDP of Italy?") == ["搜索 Italy 的 GDP"]
+
+    for _ in range(SAVE_EVERY - 1):
+        assert cache.lookup("What is the GDP of Japan?")
+    assert load_json(path)["What is the GDP of <ENT0>"]["hits"] == 0
+    cache.lookup("What is the GDP of Spain?")
+    assert load_json(path)["What is the GDP of <ENT0>"]["hits"] == SAVE_EVERY
+
+
+def test_save_merges_entries_from_other_instances(tmp_path):
+    path = str(tmp_path / "plan_cache.json")
+    first, second = PlanCache(path=path), PlanCache(path=path)
+    first.store("What is the GDP of France?", ["搜索 France 的 GDP"])
+    second.store("What is the population of Germany?", ["搜索 Germany 的人口"])
+    first.lookup("What is the GDP of Japan?")
+    first.save()
+    second.save()
+    # 后保存的实例不会覆盖先保存的条目，并且会加载到对方的条目
+    assert second.lookup("What is the GDP of Italy?") == ["搜索 Italy 的 GDP"]
+    assert PlanCache(path=path).stats()["top_templates"][0] == {"template": "What is the GDP of <ENT0>", "hits": 1}
+
+
+def test_for_path_shares_one_instance(tmp_path):
+    path = str(tmp_path / "plan_cache.json")
+    assert PlanCache.for_path(path) is PlanCache.for_path(os.path.join(str(tmp_path), ".", "plan_cache.json"))
+
+
+def test_unreadable_entries_are_ignored(tmp_path):
+    path = str(tmp_path / "plan_cache.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"entries": [{"template": "x", "plan": ["y"]}], "t": {"plan": "不是列表"}, "ok": {"plan": ["a"]}}, f)
+    assert PlanCache(path=path).stats()["entries"] == 1
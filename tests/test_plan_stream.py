@@ -0,0 +1,96 @@
+import pytest
+
+from core.checkpoint import CheckpointStore
+from core.plan_parser import StreamingPlanParser, parse_plan_text
+from agents.Plan_and_Solve import PlanAndSolveAgent, Planner, PlanStreamError
+from conftest import ScriptedLLM
+
+PLAN_TEXT = '```python\n["计算周二的销量", "计算周三的销量", "求和"]\n```'
+
+
+def is_executor_call(call) -> bool:
+    return "当前步骤" in call["messages"][-1]["content"]
+
+
+def test_streaming_parser_yields_each_step_as_soon_as_it_closes():
+    parser = StreamingPlanParser()
+    emitted = []
+    first_step_at = None
+    for i, ch in enumerate(PLAN_TEXT):
+        emitted.extend(parser.feed(ch))
+        if emitted and first_step_at is None:
+            first_step_at = i
+    emitted.extend(parser.finish())
+    # 第一个字符串闭合时立即产出，而不是等到整个列表结束
+    assert first_step_at == PLAN_TEXT.index('"计算周二的销量"') + len('"计算周二的销量"') - 1
+    assert emitted == ["计算周二的销量", "计算周三的销量", "求和"]
+
+
+def test_streaming_parser_numbered_list_and_fallback():
+    parser = StreamingPlanParser()
+    assert parser.feed("1. 第一步\n2. 第二") == ["第一步"]
+    assert parser.finish() == ["第二"]
+    assert parse_plan_text('{"steps": ["a", "b"]}') == ["a", "b"]
+    assert parse_plan_text("没有计划") == []
+
+
+class BrokenStreamLLM(ScriptedLLM):
+    """planner 的流式调用在产出部分内容后断开"""
+    def __init__(self, partial: str, responses):
+        super().__init__(responses)
+        self.partial = partial
+
+    def stream_think(self, messages, role=None, **kwargs):
+        self.calls.append({"role": role, "messages": messages})
+        yield self.partial
+        raise ConnectionError("连接被重置")
+
+
+def test_plan_stream_raises_when_stream_breaks():
+    llm = BrokenStreamLLM('["步骤一", "步骤二", "步', [])
+    planner = Planner(llm)
+    stream = planner.plan_stream("q")
+    assert [next(stream), next(stream)] == ["步骤一", "步骤二"]
+    with pytest.raises(PlanStreamError):
+        next(stream)
+
+
+def test_broken_plan_stream_falls_back_to_non_streamed_plan(tmp_path):
+    store = CheckpointStore(str(tmp_path / "ckpt"))
+    # 半截计划的第 1 步已经执行；重新规划后第 1 步一致，结果被复用
+    llm = BrokenStreamLLM('["步骤一", "步', ["r1", '["步骤一", "步骤二", "步骤三"]', "r2", "r3"])
+    agent = PlanAndSolveAgent(llm, checkpoint_store=store)
+    assert agent.run("q", run_id="fallback") == "r3"
+    assert [is_executor_call(call) for call in llm.calls] == [False, True, False, True, True]
+    state = store.load("fallback")
+    assert state["plan"] == ["步骤一", "步骤二", "步骤三"]
+    assert state["step_results"] == ["r1", "r2", "r3"]
+    assert state["status"] == "finished"
+
+
+def test_failed_fallback_does_not_run_partial_plan_as_complete(tmp_path):
+    store = CheckpointStore(str(tmp_path / "ckpt"))
+    llm = BrokenStreamLLM('["步骤一", "步', ["r1", None])
+    agent = PlanAndSolveAgent(llm, checkpoint_store=store)
+    assert agent.run("q", run_id="failed") is None
+    state = store.load("failed")
+    assert state["status"] == "failed"
+    assert state["plan_complete"] is False
+
+
+class CrashOnStep(ScriptedLLM):
+    def think(self, messages, **kwargs):
+        if is_executor_call({"messages": messages}):
+            raise KeyboardInterrupt
+        return super().think(messages, **kwargs)
+
+
+def test_plan_is_checkpointed_before_first_step_runs(tmp_path):
+    store = CheckpointStore(str(tmp_path / "ckpt"))
+    agent = PlanAndSolveAgent(CrashOnStep([PLAN_TEXT]), checkpoint_store=store)
+    with pytest.raises(KeyboardInterrupt):
+        agent.run("q", run_id="crash")
+    state = store.load("crash")
+    assert state["plan"] == ["计算周二的销量"]
+    assert state["plan_complete"] is False
+    assert state["step_results"] == []
@@ -0,0 +1,97 @@
+"""性能剖析：并行工具调用记入当前剖析；重叠的剖析按引用计数共享 tracemalloc；resume() 和直接的 LLM 调用同样可以剖析"""
+
+import os
+import json
+import threading
+import tracemalloc
+
+import pytest
+
+from conftest import ScriptedLLM, make_chunk
+from agents.SimpleAgent import SimpleAgent
+from core.checkpoint import CheckpointStore
+from core.config import Config
+from core.profiling import RunProfile, profile_run
+from search_tool import ToolExecutor
+
+
+@pytest.fixture(autouse=True)
+def no_tracemalloc():
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+    yield
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def test_parallel_tool_calls_are_recorded_in_current_profile(tmp_path):
+    tools = ToolExecutor()
+    barrier = threading.Barrier(2, timeout=5)
+
+    def tool(name):
+        def run(q):
+            barrier.wait()      # 两个工具互相等待，确认确实是并发执行的
+            return name
+        return run
+
+    for name in ("A", "B"):
+        tools.registerTool(name, name, tool(name), {"type": "object", "properties": {"q": {"type": "string"}}})
+    agent = SimpleAgent("test", llm=None, tool_executor=tools)
+    config = Config(profile_sample_rate=1, profile_dir=str(tmp_path))
+    calls = [{"name": "A", "arguments": '{"q": "1"}'}, {"name": "B", "arguments": '{"q": "2"}'}]
+
+    with profile_run("SimpleAgent", config) as profile:
+        assert agent._execute_tool_calls(calls) == ["A", "B"]
+    assert sorted(step["name"] for step in profile.steps) == ["tool:A", "tool:B"]
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_overlapping_profiles_share_tracemalloc(tmp_path):
+    first = RunProfile("first", 0.01, str(tmp_path))
+    second = RunProfile("second", 0.01, str(tmp_path))
+    first.start()
+    second.start()
+    first.finish()
+    # 第一个结束时第二个仍在使用 tracemalloc，不能停止
+    assert tracemalloc.is_tracing()
+    second.finish()
+    assert not tracemalloc.is_tracing()
+
+
+def test_externally_started_tracemalloc_is_left_running(tmp_path):
+    tracemalloc.start()
+    profile = RunProfile("run", 0.01, str(tmp_path))
+    profile.start()
+    profile.finish()
+    assert tracemalloc.is_tracing()
+
+
+def test_resume_is_profiled(tmp_path):
+    from agents.Plan_and_Solve import PlanAndSolveAgent
+
+    store = CheckpointStore(str(tmp_path / "ckpt"))
+    store.save("p1", {
+        "question": "q", "plan": ["步骤一", "步骤二"], "plan_complete": True,
+        "step_results": ["1"], "current_step": 1, "status": "running",
+    })
+    agent = PlanAndSolveAgent(ScriptedLLM(["2"]), checkpoint_store=store)
+    agent.config = Config(profile_sample_rate=1, profile_dir=str(tmp_path / "profiles"))
+    assert agent.resume("p1") == "2"
+    [report] = os.listdir(tmp_path / "profiles")
+    assert report.startswith("PlanAndSolveAgent-")
+
+
+def test_direct_llm_calls_are_profiled_only_when_enabled(make_llm, tmp_path):
+    config = Config(profile_sample_rate=1, profile_dir=str(tmp_path))
+    streams = [[make_chunk("好"), make_chunk(finish_reason="stop")] for _ in range(2)]
+    messages = [{"role": "user", "content": "q"}]
+
+    assert make_llm(streams[:1], config=config).think(messages) == "好"
+    assert os.listdir(tmp_path) == []
+
+    llm = make_llm(streams[1:], config=config.model_copy(update={"profile_llm_calls": True}))
+    assert llm.think(messages, role="react_step") == "好"
+    [report] = os.listdir(tmp_path)
+    assert report.startswith("HelloAgentsLLM.think-")
+    with open(tmp_path / report / "summary.json", encoding="utf-8") as f:
+        assert [step["name"] for step in json.load(f)["steps"]] == ["llm:react_step"]
@@ -0,0 +1,106 @@
+import threading
+import time
+
+import pytest
+
+import search_tool
+from search_backends import FanOutSearch, LocalIndexBackend, SearchBackend, create_search_tool
+
+
+class FakeBackend(SearchBackend):
+    def __init__(self, name, text=None, delay=0.0, error=None):
+        self.name = name
+        self.text = text
+        self.delay = delay
+        self.error = error
+        self.timeouts = []
+
+    def search(self, query, timeout=None):
+        self.timeouts.append(timeout)
+        time.sleep(self.delay)
+        if self.error:
+            raise RuntimeError(self.error)
+        return self.text and f"{self.text}:{query}"
+
+
+def test_local_index_persists_to_file(tmp_path):
+    db = str(tmp_path / "index" / "local.db")
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "docs" / "clippers.md").write_text("快船队最近十五场比赛赢了十二场", encoding="utf-8")
+    assert LocalIndexBackend(db).index_directory(str(tmp_path / "docs")) == 1
+
+    reopened = LocalIndexBackend(db)
+    assert reopened.count() == 1
+    assert "十二场" in reopened.search("快船 战绩", timeout=5)
+    assert reopened.search("湖人") is None
+
+
+def test_local_index_default_is_a_file(monkeypatch, tmp_path):
+    monkeypatch.delenv("LOCAL_SEARCH_DB", raising=False)
+    backend = LocalIndexBackend()
+    assert backend.db_path.endswith("local_search.db")
+    assert (tmp_path / ".cache" / "local_search.db").exists()
+
+
+def test_fanout_first_returns_fastest_result_and_reports_errors():
+    fanout = FanOutSearch([
+        FakeBackend("slow", "慢", delay=0.5),
+        FakeBackend("broken", error="配额用完"),
+        FakeBackend("fast", "快", delay=0.05),
+    ])
+    text, errors = fanout.search_with_errors("q")
+    assert text == "快:q"
+    assert errors == {"broken": "配额用完"}
+    fanout.close()
+
+
+def test_fanout_merge_and_timeout():
+    fanout = FanOutSearch([FakeBackend("a", "A"), FakeBackend("b", "B", delay=1.0)], mode="merge", timeout=0.2)
+    text, errors = fanout.search_with_errors("q")
+    assert text == "【a】\nA:q"
+    assert errors == {"b": "超时"}
+    # 剩余超时时间会传给后端，由后端自行结束请求
+    assert fanout.backends[1].timeouts == [0.2]
+    fanout.close()
+
+
+def test_fanout_errors_are_per_call_under_concurrency():
+    class QueryDependent(SearchBackend):
+        name = "dep"
+
+        def search(self, query, timeout=None):
+            time.sleep(0.02)
+            if query.startswith("bad"):
+                raise RuntimeError(query)
+            return None
+
+    fanout = FanOutSearch([QueryDependent(), FakeBackend("empty")], max_workers=16)
+    outcomes = {}
+
+    def run(query):
+        outcomes[query] = fanout.search_with_errors(query)
+
+    threads = [threading.Thread(target=run, args=(q,)) for q in ("bad-1", "good-1", "bad-2", "good-2")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert outcomes["bad-1"].errors == {"dep": "bad-1"}
+    assert outcomes["bad-2"].errors == {"dep": "bad-2"}
+    assert outcomes["good-1"].errors == {} and outcomes["good-2"].errors == {}
+    fanout.close()
+
+
+def test_create_search_tool_formats_errors_and_not_found():
+    tool = create_search_tool([FakeBackend("a", error="网络错误"), FakeBackend("b")])
+    assert tool("q") == "搜索时发生了错误：a: 网络错误"
+    assert "q" in create_search_tool([FakeBackend("b")])("q")
+
+
+def test_default_search_uses_configured_backends(monkeypatch, tmp_path):
+    db = str(tmp_path / "local.db")
+    LocalIndexBackend(db).add_documents([("快船", "快船队最近十五场比赛赢了十二场")])
+    monkeypatch.setenv("SEARCH_BACKENDS", "local")
+    monkeypatch.setenv("LOCAL_SEARCH_DB", db)
+    monkeypatch.setattr(search_tool, "_default_search", None)
+    assert "十二场" in search_tool.search("快船")
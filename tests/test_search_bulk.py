@@ -0,0 +1,71 @@
+"""批量解析：多进程与单进程结果一致，且与 search() 使用的解析入口一致；无法解码的行计入 errors"""
+
+import json
+
+import pytest
+
+from search_bulk import BulkParseStats, bulk_parse_results, parse_with_stats
+from search_tool import smart_parse_results
+
+PAYLOADS = [
+    {"search_parameters": {"q": "珠峰高度"}, "answer_box": {"answer": "8848.86 米"},
+     "organic_results": [{"title": "珠峰", "snippet": "世界最高峰"}]},
+    {"search_parameters": {"q": "快船"}, "organic_results": [{"title": "快船", "snippet": "10胜2负"}]},
+    {"search_parameters": {"q": "无结果"}},
+    {"error": "Invalid API key"},
+]
+
+
+@pytest.fixture
+def archive(tmp_path):
+    path = tmp_path / "archive.jsonl"
+    lines = [json.dumps(p, ensure_ascii=False) for p in PAYLOADS]
+    lines.insert(2, "{不是 JSON")
+    lines.insert(3, "")
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def expected():
+    answers = [smart_parse_results(p, (p.get("search_parameters") or {}).get("q", "")) for p in PAYLOADS]
+    return answers[:2] + [None] + answers[2:]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_bulk_matches_shared_parser(archive, workers):
+    stats = BulkParseStats()
+    answers = list(bulk_parse_results(archive, workers=workers, batch_size=2, stats=stats))
+    assert answers[:2] + answers[3:] == [a for a in expected() if a is not None]
+    assert answers[2].startswith("解析失败")
+    # 空行被跳过，无法解码的行计为一条失败记录
+    assert (stats.records, stats.errors) == (5, 1)
+    assert stats.parsers["_parse_answer_box"]["wins"] == 1
+    assert stats.parsers["_parse_organic_results"]["hits"] == 2
+    assert stats.parsers["_parse_organic_results"]["wins"] == 1
+
+
+def test_worker_counts_agree(archive):
+    single, multi = BulkParseStats(), BulkParseStats()
+    assert list(bulk_parse_results(archive, workers=1, stats=single)) == \
+        list(bulk_parse_results(archive, workers=2, batch_size=1, stats=multi))
+    for name, entry in single.parsers.items():
+        assert {k: entry[k] for k in ("calls", "hits", "wins")} == \
+            {k: multi.parsers[name][k] for k in ("calls", "hits", "wins")}
+
+
+def test_first_only_stops_after_first_hit():
+    answer, trace, winner = parse_with_stats(PAYLOADS[0], evaluate_all=False)
+    assert answer == "8848.86 米"
+    assert [name for name, _, _ in trace] == ["_parse_answer_box"]
+    assert winner == "_parse_answer_box"
+    _, trace, _ = parse_with_stats(PAYLOADS[0], evaluate_all=True)
+    assert len(trace) == 8
+
+
+def test_bulk_follows_rank_mode(archive, monkeypatch):
+    from search_tool import parse_results
+    monkeypatch.setenv("SEARCH_RESULT_MODE", "rank")
+    answers = list(bulk_parse_results(archive, workers=1))
+    assert answers[0] == parse_results(PAYLOADS[0], "珠峰高度")
+    # 排序模式下答案框和网页摘要同时出现，与默认模式不同
+    assert "8848.86" in answers[0] and "世界最高峰" in answers[0]
@@ -0,0 +1,42 @@
+import pytest
+
+from core.tokens import estimate_tokens, truncate_to_tokens
+from search_rank import MinHashDeduper, bm25_scores, rank_parse_results
+
+
+@pytest.mark.parametrize("text", ["快船队最近十五场比赛赢了十二场" * 5, "The Clippers won 12 of their last 15 games. " * 5])
+@pytest.mark.parametrize("budget", [1, 3, 10, 40])
+def test_truncate_respects_estimate_tokens(text, budget):
+    truncated = truncate_to_tokens(text, budget)
+    assert estimate_tokens(truncated) <= budget
+    assert text.startswith(truncated.rstrip("…"))
+
+
+def test_first_candidate_over_budget_is_truncated_by_tokens():
+    results = {"organic_results": [{"title": "快船", "snippet": "快船队最近十五场比赛赢了十二场，防守效率排名联盟第一。" * 3}]}
+    text = rank_parse_results(results, "快船战绩", token_budget=8)
+    assert text.startswith("[1] ")
+    # 按字符截断时只剩下 "[1]"；按 token 截断能保留正文
+    assert len(text) > len("[1] ")
+    assert estimate_tokens(text) <= 8
+
+
+def test_rank_prefers_relevant_candidates_and_dedups():
+    snippet = "快船队最近十五场比赛赢了十二场"
+    results = {"organic_results": [
+        {"title": "天气", "snippet": "明天多云转晴，气温回升"},
+        {"title": "快船", "snippet": snippet},
+        {"title": "快船", "snippet": snippet},
+    ]}
+    text = rank_parse_results(results, "快船 比赛", token_budget=400)
+    assert text.count(snippet) == 1
+    assert text.index(snippet) < text.index("多云")
+
+
+def test_bm25_and_deduper():
+    scores = bm25_scores("快船 战绩", ["快船战绩回暖", "湖人交易传闻"])
+    assert scores[0] > scores[1] == 0
+    deduper = MinHashDeduper(threshold=0.8)
+    assert deduper.add("快船队最近十五场比赛赢了十二场")
+    assert not deduper.add("快船队最近十五场比赛赢了十二场。")
+    assert deduper.add("明天多云转晴")
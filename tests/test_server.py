@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+
+from contextlib import aclosing
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from core.streaming import RunCancelled, emit_token
+from search_tool import ToolExecutor
+
+
+class EchoAgent:
+    def run(self, text):
+        for ch in text:
+            emit_token(ch)
+        return text.upper()
+
+
+class EndlessAgent:
+    """一直生成 token，直到会话被取消"""
+    cancelled = threading.Event()
+
+    def run(self, text):
+        try:
+            while True:
+                emit_token("x")
+                time.sleep(0.01)
+        except RunCancelled:
+            EndlessAgent.cancelled.set()
+            raise
+
+
+@pytest.fixture(autouse=True)
+def offline_runtime(monkeypatch):
+    """AgentServer 不创建真实的 LLM 客户端和搜索后端"""
+    monkeypatch.setattr(server, "build_runtime", lambda cassette=None: (None, ToolExecutor()))
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setitem(server.AGENT_FACTORIES, "echo", lambda llm, tools: EchoAgent())
+    monkeypatch.setitem(server.AGENT_FACTORIES, "endless", lambda llm, tools: EndlessAgent())
+    EndlessAgent.cancelled.clear()
+    with TestClient(server.create_app(max_sessions=4, queue_size=4)) as test_client:
+        yield test_client
+
+
+def test_post_run(client):
+    response = client.post("/v1/agents/echo/runs", json={"input": "abc"})
+    assert response.json() == {"output": "ABC"}
+    assert client.post("/v1/agents/nope/runs", json={"input": "x"}).status_code == 404
+
+
+def test_sse_stream(client):
+    with client.stream("POST", "/v1/agents/echo/runs/stream", json={"input": "ab"}) as response:
+        body = "".join(response.iter_text())
+    assert body.count("event: token") == 2
+    assert 'event: done\ndata: {"output": "AB"}' in body
+
+
+def test_websocket_runs_several_messages_and_rejects_bad_json(client):
+    with client.websocket_connect("/v1/agents/echo/ws") as ws:
+        for text in ("hi", "yo"):
+            ws.send_json({"input": text})
+            events = [ws.receive_json() for _ in range(len(text) + 1)]
+            assert [e["type"] for e in events] == ["token"] * len(text) + ["done"]
+            assert events[-1]["output"] == text.upper()
+        ws.send_text("not json")
+        assert ws.receive_json()["type"] == "error"
+    # 正常结束后断开不会在服务端引发异常(TestClient 会把服务端异常抛到这里)
+
+
+def test_websocket_disconnect_cancels_running_session(client):
+    with client.websocket_connect("/v1/agents/endless/ws") as ws:
+        ws.send_json({"input": "go"})
+        assert ws.receive_json()["type"] == "token"
+    assert EndlessAgent.cancelled.wait(2)
+
+
+def test_post_disconnect_cancels_session():
+    class FakeRequest:
+        async def receive(self):
+            await asyncio.sleep(0.01)
+            return {"type": "http.disconnect"}
+
+    async def scenario():
+        session = server.AgentSession("endless", EndlessAgent(), asyncio.get_running_loop(), queue_size=4)
+        await server.cancel_on_disconnect(FakeRequest(), session)
+        # 取消后 events() 立即结束，而不是一直等待下一个事件
+        events = [event async for event in session.events()]
+        return session, events
+
+    session, events = asyncio.run(scenario())
+    assert session.cancelled.is_set()
+    assert events == []
+
+
+def test_slot_is_held_until_worker_finishes():
+    release = threading.Event()
+
+    class BlockingAgent:
+        """不再产出 token，因此被取消后要等 release 才会结束"""
+        def run(self, text):
+            emit_token("a")
+            release.wait(5)
+            return text
+
+    async def scenario():
+        agent_server = server.AgentServer(max_sessions=1, queue_size=4)
+        session = server.AgentSession("blocking", BlockingAgent(), asyncio.get_running_loop(), queue_size=4)
+        async with aclosing(agent_server.stream(session, "x")) as events:
+            async for _ in events:
+                break   # 模拟客户端在第一个 token 后断开
+        held = (agent_server.active_sessions, agent_server.semaphore.locked())
+        release.set()
+        for _ in range(200):
+            if agent_server.active_sessions == 0:
+                break
+            await asyncio.sleep(0.01)
+        agent_server.shutdown()
+        return held, (agent_server.active_sessions, agent_server.semaphore.locked())
+
+    held, after = asyncio.run(scenario())
+    assert held == (1, True)
+    assert after == (0, False)
@@ -0,0 +1,96 @@
+"""SimpleAgent：原生 function calling 的多轮工具调用和最终回答的流式输出"""
+
+import json
+
+from agents.SimpleAgent import SimpleAgent
+from conftest import make_chunk, make_tool_call_delta
+from search_tool import ToolExecutor
+
+
+def make_tools(calls):
+    executor = ToolExecutor()
+    executor.registerTool("Search", "搜索", lambda query: calls.append(query) or f"结果:{query}")
+    return executor
+
+
+def tool_round(*calls, content=None):
+    """一轮只包含工具调用(可选地在前面带一段内容)的流；calls 为 (id, name, arguments)"""
+    chunks = [make_chunk(content)] if content else []
+    for index, (call_id, name, arguments) in enumerate(calls):
+        # 名称和参数分两个增量下发，验证拼接
+        chunks.append(make_chunk(tool_calls=[make_tool_call_delta(index, id=call_id, name=name)]))
+        chunks.append(make_chunk(tool_calls=[make_tool_call_delta(index, arguments=arguments)]))
+    chunks.append(make_chunk(finish_reason="tool_calls"))
+    return chunks
+
+
+def answer_round(*parts):
+    return [make_chunk(part) for part in parts] + [make_chunk(finish_reason="stop")]
+
+
+def test_tool_calls_loop_until_answer(make_llm):
+    calls = []
+    llm = make_llm([
+        tool_round(
+            ("call_1", "Search", json.dumps({"input": "快船"})),
+            ("call_2", "Search", json.dumps({"input": "湖人"})),
+        ),
+        answer_round("快船", "领先"),
+    ])
+    agent = SimpleAgent("assistant", llm, tool_executor=make_tools(calls))
+
+    assert agent.run("对比快船和湖人") == "快船领先"
+    assert calls == ["快船", "湖人"]
+
+    second = llm._client.requests[1]["messages"]
+    assert second[-3]["role"] == "assistant"
+    assert [c["id"] for c in second[-3]["tool_calls"]] == ["call_1", "call_2"]
+    assert second[-2] == {"role": "tool", "tool_call_id": "call_1", "content": "结果:快船"}
+    assert second[-1] == {"role": "tool", "tool_call_id": "call_2", "content": "结果:湖人"}
+    assert [m.content for m in agent.get_history()] == ["对比快船和湖人", "快船领先"]
+
+
+def test_content_before_tool_call_is_not_yielded(make_llm):
+    llm = make_llm([
+        tool_round(("call_1", "Search", json.dumps({"input": "快船"})), content="我先搜索一下。"),
+        answer_round("快船", "第一"),
+    ])
+    agent = SimpleAgent("assistant", llm, tool_executor=make_tools([]))
+
+    assert list(agent.stream_run("快船排第几")) == ["快船", "第一"]
+    assert llm._client.requests[1]["messages"][-2]["content"] == "我先搜索一下。"
+
+
+def test_last_round_has_no_tools(make_llm):
+    llm = make_llm([
+        tool_round(("call_1", "Search", json.dumps({"input": "a"}))),
+        answer_round("答案"),
+    ])
+    agent = SimpleAgent("assistant", llm, tool_executor=make_tools([]), max_tool_rounds=1)
+
+    assert agent.run("问题") == "答案"
+    assert "tools" in llm._client.requests[0]
+    assert "tools" not in llm._client.requests[1]
+
+
+def test_bad_arguments_are_reported_to_model(make_llm):
+    llm = make_llm([
+        tool_round(("call_1", "Search", "{not json")),
+        answer_round("好的"),
+    ])
+    agent = SimpleAgent("assistant", llm, tool_executor=make_tools([]))
+
+    assert agent.run("问题") == "好的"
+    assert llm._client.requests[1]["messages"][-1]["content"].startswith("错误：工具参数不是合法的JSON")
+
+
+def test_stream_without_tools_yields_as_generated(make_llm):
+    llm = make_llm([answer_round("你", "好", "！")])
+    agent = SimpleAgent("assistant", llm)
+    stream = agent.stream_run("hi")
+
+    assert next(stream) == "你"
+    # 第一个块产出时，流还没有读完
+    assert agent.get_history() == []
+    assert list(stream) == ["好", "！"]
+    assert "tools" not in llm._client.requests[0]
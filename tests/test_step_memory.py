@@ -0,0 +1,67 @@
+"""长计划模式：提示词长度不随步骤数增长，显式引用的步骤带完整结果，前缀在各步骤间保持不变"""
+
+from agents.Plan_and_Solve import Executor
+from conftest import ScriptedLLM
+from core.step_memory import StepResultStore, summarize
+from core.tokens import estimate_tokens
+
+LONG_RESULT = "这一步查到了很多资料。" * 30 + "结论是第{n}项指标为{n}00。"
+
+
+def test_render_stays_within_budget_as_steps_grow():
+    store = StepResultStore(history_tokens=300, summary_tokens=40)
+    sizes = []
+    for n in range(1, 31):
+        store.add(n, f"查询第{n}项指标", LONG_RESULT.format(n=n))
+        sizes.append(estimate_tokens(store.render(f"汇总第{n + 1}项指标")))
+    assert max(sizes) <= 300 + 20     # 预算之外只有"另有 N 个步骤已省略"一行
+    assert sizes[-1] <= sizes[9] + 20
+    assert estimate_tokens(store.render_all()) > 10 * max(sizes)
+
+
+def test_previous_and_referenced_steps_are_included_in_full():
+    store = StepResultStore(history_tokens=900, summary_tokens=40)
+    for n in range(1, 31):
+        store.add(n, f"查询第{n}项指标", LONG_RESULT.format(n=n))
+    rendered = store.render("根据步骤3的结果计算增长率")
+    assert LONG_RESULT.format(n=3) in rendered
+    assert LONG_RESULT.format(n=30) in rendered
+    assert "已省略" in rendered
+
+
+def test_summary_keeps_conclusion():
+    summary = summarize(LONG_RESULT.format(n=7), max_tokens=40)
+    assert estimate_tokens(summary) <= 40
+    assert summary.endswith("结论是第7项指标为700。")
+
+
+def executor_prompts(plan, **kwargs):
+    llm = ScriptedLLM([f"结果{n}" for n in range(1, 13)])
+    Executor(llm, long_plan_steps=8, history_tokens=200, summary_tokens=20, **kwargs).execute("问题", plan)
+    return [call["messages"] for call in llm.calls]
+
+
+def test_long_plan_prefix_is_identical_across_steps():
+    plan = [f"步骤内容{n}" for n in range(1, 13)]
+    prompts = executor_prompts(plan)
+    assert {messages[0]["content"] for messages in prompts} == {prompts[0][0]["content"]}
+    assert "步骤内容12" in prompts[0][0]["content"]
+
+
+def test_streamed_long_plan_is_collected_before_long_mode():
+    plan = [f"步骤内容{n}" for n in range(1, 13)]
+    prompts = executor_prompts(iter(plan))
+    # 前 7 步是短计划模式，只能看到已生成的部分
+    assert "步骤内容2" not in prompts[0][0]["content"]
+    long_mode = prompts[7:]
+    assert len(long_mode) == 5
+    assert all(messages[0]["role"] == "system" for messages in long_mode)
+    assert {messages[0]["content"] for messages in long_mode} == {long_mode[0][0]["content"]}
+    assert "步骤内容12" in long_mode[0][0]["content"]
+
+
+def test_explicit_zero_is_not_replaced_by_env_default(monkeypatch):
+    monkeypatch.setenv("EXECUTOR_HISTORY_TOKENS", "999")
+    executor = Executor(ScriptedLLM([]), long_plan_steps=0, history_tokens=0, summary_tokens=0)
+    assert (executor.long_plan_steps, executor.history_tokens, executor.summary_tokens) == (0, 0, 0)
+    assert Executor(ScriptedLLM([])).history_tokens == 999
@@ -0,0 +1,76 @@
+"""worker：结果写回 broker，智能体返回 None 或抛出异常时按失败处理"""
+
+import threading
+
+import pytest
+
+from agents import registry
+from jobs.broker import SQLiteBroker
+from jobs.worker import Worker
+
+
+class FakeAgent:
+    def __init__(self, result):
+        self.result = result
+
+    def run(self, input_text):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+@pytest.fixture
+def worker(tmp_path, monkeypatch):
+    def use(result):
+        monkeypatch.setitem(registry.AGENT_FACTORIES, "fake", lambda llm, tools: FakeAgent(result))
+    broker = SQLiteBroker(str(tmp_path / "jobs.db"))
+    worker = Worker(broker, concurrency=4, visibility_timeout=60)
+    worker.use = use
+    yield worker
+    broker.close()
+
+
+def run_one(worker, max_attempts=3):
+    job_id = worker.broker.enqueue("fake", "输入", max_attempts=max_attempts)
+    worker.process(worker.broker.reserve(worker.worker_id, worker.visibility_timeout))
+    return worker.broker.get(job_id)
+
+
+def test_result_is_completed(worker):
+    worker.use("答案")
+    job = run_one(worker)
+    assert (job.status, job.result) == ("done", "答案")
+    assert worker.processed == 1
+
+
+def test_none_result_is_failed_not_completed(worker):
+    worker.use(None)
+    job = run_one(worker, max_attempts=2)
+    assert job.status == "queued" and job.error
+    # 重新投递后再次返回 None，投递次数用完
+    worker.process(worker.broker.reserve(worker.worker_id, worker.visibility_timeout))
+    job = worker.broker.get(job.id)
+    assert job.status == "failed" and job.result is None
+    assert worker.processed == 0
+
+
+def test_exception_is_failed(worker):
+    worker.use(RuntimeError("boom"))
+    job = run_one(worker, max_attempts=1)
+    assert (job.status, job.error) == ("failed", "RuntimeError: boom")
+
+
+def test_processed_count_under_concurrent_slots(worker):
+    worker.use("ok")
+    for _ in range(40):
+        worker.broker.enqueue("fake", "x")
+    slots = [threading.Thread(target=worker._slot_loop) for _ in range(worker.concurrency)]
+    worker.poll_interval = 0.01
+    for slot in slots:
+        slot.start()
+    while worker.broker.stats()["done"] < 40:
+        threading.Event().wait(0.01)
+    worker.stop()
+    for slot in slots:
+        slot.join()
+    assert worker.processed == 40